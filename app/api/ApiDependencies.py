@@ -1,11 +1,48 @@
-from app.database.DatabaseConnection import SessionLocal
+from app.database.DatabaseConnection import AsyncSessionLocal, ReadSessionLocal
 from fastapi import Depends
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-def get_db():
-    db = SessionLocal()
+
+class LazySession:
+    """
+    Обёртка над асинхронной сессией SQLAlchemy, которая создаёт сессию только
+    при первом обращении к ней. Запросы, обслуженные из кэша, не открывают сессию вовсе.
+    """
+
+    def __init__(self, factory=AsyncSessionLocal):
+        self._factory = factory
+        self._session = None
+
+    @property
+    def opened(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self._factory()
+        return getattr(self._session, name)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def get_db():
+    db = LazySession()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def get_read_db():
+    """
+    Сессия для чтений, которые допускают отставание реплики.
+    Проверки перед записью (владелец ссылки при изменении/удалении) используют get_db.
+    """
+    db = LazySession(ReadSessionLocal)
     try:
         yield db
     finally:
-        db.close()
-        
\ No newline at end of file
+        await db.close()
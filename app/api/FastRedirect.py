@@ -0,0 +1,71 @@
+import os
+from types import SimpleNamespace
+
+from starlette.datastructures import Headers
+
+from app.api.routes.RouteRedirect import REDIRECT_STATUS_CODE, is_expired, redirect_headers, track_visit
+from app.metrics.Prometheus import REDIRECTS
+from app.metrics.RequestTiming import timed
+from app.redis.RedisConnection import NOT_FOUND, get_cached_link
+
+# Обслуживать попадания в кэш напрямую из ASGI, минуя маршрутизацию и зависимости FastAPI
+REDIRECT_FAST_PATH = os.getenv("REDIRECT_FAST_PATH", "true").lower() == "true"
+
+# Заранее сериализованные ответы об ошибках — те же, что отдаёт HTTPException
+_JSON_HEADERS = [(b"content-type", b"application/json")]
+NOT_FOUND_BODY = b'{"detail":"Link not found"}'
+EXPIRED_BODY = b'{"detail":"Link expired"}'
+REDIRECT_ROUTE = SimpleNamespace(path="/{short_code}")
+
+
+class FastRedirectMiddleware:
+    """
+    ASGI-обработчик GET /{short_code} для ссылок из кэша (локального или Redis).
+    Ответ собирается из готовых заголовков записи кэша; при промахе запрос уходит
+    в обычный маршрут, который уже не проверяет кэш повторно.
+    """
+
+    def __init__(self, app, reserved_paths=()):
+        self.app = app
+        # Одноуровневые пути других маршрутов (/docs, /metrics, ...) обслуживает FastAPI
+        self.reserved_paths = frozenset(reserved_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        short_code = path[1:]
+        if not short_code or "/" in short_code or path in self.reserved_paths:
+            await self.app(scope, receive, send)
+            return
+
+        with timed("cache"):
+            record = await get_cached_link(short_code)
+        if record is None:
+            scope["fast_redirect_miss"] = True
+            await self.app(scope, receive, send)
+            return
+
+        scope["route"] = REDIRECT_ROUTE
+        if record is NOT_FOUND:
+            REDIRECTS.labels("cache_negative").inc()
+            await self._send(send, 404, _JSON_HEADERS, NOT_FOUND_BODY)
+            return
+        if is_expired(record):
+            REDIRECTS.labels("expired").inc()
+            await self._send(send, 410, _JSON_HEADERS, EXPIRED_BODY)
+            return
+
+        REDIRECTS.labels("cache_hit").inc()
+        await track_visit(short_code, record["id"], Headers(scope=scope))
+        await self._send(send, REDIRECT_STATUS_CODE, redirect_headers(record), b"")
+
+    @staticmethod
+    async def _send(send, status: int, headers: list, body: bytes) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-length", str(len(body)).encode()), *headers],
+        })
+        await send({"type": "http.response.body", "body": body})
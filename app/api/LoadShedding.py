@@ -0,0 +1,70 @@
+import os
+
+from dotenv import load_dotenv
+
+from app.metrics.Prometheus import LOAD_SHED
+
+load_dotenv()
+
+LOAD_SHED_ENABLED = os.getenv("LOAD_SHED_ENABLED", "true").lower() == "true"
+# Порог недавнего ожидания соединения из пула БД, после которого число запросов ограничивается
+LOAD_SHED_DB_WAIT_SECONDS = float(os.getenv("LOAD_SHED_DB_WAIT_SECONDS", 0.1))
+# Сколько запросов воркер обрабатывает одновременно при перегрузке (0 — ёмкость пула БД)
+LOAD_SHED_MAX_CONCURRENCY = int(os.getenv("LOAD_SHED_MAX_CONCURRENCY", 0))
+LOAD_SHED_RETRY_AFTER_SECONDS = int(os.getenv("LOAD_SHED_RETRY_AFTER_SECONDS", 1))
+
+# Служебные маршруты не отклоняются: по ним видно, что происходит при перегрузке
+EXEMPT_PREFIXES = ("/metrics", "/docs", "/redoc", "/openapi.json")
+OVERLOADED_BODY = b'{"detail":"Service overloaded"}'
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI-middleware, которое отклоняет запросы с 503 до их обработки, если пул БД
+    перегружен: недавнее ожидание соединения выше LOAD_SHED_DB_WAIT_SECONDS и воркер
+    уже обрабатывает не меньше max_concurrency запросов. Принятые запросы не стоят
+    в очереди к пулу бесконечно, поэтому их задержка остаётся ограниченной.
+
+    Ставится внутри FastRedirectMiddleware: редиректы из кэша не обращаются к БД и не отклоняются.
+    """
+
+    def __init__(self, app, engine, max_concurrency: int = LOAD_SHED_MAX_CONCURRENCY):
+        self.app = app
+        self.engine = engine
+        if max_concurrency <= 0:
+            pool = engine.pool
+            max_concurrency = pool.size() + max(0, pool._max_overflow)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self._retry_after = str(LOAD_SHED_RETRY_AFTER_SECONDS).encode()
+
+    def overloaded(self) -> bool:
+        return (
+            self.in_flight >= self.max_concurrency
+            and self.engine.pool.stats.recent_wait_seconds() > LOAD_SHED_DB_WAIT_SECONDS
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        if self.overloaded():
+            LOAD_SHED.inc()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-length", str(len(OVERLOADED_BODY)).encode()),
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", self._retry_after),
+                ],
+            })
+            await send({"type": "http.response.body", "body": OVERLOADED_BODY})
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
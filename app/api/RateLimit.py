@@ -0,0 +1,95 @@
+import os
+from typing import NamedTuple, Optional
+
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request
+
+from app.api.authentication.UserAuth import UserPrincipal, get_current_user
+from app.metrics.Prometheus import RATE_LIMITED
+from app.redis.RateLimiter import TokenBucketLimiter
+from app.redis.RedisConnection import AsyncRedisClient
+
+load_dotenv()
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Заголовок с адресом клиента от доверенного прокси (например, X-Forwarded-For или CF-Connecting-IP).
+# Пусто — адрес TCP-соединения; без прокси заголовок подделывается клиентом
+RATE_LIMIT_CLIENT_IP_HEADER = os.getenv("RATE_LIMIT_CLIENT_IP_HEADER", "")
+
+
+class Quota(NamedTuple):
+    limit: int
+    period_seconds: float
+
+
+def parse_quota(value: str) -> Optional[Quota]:
+    """
+    Разбирает квоту вида "запросов/секунд" (например, "10/60"); "0" или пустая строка — без ограничения.
+    """
+    if not value or value == "0":
+        return None
+    limit, _, period = value.partition("/")
+    return Quota(int(limit), float(period or 1))
+
+
+# Квоты по маршрутам: анонимные клиенты ограничиваются по IP, пользователи — по id
+SHORTEN_ANONYMOUS_QUOTA = parse_quota(os.getenv("RATE_LIMIT_SHORTEN_ANONYMOUS", "10/60"))
+SHORTEN_USER_QUOTA = parse_quota(os.getenv("RATE_LIMIT_SHORTEN_USER", "120/60"))
+BATCH_ANONYMOUS_QUOTA = parse_quota(os.getenv("RATE_LIMIT_BATCH_ANONYMOUS", "2/60"))
+BATCH_USER_QUOTA = parse_quota(os.getenv("RATE_LIMIT_BATCH_USER", "20/60"))
+# Редиректы ограничиваются только при промахе кэша — попадания не доходят до БД
+REDIRECT_MISS_QUOTA = parse_quota(os.getenv("RATE_LIMIT_REDIRECT_MISS", "300/60"))
+
+Limiter = TokenBucketLimiter(AsyncRedisClient)
+
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_CLIENT_IP_HEADER:
+        forwarded = request.headers.get(RATE_LIMIT_CLIENT_IP_HEADER)
+        if forwarded:
+            # В X-Forwarded-For первый адрес — исходный клиент
+            return forwarded.split(",", 1)[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+async def enforce_quota(rule: str, identity: str, quota: Optional[Quota]) -> None:
+    """
+    Списывает запрос из квоты и отвечает 429 с Retry-After, если она исчерпана.
+    При недоступном Redis запрос пропускается.
+    """
+    if not RATE_LIMIT_ENABLED or quota is None:
+        return
+    try:
+        allowed, _, retry_after = await Limiter.acquire(f"{rule}:{identity}", quota.limit, quota.period_seconds)
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+        return
+    if not allowed:
+        RATE_LIMITED.labels(rule).inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, retry_after))},
+        )
+
+
+class RateLimit:
+    """
+    Зависимость маршрута: квота для анонимных клиентов (по IP) и пользователей (по id).
+    Текущий пользователь берётся из get_current_user, который FastAPI вычисляет один раз на запрос.
+    """
+
+    def __init__(self, rule: str, anonymous: Optional[Quota], authenticated: Optional[Quota]):
+        self.rule = rule
+        self.anonymous = anonymous
+        self.authenticated = authenticated
+
+    async def __call__(self, request: Request, current_user: Optional[UserPrincipal] = Depends(get_current_user)):
+        if current_user:
+            await enforce_quota(self.rule, f"user:{current_user.id}", self.authenticated)
+        else:
+            await enforce_quota(self.rule, f"ip:{client_ip(request)}", self.anonymous)
+
+
+ShortenRateLimit = RateLimit("shorten", SHORTEN_ANONYMOUS_QUOTA, SHORTEN_USER_QUOTA)
+BatchRateLimit = RateLimit("shorten_batch", BATCH_ANONYMOUS_QUOTA, BATCH_USER_QUOTA)
@@ -1,28 +1,133 @@
 from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models.UserModel import User
 from app.api.ApiDependencies import get_db
+from app.redis.LocalCache import LocalCache, NOT_FOUND
+from app.redis.RedisConnection import AsyncRedisClient, register_invalidation_channel
+from dataclasses import dataclass
+import hashlib
+import json
 import jwt
+import os
 from datetime import datetime, timedelta
 
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 
+# Кэш "токен -> пользователь": в Redis и в памяти воркера
+AUTH_CACHE_TTL_SECONDS = int(os.getenv("AUTH_CACHE_TTL_SECONDS", 300))
+AUTH_LOCAL_CACHE_SIZE = int(os.getenv("AUTH_LOCAL_CACHE_SIZE", 10000))
+AUTH_LOCAL_CACHE_TTL_SECONDS = float(os.getenv("AUTH_LOCAL_CACHE_TTL_SECONDS", 30))
+AUTH_INVALIDATION_CHANNEL = "auth:invalidate"
+# Счётчик ротаций токенов: растёт при каждой ротации
+AUTH_EPOCH_KEY = "auth:epoch"
+
+# Записывает пользователя в кэш, только если с момента чтения из БД не было ни одной ротации.
+# Иначе запрос, прочитавший старый токен до ротации, мог бы вернуть его в кэш после удаления.
+CACHE_SET_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+LocalTokenCache = LocalCache(AUTH_LOCAL_CACHE_SIZE, AUTH_LOCAL_CACHE_TTL_SECONDS, negative_ttl=5)
+register_invalidation_channel(AUTH_INVALIDATION_CHANNEL, LocalTokenCache)
+_cache_set = AsyncRedisClient.register_script(CACHE_SET_SCRIPT)
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """
+    Данные аутентифицированного пользователя, достаточные обработчикам запросов.
+    """
+    id: int
+    email: str
+
+
 def create_access_token(user_id: int) -> str:
     payload = {"sub": user_id}
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
-def get_current_user(
+
+def _token_key(token: str) -> str:
+    # В ключах Redis храним не сам токен, а его хэш
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def invalidate_token(token: str) -> None:
+    """
+    Удаляет токен из кэшей всех воркеров (при ротации токена, после commit).
+    Счётчик ротаций увеличивается до удаления: запись, прочитанная из БД до ротации,
+    в кэш уже не попадёт.
+    """
+    key = _token_key(token)
+    LocalTokenCache.delete(key)
+    try:
+        async with AsyncRedisClient.pipeline(transaction=False) as pipe:
+            pipe.incr(AUTH_EPOCH_KEY)
+            pipe.delete(f"auth:token:{key}")
+            pipe.publish(AUTH_INVALIDATION_CHANNEL, key)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+
+
+async def get_current_user(
     request: Request,
-    db: Session = Depends(get_db)
-) -> User | None:
+    db: AsyncSession = Depends(get_db)
+) -> UserPrincipal | None:
     authorization: str = request.headers.get("Authorization")
     if not authorization:
         return None  # Возвращаем None, если заголовок отсутствует
 
+    # Сначала ищем токен в кэше воркера, затем в Redis
+    key = _token_key(authorization)
+    principal = LocalTokenCache.get(key)
+    if principal is NOT_FOUND:
+        raise HTTPException(status_code=403, detail="Invalid token")
+    if principal:
+        return principal
+
+    try:
+        cached = await AsyncRedisClient.get(f"auth:token:{key}")
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+        cached = None
+    if cached:
+        principal = UserPrincipal(**json.loads(cached))
+        LocalTokenCache.set(key, principal)
+        return principal
+
+    # Счётчик ротаций читается до запроса к БД (см. CACHE_SET_SCRIPT)
+    try:
+        epoch = await AsyncRedisClient.get(AUTH_EPOCH_KEY) or "0"
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+        epoch = None
+
     # Проверяем токен в базе данных
-    user = db.query(User).filter(User.token == authorization).first()
+    result = await db.execute(select(User.id, User.email).where(User.token == authorization))
+    user = result.first()
     if not user:
+        LocalTokenCache.set_missing(key)
         raise HTTPException(status_code=403, detail="Invalid token")
-    return user
\ No newline at end of file
+
+    principal = UserPrincipal(id=user.id, email=user.email)
+    stored = epoch is None
+    if epoch is not None:
+        try:
+            stored = await _cache_set(
+                keys=[f"auth:token:{key}", AUTH_EPOCH_KEY],
+                args=[epoch, json.dumps({"id": principal.id, "email": principal.email}), AUTH_CACHE_TTL_SECONDS],
+            )
+        except Exception as e:
+            print(f"Ошибка при работе с Redis: {e}")
+            stored = True
+    # Если была ротация, не кэшируем и локально: токен мог только что перестать действовать
+    if stored:
+        LocalTokenCache.set(key, principal)
+    return principal
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.schemas.UserSchema import UserCreate, UserResponse
 from app.crud import crud_user
 from app.api.ApiDependencies import get_db
-from app.api.authentication.UserAuth import create_access_token
+from app.api.authentication.UserAuth import create_access_token, get_current_user, invalidate_token, UserPrincipal
+from typing import Optional
 
 router = APIRouter()
 
@@ -15,11 +16,11 @@ router = APIRouter()
     summary="Регистрация нового пользователя",
     description="Создаёт нового пользователя с указанным email и паролем. Если email уже зарегистрирован, возвращается ошибка."
 )
-def register_user(user_in: UserCreate, db: Session = Depends(get_db)):
-    existing_user = crud_user.get_user_by_email(db, user_in.email)
+async def register_user(user_in: UserCreate, db: AsyncSession = Depends(get_db)):
+    existing_user = await crud_user.get_user_by_email(db, user_in.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    user = crud_user.create_user(db, user_in)
+    user = await crud_user.create_user(db, user_in)
     return user
 
 # вход пользователя
@@ -29,8 +30,28 @@ def register_user(user_in: UserCreate, db: Session = Depends(get_db)):
     summary="Вход пользователя",
     description="Авторизует пользователя с указанным email и паролем. Возвращает информацию о пользователе, если данные корректны."
 )
-def login_user(email: str, password: str, db: Session = Depends(get_db)):
-    user = crud_user.authenticate_user(db, email, password)
+async def login_user(email: str, password: str, db: AsyncSession = Depends(get_db)):
+    user = await crud_user.authenticate_user(db, email, password)
     if not user:
         raise HTTPException(status_code=400, detail="Invalid email or password")
-    return user
\ No newline at end of file
+    return user
+
+# ротация токена
+@router.post(
+    "/token/rotate",
+    response_model=UserResponse,
+    summary="Ротация токена",
+    description="Выпускает новый токен для текущего пользователя. Старый токен сразу перестаёт действовать во всех воркерах."
+)
+async def rotate_user_token(
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)  # Требуется аутентификация
+):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+
+    user = await crud_user.get_user_by_id(db, current_user.id)
+    old_token = user.token
+    user = await crud_user.rotate_token(db, user)
+    await invalidate_token(old_token)
+    return user
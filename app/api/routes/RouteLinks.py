@@ -1,50 +1,80 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Query, Security
-from sqlalchemy.orm import Session
-from app.database.models.UserModel import User
-from app.database.DatabaseConnection import SessionLocal
-from app.api.schemas.LinkSchema import LinkCreate, LinkResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query, Security
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.schemas.LinkSchema import LinkCreate, LinkResponse, UtcDatetime
 from app.services.shortener import URLShortener
 from app.crud import crud_link
-from app.api.ApiDependencies import get_db
-from app.api.authentication.UserAuth import get_current_user
+from app.api.ApiDependencies import get_db, get_read_db
+from app.api.RateLimit import BatchRateLimit, ShortenRateLimit
+from app.database.DatabaseConnection import AsyncSessionLocal, ReadRouter, ReadSessionLocal
+from app.api.authentication.UserAuth import get_current_user, UserPrincipal
 from app.database.models.LinkModel import Link
-from app.redis.RedisConnection import RedisClient,update_cache
-from typing import Optional
+from app.redis.RedisConnection import RedisClient,update_cache,invalidate_link,warm_cache,set_dedup_code,delete_dedup_code
+from app.services.url_digest import dedup_scope
+from app.services.visit_counter import get_pending_visits
+from app.services.click_analytics import align_range, get_click_stats
+from typing import Dict, List, Optional
+import json
 import os
-from pydantic import BaseModel, AnyHttpUrl, AnyUrl
+from pydantic import BaseModel, AnyHttpUrl, AnyUrl, Field, ValidationError
 from datetime import datetime
 
 
 router = APIRouter()
 
 BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+# Размер пачки для массового создания ссылок (одна транзакция на пачку)
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", 1000))
+# Максимальное количество ссылок в одном запросе массового создания
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100000))
+# Размер страницы /links/my и /links/search, если передан только cursor
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", 100))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", 1000))
 
 class LinkCreate(BaseModel):
     original_url: AnyUrl
     custom_alias: Optional[str] = None
-    expires_at: Optional[datetime] = None
+    expires_at: Optional[UtcDatetime] = None
 
 class LinkUpdate(BaseModel):
     original_url: Optional[AnyUrl]
-    expires_at: Optional[datetime]
+    expires_at: Optional[UtcDatetime]
+
+class ClickBucket(BaseModel):
+    bucket: datetime
+    clicks: int
+
+class ClickStats(BaseModel):
+    granularity: str
+    date_from: datetime = Field(alias="from")
+    date_to: datetime = Field(alias="to")
+    series: List[ClickBucket]
+    referrers: Dict[str, int]
+    user_agents: Dict[str, int]
+    countries: Dict[str, int]
 
 class LinkStats(BaseModel):
     original_url: str
     created_at: datetime
     visit_count: int
     last_visited: Optional[datetime]
+    clicks: Optional[ClickStats] = None
 
 # создание короткой ссылки
 @router.post(
     "/shorten",
     response_model=LinkResponse,
+    dependencies=[Depends(ShortenRateLimit)],
     summary="Создание короткой ссылки",
-    description="Создаёт короткую ссылку для указанного URL. Анонимные пользователи не могут использовать пользовательский алиас."
+    description="Создаёт короткую ссылку для указанного URL. Анонимные пользователи не могут использовать пользовательский алиас. С параметром dedupe=true возвращает уже существующую ссылку пользователя на тот же URL вместо создания новой."
 )
-def create_short_link(
+async def create_short_link(
     link_in: LinkCreate,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)  # None, если аноним
+    dedupe: bool = Query(False, description="Вернуть существующую ссылку на тот же URL, если она есть"),
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)  # None, если аноним
 ):
     if not current_user and link_in.custom_alias:
         raise HTTPException(
@@ -52,39 +82,160 @@ def create_short_link(
             detail="Custom alias is only available for authenticated users"
         )
 
+    user_id = current_user.id if current_user else None  # Если пользователь аноним, user_id = None
+
     shortener = URLShortener(db)
+    if dedupe:
+        existing_code = await shortener.find_existing(link_in, user_id)
+        if existing_code:
+            return LinkResponse(
+                short_code=existing_code,
+                short_url=f"{BASE_URL}/{existing_code}"
+            )
+
     try:
-        short_code = shortener.create_short_code_or_custom(link_in.custom_alias)
+        link = await shortener.create_link(link_in, user_id)
     except ValueError:
         raise HTTPException(
             status_code=400,
             detail="Custom alias already in use"
         )
 
-    user_id = current_user.id if current_user else None  # Если пользователь аноним, user_id = None
-    link = crud_link.create_link(db, short_code, link_in, user_id)
+    short_code = link.short_code
+    # Код мог попасть в отрицательный кэш воркеров до создания ссылки
+    await invalidate_link(short_code)
+    if dedupe and not link.custom_alias and not link.expires_at:
+        await set_dedup_code(dedup_scope(user_id), link.url_digest, short_code)
     return LinkResponse(
         short_code=short_code,
         short_url=f"{BASE_URL}/{short_code}"
     )
 
 
+# Элемент NDJSON-потока сверх BATCH_MAX_ITEMS: дальше поток не читается
+BATCH_LIMIT_REACHED = object()
+
+
+async def _iter_batch_items(request: Request):
+    """
+    Читает элементы пачки из тела запроса: JSON-массив или NDJSON-поток.
+    Возвращает пары (index, LinkCreate | текст ошибки | BATCH_LIMIT_REACHED).
+    Слишком большой JSON-массив отклоняется с 413 до создания ссылок; NDJSON-поток
+    обрывается на лимите, чтобы клиент получил результаты уже созданных ссылок.
+    """
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    if index >= BATCH_MAX_ITEMS:
+                        yield index, BATCH_LIMIT_REACHED
+                        return
+                    yield index, _parse_batch_item(line)
+                    index += 1
+        if buffer.strip():
+            yield index, BATCH_LIMIT_REACHED if index >= BATCH_MAX_ITEMS else _parse_batch_item(buffer)
+        return
+
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array")
+    if len(payload) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {BATCH_MAX_ITEMS} items")
+    for index, item in enumerate(payload):
+        try:
+            yield index, LinkCreate.model_validate(item)
+        except ValidationError as e:
+            yield index, str(e.errors()[0]["msg"])
+
+
+def _parse_batch_item(line: bytes):
+    try:
+        return LinkCreate.model_validate_json(line)
+    except ValidationError as e:
+        return str(e.errors()[0]["msg"])
+
+
+# массовое создание коротких ссылок
+@router.post(
+    "/shorten/batch",
+    dependencies=[Depends(BatchRateLimit)],
+    summary="Массовое создание коротких ссылок",
+    description="Принимает JSON-массив или NDJSON-поток (Content-Type: application/x-ndjson) объектов LinkCreate. Ссылки вставляются пачками по одной транзакции, кэш прогревается конвейером Redis. Ошибки отдельных элементов возвращаются в ответе и не прерывают обработку."
+)
+async def create_short_links_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)  # None, если аноним
+):
+    user_id = current_user.id if current_user else None
+    shortener = URLShortener(db)
+    results = []
+    chunk = []
+
+    async def flush_chunk():
+        created, errors = await shortener.create_links_batch(chunk, user_id)
+        await warm_cache(
+            [(row["short_code"], row["original_url"], row["expires_at"], row["id"]) for row in created],
+            invalidate=[row["custom_alias"] for row in created if row["custom_alias"]],
+        )
+        results.extend(
+            {"index": row["index"], "short_code": row["short_code"], "short_url": f"{BASE_URL}/{row['short_code']}"}
+            for row in created
+        )
+        results.extend(errors)
+        chunk.clear()
+
+    async for index, item in _iter_batch_items(request):
+        if item is BATCH_LIMIT_REACHED:
+            results.append({"index": index, "error": f"Batch is limited to {BATCH_MAX_ITEMS} items; the rest of the stream was not processed"})
+            break
+        if isinstance(item, str):
+            results.append({"index": index, "error": item})
+        elif not current_user and item.custom_alias:
+            results.append({"index": index, "error": "Custom alias is only available for authenticated users"})
+        else:
+            chunk.append((index, item))
+            if len(chunk) >= BATCH_CHUNK_SIZE:
+                await flush_chunk()
+
+    if chunk:
+        await flush_chunk()
+
+    results.sort(key=lambda result: result["index"])
+    failed = sum(1 for result in results if "error" in result)
+    return {"created": len(results) - failed, "failed": failed, "results": results}
+
+
 # получение статистики по короткой ссылке
 @router.get(
     "/{short_code}/stats",
     response_model=LinkStats,
     summary="Получение статистики по ссылке",
-    description="Возвращает статистику для указанной короткой ссылки. Доступно только для авторизованных пользователей."
+    description="Возвращает статистику для указанной короткой ссылки. Доступно только для авторизованных пользователей. С параметром granularity (hour или day) добавляет ряд кликов за период from–to и разбивку по источникам, типам клиентов и странам."
 )
-def get_link_stats(
+async def get_link_stats(
     short_code: str,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)  # Требуется аутентификация
+    granularity: Optional[str] = Query(None, pattern="^(hour|day)$", description="Интервал агрегации кликов"),
+    date_from: Optional[UtcDatetime] = Query(None, alias="from", description="Начало периода (по умолчанию — 7 дней назад)"),
+    date_to: Optional[UtcDatetime] = Query(None, alias="to", description="Конец периода (по умолчанию — сейчас)"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)  # Требуется аутентификация
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    link = crud_link.get_link_by_short_code(db, short_code)
+    link = await crud_link.get_link_by_short_code(db, short_code)
+    if not link and ReadRouter.replicas:
+        # Только что созданная ссылка могла ещё не дойти до реплики
+        async with AsyncSessionLocal() as primary:
+            link = await crud_link.get_link_by_short_code(primary, short_code)
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
 
@@ -92,11 +243,23 @@ def get_link_stats(
     if link.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Permission denied")
 
+    # Учитываем посещения, которые ещё не сброшены в БД
+    pending_count, pending_last = await get_pending_visits(short_code)
+    last_visited = link.last_visited
+    if pending_last and (not last_visited or pending_last > last_visited):
+        last_visited = pending_last
+
+    clicks = None
+    if granularity:
+        range_from, range_to = align_range(granularity, date_from, date_to)
+        clicks = await get_click_stats(db, link.id, granularity, range_from, range_to)
+
     return LinkStats(
         original_url=link.original_url,
         created_at=link.created_at,
-        visit_count=link.visit_count,
-        last_visited=link.last_visited,
+        visit_count=(link.visit_count or 0) + pending_count,
+        last_visited=last_visited,
+        clicks=clicks,
     )
 
 
@@ -106,16 +269,16 @@ def get_link_stats(
     summary="Обновление короткой ссылки",
     description="Обновляет оригинальный URL или срок действия указанной короткой ссылки. Доступно только для владельца ссылки."
 )
-def update_link(
+async def update_link(
     short_code: str,
     link_update: LinkUpdate,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)  # Требуется аутентификация
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)  # Требуется аутентификация
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    link = crud_link.get_link_by_short_code(db, short_code)
+    link = await crud_link.get_link_by_short_code(db, short_code)
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
 
@@ -124,15 +287,13 @@ def update_link(
         raise HTTPException(status_code=403, detail="Permission denied")
 
     # Обновляем ссылку в базе данных
-    updated = crud_link.update_link(db, link, link_update)
-
-    # Удаляем старый кэш
-    redis_key = f"short_url:{short_code}"
-    RedisClient.delete(redis_key)
+    old_digest = link.url_digest
+    updated = await crud_link.update_link(db, link, link_update)
+    if old_digest != updated.url_digest or updated.expires_at:
+        await delete_dedup_code(dedup_scope(updated.user_id), old_digest)
 
-    # (Опционально) Обновляем кэш с новым значением
-    if link_update.original_url:
-        RedisClient.set(redis_key, str(link_update.original_url))
+    # Обновляем кэш новой записью ссылки
+    await update_cache(short_code, updated.original_url, updated.expires_at, updated.id)
 
     return {"message": "Link updated successfully"}
 
@@ -143,15 +304,15 @@ def update_link(
     summary="Удаление короткой ссылки",
     description="Удаляет указанную короткую ссылку. Доступно только для владельца ссылки."
 )
-def delete_link(
+async def delete_link(
     short_code: str,
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)  # Требуется аутентификация
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)  # Требуется аутентификация
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    link = crud_link.get_link_by_short_code(db, short_code)
+    link = await crud_link.get_link_by_short_code(db, short_code)
     if not link:
         raise HTTPException(status_code=404, detail="Link not found")
 
@@ -160,70 +321,135 @@ def delete_link(
         raise HTTPException(status_code=403, detail="Permission denied")
 
     # Удаляем ссылку из базы данных
-    crud_link.delete_link(db, link)
+    await crud_link.delete_link(db, link)
+    await delete_dedup_code(dedup_scope(link.user_id), link.url_digest)
 
     # Удаляем кэш
-    update_cache(short_code)
+    await update_cache(short_code)
 
     return {"message": "Link deleted successfully"}
 
+def _search_item(row) -> dict:
+    return {
+        "short_code": row.short_code,
+        "short_url": f"{BASE_URL}/{row.short_code}",
+        "expires_at": row.expires_at,
+    }
+
+
+def _my_link_item(row) -> dict:
+    return {
+        "short_code": row.short_code,
+        "short_url": f"{BASE_URL}/{row.short_code}",
+        "original_url": row.original_url,
+        "expires_at": row.expires_at,
+        "created_at": row.created_at,
+        "visit_count": row.visit_count,
+    }
+
+
+SEARCH_COLUMNS = (Link.short_code, Link.expires_at)
+MY_LINKS_COLUMNS = (Link.short_code, Link.original_url, Link.expires_at, Link.created_at, Link.visit_count)
+
+
+def _stream_export(user_id: int, columns, to_item, after_id: Optional[int], format: str, **filters):
+    """
+    Отдаёт все ссылки пользователя потоком: построчно в формате NDJSON или одним JSON-массивом.
+    Сессия открывается внутри генератора, т.к. тело ответа читается после выхода из обработчика.
+    """
+    async def ndjson_rows():
+        async with ReadSessionLocal() as session:
+            async for row in crud_link.stream_user_links(session, user_id, columns, after_id=after_id, **filters):
+                yield json.dumps(jsonable_encoder(to_item(row))) + "\n"
+
+    async def json_rows():
+        separator = "["
+        async with ReadSessionLocal() as session:
+            async for row in crud_link.stream_user_links(session, user_id, columns, after_id=after_id, **filters):
+                yield separator + json.dumps(jsonable_encoder(to_item(row)))
+                separator = ","
+        yield "]" if separator == "," else "[]"
+
+    if format == "ndjson":
+        return StreamingResponse(ndjson_rows(), media_type="application/x-ndjson")
+    return StreamingResponse(json_rows(), media_type="application/json")
+
+
+async def _links_page(
+    db: AsyncSession, response: Response, user_id: int, columns, to_item,
+    limit: int, after_id: Optional[int], **filters
+) -> list:
+    """
+    Возвращает страницу ссылок; курсор следующей страницы передаётся в заголовке X-Next-Cursor.
+    """
+    rows = await crud_link.list_user_links(db, user_id, columns, limit + 1, after_id=after_id, **filters)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1].id)
+    return [to_item(row) for row in rows]
+
+
 # поиск ссылок
 @router.get(
     "/search",
     summary="Поиск ссылок",
-    description="Ищет ссылки, принадлежащие текущему пользователю, по указанному оригинальному URL. Доступно только для авторизованных пользователей."
+    description="Ищет ссылки, принадлежащие текущему пользователю, по подстроке или началу оригинального URL и по домену. Доступно только для авторизованных пользователей. Без limit и cursor возвращаются все результаты; с limit или cursor — страница, курсор следующей страницы возвращается в заголовке X-Next-Cursor. format=ndjson отдаёт все результаты потоком."
 )
-def search_links(
+async def search_links(
+    response: Response,
     original_url: Optional[str] = Query(None, alias="original_url"),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)  # Требуется аутентификация
+    match: str = Query("contains", pattern="^(contains|prefix)$", description="contains — подстрока URL, prefix — начало URL"),
+    domain: Optional[str] = Query(None, description="Точное совпадение домена, например example.com"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (без limit и cursor — все ссылки)"),
+    cursor: Optional[int] = Query(None, description="Значение X-Next-Cursor предыдущей страницы"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json — страница, ndjson — потоковая выгрузка"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)  # Требуется аутентификация
 ):
     if not current_user:
         raise HTTPException(status_code=401, detail="Authentication required")
 
-    query = db.query(Link).filter(Link.user_id == current_user.id)
+    filters = {"url_contains": original_url, "url_match": match, "domain": domain}
+    if format == "ndjson":
+        return _stream_export(current_user.id, SEARCH_COLUMNS, _search_item, cursor, format, **filters)
 
-    # Если указан параметр original_url, добавляем фильтр
-    if original_url:
-        query = query.filter(Link.original_url.contains(original_url))
+    if limit is None and cursor is None:
+        # Без пагинации отдаём все результаты, как до появления limit; 404 — до начала потока
+        if not await crud_link.list_user_links(db, current_user.id, (Link.id,), 1, **filters):
+            raise HTTPException(status_code=404, detail="No links found")
+        return _stream_export(current_user.id, SEARCH_COLUMNS, _search_item, None, format, **filters)
 
-    links = query.all()
+    links = await _links_page(
+        db, response, current_user.id, SEARCH_COLUMNS, _search_item, limit or DEFAULT_PAGE_SIZE, cursor, **filters
+    )
 
-    if not links:
+    if not links and not cursor:
         raise HTTPException(status_code=404, detail="No links found")
 
-    return [
-        {
-            "short_code": link.short_code,
-            "short_url": f"{BASE_URL}/{link.short_code}",
-            "expires_at": link.expires_at,
-        }
-        for link in links
-    ]
+    return links
 
 
 # получение всех коротких ссылок текущего пользователя
 @router.get(
     "/my",
     summary="Получение всех ссылок пользователя",
-    description="Возвращает все ссылки, принадлежащие текущему пользователю. Доступно только для авторизованных пользователей."
+    description="Возвращает ссылки, принадлежащие текущему пользователю. Доступно только для авторизованных пользователей. Без limit и cursor возвращаются все ссылки; с limit или cursor — страница, курсор следующей страницы возвращается в заголовке X-Next-Cursor. format=ndjson отдаёт все ссылки потоком."
 )
-def get_my_links(
-    db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)  # None, если аноним
+async def get_my_links(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Размер страницы (без limit и cursor — все ссылки)"),
+    cursor: Optional[int] = Query(None, description="Значение X-Next-Cursor предыдущей страницы"),
+    format: str = Query("json", pattern="^(json|ndjson)$", description="json — страница, ndjson — потоковая выгрузка"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[UserPrincipal] = Depends(get_current_user)  # None, если аноним
 ):
     if not current_user:
         return []  # Анонимные пользователи не имеют доступных ссылок
 
-    links = db.query(Link).filter(Link.user_id == current_user.id).all()
-    return [
-        {
-            "short_code": link.short_code,
-            "short_url": f"{BASE_URL}/{link.short_code}",
-            "original_url": link.original_url,
-            "expires_at": link.expires_at,
-            "created_at": link.created_at,
-            "visit_count": link.visit_count,
-        }
-        for link in links
-    ]
\ No newline at end of file
+    if format == "ndjson" or (limit is None and cursor is None):
+        # Без пагинации отдаём все ссылки, как до появления limit
+        return _stream_export(current_user.id, MY_LINKS_COLUMNS, _my_link_item, cursor, format)
+
+    return await _links_page(
+        db, response, current_user.id, MY_LINKS_COLUMNS, _my_link_item, limit or DEFAULT_PAGE_SIZE, cursor
+    )
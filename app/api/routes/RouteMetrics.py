@@ -0,0 +1,90 @@
+from fastapi import APIRouter, Response
+from starlette.concurrency import run_in_threadpool
+
+from app.database.DatabaseConnection import ReadRouter, async_engine, engine
+from app.database.DatabasePool import pool_metrics
+from app.metrics.Prometheus import render_metrics
+from app.redis.RedisConnection import AsyncLinkCacheClient, AsyncRedisClient, AsyncRedisPool, RedisPool, get_cache_stats
+from app.redis.RedisPool import redis_pool_metrics
+from app.redis.ShardedRedis import ShardedAsyncRedis
+from app.services.code_filter import get_code_filter_stats
+from app.services.link_reaper import REAPER_METRICS_KEY
+from app.worker import worker_status
+
+router = APIRouter()
+
+# метрики в формате Prometheus
+@router.get(
+    "",
+    summary="Метрики Prometheus",
+    description="Гистограммы длительности запросов по маршрутам, SQL-запросов, команд Redis и фоновых задач, счётчики кэша и редиректов."
+)
+async def prometheus_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+# счётчики кэша редиректов по уровням
+@router.get(
+    "/cache",
+    summary="Статистика кэша",
+    description="Возвращает счётчики попаданий, промахов и вытеснений для локального кэша воркера и для Redis."
+)
+async def cache_metrics():
+    return get_cache_stats()
+
+
+# состояние пулов соединений Postgres и Redis
+@router.get(
+    "/pools",
+    summary="Состояние пулов соединений",
+    description="Возвращает число выданных соединений, время ожидания, таймауты и насыщенность пулов Postgres (включая реплики и их исправность) и Redis (включая узлы кэша ссылок)."
+)
+async def pool_status():
+    return {
+        "postgres": {
+            "async": pool_metrics(async_engine.sync_engine),
+            "sync": pool_metrics(engine),
+            "replicas": [
+                {**health, **pool_metrics(replica.sync_engine)}
+                for health, replica in zip(ReadRouter.snapshot(), ReadRouter.replicas)
+            ],
+        },
+        "redis": {
+            "async": redis_pool_metrics(AsyncRedisPool),
+            "sync": redis_pool_metrics(RedisPool),
+            # Узлы кэша ссылок при LINK_CACHE_REDIS_MODE=sharded: доступность и асинхронные пулы
+            **({"link_cache_shards": AsyncLinkCacheClient.snapshot()}
+               if isinstance(AsyncLinkCacheClient, ShardedAsyncRedis) else {}),
+        },
+    }
+
+
+# результаты последнего запуска очистки ссылок
+@router.get(
+    "/reaper",
+    summary="Метрики очистки ссылок",
+    description="Возвращает число удалённых ссылок, скорость удаления (строк в секунду) и отставание очистки по последнему запуску."
+)
+async def reaper_metrics():
+    return await AsyncRedisClient.hgetall(REAPER_METRICS_KEY)
+
+
+# состояние фильтра Блума по коротким кодам
+@router.get(
+    "/code-filter",
+    summary="Фильтр несуществующих кодов",
+    description="Возвращает размер фильтра Блума в памяти Redis, число кодов, оценочную и наблюдаемую долю ложных срабатываний и счётчики проверок воркера."
+)
+async def code_filter_metrics():
+    return await run_in_threadpool(get_code_filter_stats)
+
+
+# состояние фонового воркера и очереди задач
+@router.get(
+    "/worker",
+    summary="Фоновый воркер",
+    description="Возвращает текущего лидера, живые воркеры, длину очереди задач, время следующих запусков периодических задач и итоги последних запусков."
+)
+async def worker_metrics():
+    return await worker_status()
@@ -1,39 +1,125 @@
-from fastapi import APIRouter, Depends, HTTPException
-from starlette.responses import RedirectResponse
+import asyncio
+import os
+from urllib.parse import quote
+
+from fastapi import APIRouter, HTTPException, Request, Response
 from starlette.status import HTTP_404_NOT_FOUND, HTTP_410_GONE
-from sqlalchemy.orm import Session
 from datetime import datetime
 
-from app.database.DatabaseConnection import SessionLocal
-from app.redis.RedisConnection import RedisClient
+from app.api.RateLimit import REDIRECT_MISS_QUOTA, client_ip, enforce_quota
+from app.redis.RedisConnection import get_cached_link, cache_link, cache_missing, NOT_FOUND
 from app.crud import crud_link
-from app.api.ApiDependencies import get_db
+from app.database.DatabaseConnection import AsyncSessionLocal, ReadRouter, ReadSessionLocal
+from app.metrics.Prometheus import REDIRECTS
+from app.metrics.RequestTiming import timed
+from app.services.visit_counter import record_visit
+from app.services.click_analytics import emit_click
+from app.services.code_filter import might_exist, record_false_positive
+from app.services.single_flight import SingleFlight
 
 router = APIRouter()
 
+# 301 — постоянный (браузеры кэшируют), 302/307 — временный; 307 сохраняет метод запроса
+REDIRECT_STATUS_CODE = int(os.getenv("REDIRECT_STATUS_CODE", 307))
+if REDIRECT_STATUS_CODE not in (301, 302, 307):
+    raise ValueError("REDIRECT_STATUS_CODE must be 301, 302 or 307")
+# Сколько секунд браузеры и CDN могут отдавать редирект без обращения к сервису (0 — не кэшировать).
+# Повторные переходы из кэша не попадают в счётчик посещений
+REDIRECT_CACHE_MAX_AGE = int(os.getenv("REDIRECT_CACHE_MAX_AGE", 0))
+
+# Одновременные промахи по одному коду выполняют один запрос к БД
+LinkLoads = SingleFlight("link")
+
+
+async def load_link(short_code: str):
+    """
+    Загружает ссылку с реплики в отдельной сессии (её результат разделяют несколько запросов)
+    и заполняет кэш. Возвращает запись кэша или NOT_FOUND.
+    """
+    # Фильтр Блума отсекает заведомо несуществующие коды (сканеры, опечатки) без запроса к БД
+    present = await might_exist(short_code)
+    if present is False:
+        cache_missing(short_code)
+        return NOT_FOUND
+
+    async with ReadSessionLocal() as db:
+        link = await crud_link.get_link_by_short_code(db, short_code)
+    if not link and ReadRouter.replicas:
+        # Перед отрицательным кэшированием проверяем основную БД: реплика может отставать
+        async with AsyncSessionLocal() as db:
+            link = await crud_link.get_link_by_short_code(db, short_code)
+    if not link:
+        if present:
+            record_false_positive()
+        cache_missing(short_code)
+        return NOT_FOUND
+
+    with timed("cache"):
+        await cache_link(short_code, link.original_url, link.expires_at, link.id)
+    return {"original_url": link.original_url, "expires_at": link.expires_at, "id": link.id}
+
+
+async def track_visit(short_code: str, link_id, headers):
+    # Счётчик посещений и событие клика пишутся параллельно, без обращения к БД
+    await asyncio.gather(record_visit(short_code), emit_click(link_id, headers))
+
+
+def redirect_headers(record: dict) -> list:
+    """
+    Заголовки Location и Cache-Control для записи кэша в виде пар байтов ASGI.
+    Для бессрочных ссылок вычисляются один раз и сохраняются в самой записи.
+    """
+    headers = record.get("headers")
+    if headers is not None:
+        return headers
+
+    # То же экранирование, что у starlette.responses.RedirectResponse
+    location = quote(record["original_url"], safe=":/%#?=@[]!$&'()*+,;").encode("latin-1")
+    max_age = REDIRECT_CACHE_MAX_AGE
+    if record["expires_at"]:
+        # Кэш браузера не должен пережить срок действия ссылки
+        max_age = min(max_age, max(0, int((record["expires_at"] - datetime.utcnow()).total_seconds())))
+    cache_control = f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+    headers = [(b"location", location), (b"cache-control", cache_control.encode())]
+    if not record["expires_at"]:
+        record["headers"] = headers
+    return headers
+
+
+def is_expired(record: dict) -> bool:
+    return bool(record["expires_at"]) and record["expires_at"] < datetime.utcnow()
+
+
 @router.get(
     "/{short_code}",
     summary="Редирект по короткой ссылке",
     description="Перенаправляет пользователя на оригинальный URL, связанный с указанным коротким кодом. Если ссылка истекла, возвращается ошибка."
 )
-def redirect_to_original(short_code: str, db: Session = Depends(get_db)):
-    # 1. Сначала пробуем из кэша
-    redis_key = f"short_url:{short_code}"
-    original_url = RedisClient.get(redis_key)
-    if original_url:
-        link = crud_link.get_link_by_short_code(db, short_code)
-        crud_link.increment_visit(db, link)
-        return RedirectResponse(original_url)
-
-    # 2. Если нет в кэше — ищем в БД
-    link = crud_link.get_link_by_short_code(db, short_code)
-    if not link:
-        raise HTTPException(status_code=404, detail="Link not found")
+async def redirect_to_original(short_code: str, request: Request):
+    # 1. Сначала пробуем из кэша — без обращения к БД (если кэш уже проверил FastRedirect, пропускаем)
+    record = None
+    if not request.scope.get("fast_redirect_miss"):
+        with timed("cache"):
+            record = await get_cached_link(short_code)
+    source = "cache"
 
-    if link.expires_at and link.expires_at < datetime.utcnow():
+    # 2. Если нет в кэше — ищем в БД (один запрос на код, сколько бы промахов ни пришло).
+    # Промахи ограничены квотой на IP, чтобы перебор кодов не доходил до Postgres
+    if record is None:
+        await enforce_quota("redirect_miss", f"ip:{client_ip(request)}", REDIRECT_MISS_QUOTA)
+        record = await LinkLoads.do(short_code, lambda: load_link(short_code))
+        source = "db"
+
+    if record is NOT_FOUND:
+        REDIRECTS.labels("cache_negative" if source == "cache" else "not_found").inc()
+        raise HTTPException(status_code=404, detail="Link not found")
+    if is_expired(record):
+        REDIRECTS.labels("expired").inc()
         raise HTTPException(status_code=410, detail="Link expired")
 
-    # 3. Кэшируем и редиректим
-    RedisClient.set(redis_key, link.original_url)  # Кэшируем ссылку
-    crud_link.increment_visit(db, link)
-    return RedirectResponse(link.original_url)
+    # 3. Учитываем посещение и редиректим
+    REDIRECTS.labels(f"{source}_hit").inc()
+    await track_visit(short_code, record["id"], request.headers)
+    response = Response(status_code=REDIRECT_STATUS_CODE)
+    response.raw_headers.extend(redirect_headers(record))
+    return response
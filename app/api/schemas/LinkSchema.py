@@ -1,12 +1,26 @@
-from pydantic import BaseModel, AnyHttpUrl
-from typing import Optional
-from datetime import datetime
+from pydantic import AfterValidator, BaseModel, AnyHttpUrl
+from typing import Annotated, Optional
+from datetime import datetime, timezone
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    """
+    Колонки DateTime — TIMESTAMP WITHOUT TIME ZONE в UTC, и код сравнивает их с datetime.utcnow():
+    время со смещением ("2030-01-01T00:00:00Z") переводится в UTC без tzinfo.
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# Время из запроса, приведённое к UTC без часового пояса
+UtcDatetime = Annotated[datetime, AfterValidator(to_naive_utc)]
 
 # ----- Запрос на создание короткой ссылки -----
 class LinkCreate(BaseModel):
     original_url: AnyHttpUrl
     custom_alias: Optional[str] = None
-    expires_at: Optional[datetime] = None
+    expires_at: Optional[UtcDatetime] = None
 
 # ----- Ответ при создании -----
 class LinkResponse(BaseModel):
@@ -30,4 +44,4 @@ class LinkStats(BaseModel):
 # ----- Обновление ссылки -----
 class LinkUpdate(BaseModel):
     original_url: Optional[AnyHttpUrl]
-    expires_at: Optional[datetime]
\ No newline at end of file
+    expires_at: Optional[UtcDatetime]
\ No newline at end of file
@@ -1,62 +1,156 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
+from app.database.LinkPartitioning import LINKS_PARTITIONING
 from app.database.models.LinkModel import Link
 from app.api.schemas.LinkSchema import LinkCreate, LinkUpdate
-from typing import Optional
+from app.services.click_analytics import link_bucket_deletes
+from app.services.url_digest import url_digest, url_domain
+from typing import AsyncIterator, Dict, List, Optional, Sequence
 
 # Создает новую запись в таблице Link с указанным коротким кодом и данными ссылки.
 # Если user_id указан, то ссылка будет связана с пользователем.
-def create_link(db: Session, short_code: str, link: LinkCreate, user_id: Optional[int] = None) -> Link:
+async def create_link(db: AsyncSession, short_code: str, link: LinkCreate, user_id: Optional[int] = None) -> Link:
     db_link = Link(
         original_url=str(link.original_url),  # Преобразуем AnyUrl в строку
         short_code=short_code,
         custom_alias=link.custom_alias,
         expires_at=link.expires_at,
-        user_id=user_id
+        user_id=user_id,
+        url_digest=url_digest(str(link.original_url)),
+        domain=url_domain(str(link.original_url))
     )
     db.add(db_link)
-    db.commit()
-    db.refresh(db_link)
+    await db.commit()
+    await db.refresh(db_link)
     return db_link
 
+# Вставляет пачку ссылок одним многострочным INSERT ... ON CONFLICT DO NOTHING.
+# Строки с занятым short_code или custom_alias пропускаются.
+# Возвращает словарь short_code -> id для вставленных строк. Не выполняет commit.
+async def create_links_bulk(db: AsyncSession, rows: List[dict]) -> Dict[str, int]:
+    if not rows:
+        return {}
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    stmt = (
+        dialect.insert(Link)
+        .values(rows)
+        .on_conflict_do_nothing()
+        .returning(Link.short_code, Link.id)
+    )
+    if LINKS_PARTITIONING == "range" and dialect is postgresql:
+        # Уникальность short_code при RANGE-секционировании проверяет триггер (см. LinkPartitioning):
+        # просим его пропускать занятые коды, как это делает ON CONFLICT DO NOTHING
+        await db.execute(text("SELECT set_config('links.on_code_conflict', 'skip', true)"))
+        result = await db.execute(stmt)
+        rows = result.all()
+        await db.execute(text("SELECT set_config('links.on_code_conflict', '', true)"))
+    else:
+        rows = (await db.execute(stmt)).all()
+    return {short_code: link_id for short_code, link_id in rows}
+
 # Ищет ссылку по короткому коду.
 # Возвращает объект Link или None, если запись не найдена.
-def get_link_by_short_code(db: Session, short_code: str) -> Optional[Link]:
-    return db.query(Link).filter(Link.short_code == short_code).first()
+async def get_link_by_short_code(db: AsyncSession, short_code: str) -> Optional[Link]:
+    result = await db.execute(select(Link).where(Link.short_code == short_code))
+    return result.scalars().first()
 
 # Ищет ссылку по пользовательскому алиасу.
 # Возвращает объект Link или None, если запись не найдена.
-def get_link_by_custom_alias(db: Session, alias: str) -> Optional[Link]:
-    return db.query(Link).filter(Link.custom_alias == alias).first()
+async def get_link_by_custom_alias(db: AsyncSession, alias: str) -> Optional[Link]:
+    result = await db.execute(select(Link).where(Link.custom_alias == alias))
+    return result.scalars().first()
+
+# Ищет ссылку без алиаса и срока действия с тем же нормализованным URL
+# в пределах пользователя (или среди анонимных ссылок, если user_id = None).
+# Возвращает объект Link или None, если запись не найдена.
+async def get_link_by_url_digest(db: AsyncSession, digest: str, user_id: Optional[int]) -> Optional[Link]:
+    query = select(Link).where(
+        Link.url_digest == digest,
+        Link.user_id == user_id if user_id is not None else Link.user_id.is_(None),
+        Link.custom_alias.is_(None),
+        Link.expires_at.is_(None),
+    )
+    result = await db.execute(query.limit(1))
+    return result.scalars().first()
+
+# Строит запрос ссылок пользователя в порядке id (keyset-пагинация по индексу (user_id, id)).
+# Выбирает только указанные колонки, без загрузки ORM-объектов.
+# url_match: "contains" — подстрока (LIKE '%x%'), "prefix" — начало URL (LIKE 'x%');
+# оба варианта обслуживает триграммный индекс. domain — точное совпадение хоста.
+def user_links_query(
+    user_id: int, columns: Sequence, url_contains: Optional[str] = None, after_id: Optional[int] = None,
+    url_match: str = "contains", domain: Optional[str] = None
+):
+    query = select(Link.id, *columns).where(Link.user_id == user_id)
+    if url_contains:
+        if url_match == "prefix":
+            query = query.where(Link.original_url.startswith(url_contains, autoescape=True))
+        else:
+            query = query.where(Link.original_url.contains(url_contains, autoescape=True))
+    if domain:
+        query = query.where(Link.domain == domain.lower().removeprefix("www."))
+    if after_id:
+        query = query.where(Link.id > after_id)
+    return query.order_by(Link.id)
+
+# Возвращает страницу ссылок пользователя (не более limit строк) после after_id.
+async def list_user_links(
+    db: AsyncSession, user_id: int, columns: Sequence, limit: int,
+    url_contains: Optional[str] = None, after_id: Optional[int] = None,
+    url_match: str = "contains", domain: Optional[str] = None
+) -> list:
+    query = user_links_query(user_id, columns, url_contains, after_id, url_match, domain)
+    result = await db.execute(query.limit(limit))
+    return result.all()
+
+# Построчно отдаёт все ссылки пользователя через серверный курсор — память не растёт с числом ссылок.
+async def stream_user_links(
+    db: AsyncSession, user_id: int, columns: Sequence,
+    url_contains: Optional[str] = None, after_id: Optional[int] = None,
+    url_match: str = "contains", domain: Optional[str] = None
+) -> AsyncIterator:
+    query = user_links_query(user_id, columns, url_contains, after_id, url_match, domain)
+    query = query.execution_options(yield_per=1000)
+    result = await db.stream(query)
+    async for row in result:
+        yield row
 
 # Ищет ссылку по оригинальному URL.
 # Возвращает объект Link или None, если запись не найдена.
-def get_link_by_original_url(db: Session, url: str) -> Optional[Link]:
-    return db.query(Link).filter(Link.original_url == url).first()
+async def get_link_by_original_url(db: AsyncSession, url: str) -> Optional[Link]:
+    result = await db.execute(select(Link).where(Link.original_url == url))
+    return result.scalars().first()
 
 # Обновляет существующую запись в таблице Link.
 # Обновляет поля original_url и expires_at, если они указаны.
 # Возвращает обновленный объект Link.
-def update_link(db: Session, db_link: Link, link_update: LinkUpdate) -> Link:
+async def update_link(db: AsyncSession, db_link: Link, link_update: LinkUpdate) -> Link:
     if link_update.original_url:
         # Преобразуем AnyUrl в строку
         db_link.original_url = str(link_update.original_url)
+        db_link.url_digest = url_digest(db_link.original_url)
+        db_link.domain = url_domain(db_link.original_url)
     if link_update.expires_at:
         db_link.expires_at = link_update.expires_at
-    db.commit()
-    db.refresh(db_link)
+    await db.commit()
+    await db.refresh(db_link)
     return db_link
 
 # Удаляет запись из таблицы Link.
 # Не возвращает значения.
-def delete_link(db: Session, db_link: Link) -> None:
-    db.delete(db_link)
-    db.commit()
+async def delete_link(db: AsyncSession, db_link: Link) -> None:
+    # Агрегаты кликов не должны достаться ссылке, которая получит тот же id
+    for stmt in link_bucket_deletes([db_link.id]):
+        await db.execute(stmt)
+    await db.delete(db_link)
+    await db.commit()
 
 # Увеличивает счетчик посещений ссылки.
 # Обновляет поле last_visited текущей датой и временем.
 # Не возвращает значения.
-def increment_visit(db: Session, db_link: Link) -> None:
+async def increment_visit(db: AsyncSession, db_link: Link) -> None:
     db_link.visit_count += 1
     db_link.last_visited = datetime.utcnow()
-    db.commit()
+    await db.commit()
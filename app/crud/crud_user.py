@@ -1,22 +1,34 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.database.models.UserModel import User
 from app.api.schemas.UserSchema import UserCreate
 from typing import Optional
 import hashlib
 import uuid
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
 
-def create_user(db: Session, user_in: UserCreate) -> User:
+async def create_user(db: AsyncSession, user_in: UserCreate) -> User:
     hashed_password = hashlib.sha256(user_in.password.encode()).hexdigest()  # Хэшируем пароль
     token = str(uuid.uuid4())  # Генерируем уникальный токен
     db_user = User(email=user_in.email, hashed_password=hashed_password, token=token)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> Optional[User]:
     hashed_password = hashlib.sha256(password.encode()).hexdigest()
-    return db.query(User).filter(User.email == email, User.hashed_password == hashed_password).first()
\ No newline at end of file
+    result = await db.execute(select(User).where(User.email == email, User.hashed_password == hashed_password))
+    return result.scalars().first()
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> Optional[User]:
+    return await db.get(User, user_id)
+
+async def rotate_token(db: AsyncSession, db_user: User) -> User:
+    db_user.token = str(uuid.uuid4())  # Выпускаем новый токен, старый перестаёт действовать
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
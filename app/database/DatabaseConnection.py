@@ -1,12 +1,90 @@
 import os
+import uuid
 
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from dotenv import load_dotenv
 
+from app.database.DatabasePool import TimedAsyncQueuePool, TimedQueuePool
+from app.database.QueryTiming import instrument_engine
+from app.database.ReplicaRouting import ReplicaRouter, ReplicaSession
+
 load_dotenv()
 
-DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+# DATABASE_URL позволяет указать строку подключения целиком (например, SQLite для бенчмарков)
+DATABASE_URL = os.getenv("DATABASE_URL") or f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+
+# Настройки пула соединений
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Режим для работы через PgBouncer (transaction pooling): пулом управляет PgBouncer,
+# а подготовленные выражения asyncpg не кэшируются между транзакциями
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() == "true"
+
+# Реплики для чтения: строки подключения через запятую (пусто — все чтения идут в основную БД)
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# На сколько секунд реплика исключается из ротации после ошибки соединения
+DB_REPLICA_FAILURE_COOLDOWN_SECONDS = float(os.getenv("DB_REPLICA_FAILURE_COOLDOWN_SECONDS", 30))
+
+
+def to_async_url(url: str) -> str:
+    """
+    Подставляет асинхронный драйвер в строку подключения (asyncpg / aiosqlite).
+    """
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def engine_options(async_mode: bool = False) -> dict:
+    """
+    Параметры пула для create_engine / create_async_engine.
+    """
+    if DB_PGBOUNCER:
+        options = {"poolclass": NullPool}
+        if async_mode:
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            }
+        return options
+
+    return {
+        "poolclass": TimedAsyncQueuePool if async_mode else TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+# Синхронный движок — для фоновых задач, CLI и init_db
+engine = create_engine(DATABASE_URL, **engine_options())
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Асинхронный движок — для обработчиков HTTP-запросов
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(async_mode=True))
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Реплики — для чтений, которые допускают небольшое отставание (редирект, статистика, списки)
+replica_engines = [
+    create_async_engine(to_async_url(url), **engine_options(async_mode=True)) for url in DATABASE_REPLICA_URLS
+]
+ReadRouter = ReplicaRouter(async_engine, replica_engines, DB_REPLICA_FAILURE_COOLDOWN_SECONDS)
+ReadSessionLocal = async_sessionmaker(class_=ReplicaSession, router=ReadRouter, autoflush=False, expire_on_commit=False)
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
\ No newline at end of file
+# Длительность запросов всех движков — в /metrics и в Server-Timing
+instrument_engine(engine, "sync")
+instrument_engine(async_engine.sync_engine, "async")
+for replica in replica_engines:
+    instrument_engine(replica.sync_engine, "replica")
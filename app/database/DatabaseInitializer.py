@@ -1,7 +1,52 @@
 from app.database.BaseModel import Base
 from app.database.DatabaseConnection import engine
+from app.database.LinkPartitioning import create_links_table
 from app.database.models.LinkModel import Link
 from app.database.models.UserModel import User
+from app.database.models.CodeSequenceModel import CodeSequence
+from app.database.models.ClickBucketModel import HourlyClickBucket, DailyClickBucket
+
+from sqlalchemy import text
+
+# Расширения, которые должны существовать до создания таблиц и индексов
+POSTGRES_EXTENSIONS = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS btree_gin",
+]
+
+# Идемпотентные изменения схемы для таблиц, созданных предыдущими версиями
+# (create_all не добавляет новые колонки в существующие таблицы)
+POSTGRES_UPGRADES = [
+    "ALTER TABLE links ADD COLUMN IF NOT EXISTS url_digest VARCHAR(64)",
+    "CREATE INDEX IF NOT EXISTS ix_links_url_digest ON links USING hash (url_digest)",
+    "CREATE INDEX IF NOT EXISTS ix_links_expires_at ON links (expires_at)",
+    "CREATE INDEX IF NOT EXISTS ix_links_last_visited ON links (last_visited)",
+    "CREATE INDEX IF NOT EXISTS ix_links_user_id_id ON links (user_id, id)",
+    "ALTER TABLE links ADD COLUMN IF NOT EXISTS domain VARCHAR",
+    "CREATE INDEX IF NOT EXISTS ix_links_user_id_domain ON links (user_id, domain)",
+    "CREATE INDEX IF NOT EXISTS ix_links_user_id_url_trgm ON links USING gin (user_id, original_url gin_trgm_ops)",
+]
+
+
+def create_extensions():
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for statement in POSTGRES_EXTENSIONS:
+            conn.execute(text(statement))
+
+
+def upgrade_schema():
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for statement in POSTGRES_UPGRADES:
+            conn.execute(text(statement))
+
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    create_extensions()
+    # Секционированную links создаём сами: create_all её пропустит, т.к. таблица уже есть
+    create_links_table()
+    Base.metadata.create_all(bind=engine)
+    upgrade_schema()
\ No newline at end of file
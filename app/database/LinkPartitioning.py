@@ -0,0 +1,376 @@
+"""
+Секционирование таблицы links в Postgres.
+
+LINKS_PARTITIONING задаёт схему при создании таблицы в init_db:
+    none  — обычная таблица (по умолчанию);
+    hash  — HASH (short_code): поиск по коду затрагивает одну секцию;
+    range — RANGE (created_at) помесячно: старые месяцы удаляются целиком (DROP вместо DELETE).
+
+Обслуживание (создание будущих секций, удаление устаревших, перенос данных):
+    python -m app.database.LinkPartitioning status
+    python -m app.database.LinkPartitioning maintain
+    python -m app.database.LinkPartitioning migrate --batch-size 50000
+"""
+import argparse
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+from app.database.DatabaseConnection import engine
+
+load_dotenv()
+
+LINKS_PARTITIONING = os.getenv("LINKS_PARTITIONING", "none").lower()
+# Число секций для hash
+LINKS_HASH_PARTITIONS = int(os.getenv("LINKS_HASH_PARTITIONS", 16))
+# На сколько месяцев вперёд заранее создаются секции для range
+LINKS_RANGE_PREMAKE_MONTHS = int(os.getenv("LINKS_RANGE_PREMAKE_MONTHS", 3))
+# Сколько месяцев хранятся секции range (0 — не удалять)
+LINKS_RANGE_RETENTION_MONTHS = int(os.getenv("LINKS_RANGE_RETENTION_MONTHS", 0))
+LINKS_PARTITION_MAINTENANCE_HOURS = int(os.getenv("LINKS_PARTITION_MAINTENANCE_HOURS", 24))
+
+PARTITION_LOCK_KEY = "lock:link_partitions"
+PARTITION_LOCK_TIMEOUT_SECONDS = 600
+
+# Колонки повторяют модель Link; ключ секционирования входит во все уникальные ограничения
+LINKS_COLUMNS = """
+    id SERIAL NOT NULL,
+    original_url VARCHAR NOT NULL,
+    short_code VARCHAR NOT NULL,
+    custom_alias VARCHAR,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    expires_at TIMESTAMP WITHOUT TIME ZONE,
+    visit_count INTEGER,
+    last_visited TIMESTAMP WITHOUT TIME ZONE,
+    user_id INTEGER REFERENCES users (id),
+    url_digest VARCHAR(64),
+    domain VARCHAR
+"""
+
+# Индексы модели Link, которые не зависят от схемы секционирования
+LINKS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_links_id ON links (id)",
+    "CREATE INDEX IF NOT EXISTS ix_links_custom_alias ON links (custom_alias)",
+    "CREATE INDEX IF NOT EXISTS ix_links_expires_at ON links (expires_at)",
+    "CREATE INDEX IF NOT EXISTS ix_links_last_visited ON links (last_visited)",
+    "CREATE INDEX IF NOT EXISTS ix_links_url_digest ON links USING hash (url_digest)",
+    "CREATE INDEX IF NOT EXISTS ix_links_user_id_id ON links (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_links_user_id_domain ON links (user_id, domain)",
+    "CREATE INDEX IF NOT EXISTS ix_links_user_id_url_trgm ON links USING gin (user_id, original_url gin_trgm_ops)",
+]
+
+HASH_DDL = [
+    f"CREATE TABLE links ({LINKS_COLUMNS}, PRIMARY KEY (id, short_code)) PARTITION BY HASH (short_code)",
+    # Алиас всегда совпадает с short_code, поэтому уникальность short_code покрывает и алиасы
+    "CREATE UNIQUE INDEX ix_links_short_code ON links (short_code)",
+]
+
+# При RANGE (created_at) Postgres не может проверить уникальность short_code по всем секциям,
+# поэтому коды регистрируются в отдельной таблице триггерами.
+# Для многострочной вставки с ON CONFLICT DO NOTHING (links.on_code_conflict = skip)
+# строка с занятым кодом пропускается, иначе — ошибка unique_violation, как у обычного индекса.
+RANGE_DDL = [
+    f"CREATE TABLE links ({LINKS_COLUMNS}, PRIMARY KEY (id, created_at)) PARTITION BY RANGE (created_at)",
+    "CREATE INDEX ix_links_short_code ON links (short_code)",
+    "CREATE TABLE IF NOT EXISTS link_codes (short_code VARCHAR PRIMARY KEY, created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_link_codes_created_at ON link_codes (created_at)",
+    """
+    CREATE OR REPLACE FUNCTION links_claim_code() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO link_codes (short_code, created_at) VALUES (NEW.short_code, NEW.created_at)
+        ON CONFLICT DO NOTHING;
+        IF NOT FOUND THEN
+            IF current_setting('links.on_code_conflict', true) = 'skip' THEN
+                RETURN NULL;
+            END IF;
+            RAISE unique_violation USING MESSAGE = 'duplicate short_code: ' || NEW.short_code;
+        END IF;
+        RETURN NEW;
+    END $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION links_release_code() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM link_codes WHERE short_code = OLD.short_code;
+        RETURN NULL;
+    END $$ LANGUAGE plpgsql
+    """,
+    "CREATE TRIGGER links_claim_code BEFORE INSERT ON links FOR EACH ROW EXECUTE FUNCTION links_claim_code()",
+    "CREATE TRIGGER links_release_code AFTER DELETE ON links FOR EACH ROW EXECUTE FUNCTION links_release_code()",
+    "CREATE TABLE links_default PARTITION OF links DEFAULT",
+]
+
+
+def _month_start(value: datetime, shift: int = 0) -> datetime:
+    month = value.year * 12 + value.month - 1 + shift
+    return datetime(month // 12, month % 12 + 1, 1)
+
+
+def _range_partition_name(start: datetime) -> str:
+    return f"links_y{start.year}m{start.month:02d}"
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def current_layout(conn) -> str:
+    """
+    Фактическая схема таблицы links: none, hash или range.
+    """
+    if conn.dialect.name != "postgresql":
+        return "none"
+    strategy = conn.execute(text(
+        "SELECT partstrat FROM pg_partitioned_table WHERE partrelid = to_regclass('links')"
+    )).scalar()
+    return {"h": "hash", "r": "range"}.get(strategy, "none")
+
+
+def ensure_range_partitions(conn, first_month: datetime, last_month: datetime) -> List[str]:
+    """
+    Создаёт помесячные секции с first_month по last_month включительно. Возвращает созданные.
+    """
+    created = []
+    start = _month_start(first_month)
+    while start <= last_month:
+        end = _month_start(start, 1)
+        name = _range_partition_name(start)
+        if not _table_exists(conn, name):
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF links FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            created.append(name)
+        start = end
+    return created
+
+
+def create_partitioned_links(conn, layout: str, partitions: int = LINKS_HASH_PARTITIONS) -> None:
+    """
+    Создаёт секционированную таблицу links (в текущем search_path) со всеми индексами модели.
+    """
+    if layout == "hash":
+        for statement in HASH_DDL:
+            conn.execute(text(statement))
+        for remainder in range(partitions):
+            conn.execute(text(
+                f"CREATE TABLE links_p{remainder:02d} PARTITION OF links "
+                f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            ))
+    elif layout == "range":
+        for statement in RANGE_DDL:
+            conn.execute(text(statement))
+        now = datetime.utcnow()
+        ensure_range_partitions(conn, _month_start(now), _month_start(now, LINKS_RANGE_PREMAKE_MONTHS))
+    else:
+        raise ValueError(f"Unknown partitioning layout: {layout}")
+
+    for statement in LINKS_INDEXES:
+        conn.execute(text(statement))
+
+
+def create_links_table() -> None:
+    """
+    Вызывается из init_db до create_all: создаёт links секционированной,
+    если это задано в LINKS_PARTITIONING и таблицы ещё нет.
+    """
+    if LINKS_PARTITIONING == "none" or engine.dialect.name != "postgresql":
+        return
+    from app.database.models.UserModel import User
+
+    with engine.begin() as conn:
+        if _table_exists(conn, "links"):
+            return
+        User.__table__.create(conn, checkfirst=True)
+        create_partitioned_links(conn, LINKS_PARTITIONING)
+
+
+def _partitions(conn) -> list:
+    return conn.execute(text("""
+        SELECT c.relname AS name,
+               pg_get_expr(c.relpartbound, c.oid) AS bound,
+               c.reltuples::bigint AS rows_estimate,
+               pg_total_relation_size(c.oid) AS total_bytes
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass('links')
+        ORDER BY c.relname
+    """)).mappings().all()
+
+
+def partition_status() -> dict:
+    with engine.connect() as conn:
+        layout = current_layout(conn)
+        return {"layout": layout, "partitions": [dict(row) for row in _partitions(conn)] if layout != "none" else []}
+
+
+def _evict_partition(conn, name: str, batch_size: int = 5000) -> int:
+    """
+    Удаляет из Redis и локальных кэшей записи ссылок отсоединённой секции.
+    """
+    from app.redis.RedisConnection import RedisClient, evict_links
+    from app.services.url_digest import dedup_scope
+
+    evicted = 0
+    result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+        text(f"SELECT short_code, user_id, url_digest FROM {name}")
+    )
+    for rows in result.partitions(batch_size):
+        pipe = RedisClient.pipeline(transaction=False)
+        evict_links(pipe, [short_code for short_code, _, _ in rows])
+        for short_code, user_id, digest in rows:
+            if digest:
+                pipe.delete(f"dedup:{dedup_scope(user_id)}:{digest}")
+        pipe.execute()
+        evicted += len(rows)
+    return evicted
+
+
+def expired_partitions(conn, now: Optional[datetime] = None) -> List[str]:
+    """
+    Секции range, целиком лежащие старше LINKS_RANGE_RETENTION_MONTHS, и уже
+    отсоединённые секции, удаление которых прервалось.
+    """
+    if LINKS_RANGE_RETENTION_MONTHS <= 0:
+        return []
+    cutoff = _month_start(now or datetime.utcnow(), -LINKS_RANGE_RETENTION_MONTHS)
+    names = [partition["name"] for partition in _partitions(conn)]
+    names += conn.execute(text("""
+        SELECT c.relname FROM pg_class c
+        WHERE c.relkind = 'r' AND c.relname LIKE 'links\\_y%'
+          AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)
+    """)).scalars().all()
+    return sorted(
+        name for name in set(names)
+        if name != "links_default" and _month_start(datetime.strptime(name, "links_y%Ym%m"), 1) <= cutoff
+    )
+
+
+def drop_partition(name: str) -> int:
+    """
+    Отсоединяет секцию, вычищает её ссылки из кэшей и удаляет таблицу.
+    Кэш чистится после commit отсоединения: до него редирект ещё находит ссылку
+    в links и мог бы снова положить её в кэш. Возвращает количество ссылок секции.
+    """
+    start = datetime.strptime(name, "links_y%Ym%m")
+    end = _month_start(start, 1)
+    with engine.begin() as conn:
+        if name in {partition["name"] for partition in _partitions(conn)}:
+            conn.execute(text(f"ALTER TABLE links DETACH PARTITION {name}"))
+    with engine.connect() as conn:
+        evicted = _evict_partition(conn, name)
+    with engine.begin() as conn:
+        # DROP не вызывает триггеры удаления — освобождаем коды вручную
+        conn.execute(text("DELETE FROM link_codes WHERE created_at >= :start AND created_at < :end"), {"start": start, "end": end})
+        # Внешнего ключа у агрегатов кликов нет — удаляем их для ссылок секции
+        for bucket_table in ("click_buckets_hourly", "click_buckets_daily"):
+            conn.execute(text(f"DELETE FROM {bucket_table} WHERE link_id IN (SELECT id FROM {name})"))
+        conn.execute(text(f"DROP TABLE {name}"))
+    print(f"Секция {name} удалена ({evicted} ссылок)")
+    return evicted
+
+
+def maintain_partitions() -> dict:
+    """
+    Задача фонового воркера: для range создаёт секции на LINKS_RANGE_PREMAKE_MONTHS вперёд
+    и удаляет устаревшие. Для остальных схем ничего не делает.
+    """
+    if engine.dialect.name != "postgresql":
+        return {}
+    from app.redis.RedisConnection import RedisClient
+
+    lock = RedisClient.lock(PARTITION_LOCK_KEY, timeout=PARTITION_LOCK_TIMEOUT_SECONDS, blocking=False)
+    if not lock.acquire():
+        return {}
+    try:
+        with engine.begin() as conn:
+            if current_layout(conn) != "range":
+                return {}
+            now = datetime.utcnow()
+            created = ensure_range_partitions(conn, _month_start(now), _month_start(now, LINKS_RANGE_PREMAKE_MONTHS))
+            expired = expired_partitions(conn, now)
+        for name in expired:
+            drop_partition(name)
+        return {"created": created, "dropped": expired}
+    finally:
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+
+def migrate_links(layout: str, batch_size: int) -> int:
+    """
+    Переносит существующую обычную таблицу links в секционированную.
+    Старая таблица переименовывается в links_unpartitioned и остаётся для проверки.
+    Запускать при остановленной записи (веб-процессы и фоновый воркер выключены).
+    """
+    with engine.begin() as conn:
+        if current_layout(conn) != "none":
+            raise RuntimeError("links is already partitioned")
+        conn.execute(text("ALTER TABLE links RENAME TO links_unpartitioned"))
+        # Имена индексов уникальны в схеме — освобождаем их для новой таблицы
+        for (index_name,) in conn.execute(text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'links_unpartitioned'"
+        )).all():
+            conn.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name}_unpartitioned"))
+        create_partitioned_links(conn, layout)
+        if layout == "range":
+            oldest = conn.execute(text("SELECT min(created_at) FROM links_unpartitioned")).scalar()
+            if oldest:
+                ensure_range_partitions(conn, oldest, datetime.utcnow())
+
+    columns = "id, original_url, short_code, custom_alias, created_at, expires_at, visit_count, last_visited, user_id, url_digest, domain"
+    moved = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(text(f"""
+                WITH batch AS (
+                    SELECT {columns} FROM links_unpartitioned
+                    WHERE id > :last_id ORDER BY id LIMIT :limit
+                )
+                INSERT INTO links ({columns})
+                SELECT id, original_url, short_code, custom_alias, COALESCE(created_at, now() AT TIME ZONE 'utc'),
+                       expires_at, visit_count, last_visited, user_id, url_digest, domain
+                FROM batch
+                RETURNING id
+            """), {"last_id": last_id, "limit": batch_size}).scalars().all()
+        if not rows:
+            break
+        moved += len(rows)
+        last_id = max(rows)
+        print(f"Перенесено {moved} ссылок")
+
+    with engine.begin() as conn:
+        conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('links', 'id'), COALESCE((SELECT max(id) FROM links), 0) + 1, false)"
+        ))
+        conn.execute(text("ANALYZE links"))
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Обслуживание секционированной таблицы links")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="схема и размеры секций")
+    commands.add_parser("maintain", help="создать будущие и удалить устаревшие секции (range)")
+    migrate = commands.add_parser("migrate", help="перенести обычную таблицу links в секционированную")
+    migrate.add_argument("--layout", choices=("hash", "range"), default=LINKS_PARTITIONING if LINKS_PARTITIONING != "none" else "hash")
+    migrate.add_argument("--batch-size", type=int, default=50000)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        status = partition_status()
+        print(f"Схема: {status['layout']}")
+        for partition in status["partitions"]:
+            print(f"{partition['name']:<24} {partition['bound']:<60} ~{partition['rows_estimate']} строк, {partition['total_bytes'] // 1024 // 1024} МБ")
+    elif args.command == "maintain":
+        print(maintain_partitions())
+    else:
+        print(f"Перенесено всего: {migrate_links(args.layout, args.batch_size)}")
+
+
+if __name__ == "__main__":
+    main()
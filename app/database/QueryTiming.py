@@ -0,0 +1,28 @@
+import time
+
+from sqlalchemy import event
+
+from app.metrics.Prometheus import DB_QUERY_DURATION
+from app.metrics.RequestTiming import add_timing
+
+
+def _statement_type(statement: str) -> str:
+    keyword = statement.lstrip().split(None, 1)[0].lower() if statement.strip() else ""
+    return keyword if keyword in ("select", "insert", "update", "delete", "with") else "other"
+
+
+def instrument_engine(engine, name: str) -> None:
+    """
+    Подписывается на события выполнения запросов движка: пишет длительность
+    в гистограмму и в фазу db текущего HTTP-запроса.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        DB_QUERY_DURATION.labels(name, _statement_type(statement)).observe(elapsed)
+        add_timing("db", elapsed)
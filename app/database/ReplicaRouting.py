@@ -0,0 +1,72 @@
+import itertools
+import time
+from typing import List
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+
+class ReplicaRouter:
+    """
+    Выбирает реплику для чтения по кругу, пропуская реплики, недавно давшие сбой.
+    Если исправных реплик нет (или они не настроены), возвращает основной движок.
+    """
+
+    def __init__(self, primary: AsyncEngine, replicas: List[AsyncEngine], failure_cooldown: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.failure_cooldown = failure_cooldown
+        self._order = itertools.count()
+        self._down_until = {}
+
+    def pick(self, exclude=()) -> AsyncEngine:
+        now = time.monotonic()
+        start = next(self._order)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if replica not in exclude and self._down_until.get(replica, 0) <= now:
+                return replica
+        return self.primary
+
+    def mark_failed(self, replica: AsyncEngine) -> None:
+        if replica is not self.primary:
+            self._down_until[replica] = time.monotonic() + self.failure_cooldown
+            print(f"Реплика {replica.url.host} недоступна, исключена на {self.failure_cooldown} с")
+
+    def snapshot(self) -> list:
+        now = time.monotonic()
+        return [
+            {"host": replica.url.host, "healthy": self._down_until.get(replica, 0) <= now}
+            for replica in self.replicas
+        ]
+
+
+class ReplicaSession(AsyncSession):
+    """
+    Сессия только для чтения: при ошибке соединения с репликой помечает её
+    неисправной и повторяет запрос на следующей реплике или на основной БД.
+    """
+
+    def __init__(self, bind=None, *, router: ReplicaRouter, **kwargs):
+        super().__init__(bind=bind or router.pick(), **kwargs)
+        self.router = router
+        self._failed = []
+
+    async def execute(self, *args, **kwargs):
+        return await self._with_failover(super().execute, *args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        return await self._with_failover(super().stream, *args, **kwargs)
+
+    async def _with_failover(self, method, *args, **kwargs):
+        while True:
+            try:
+                return await method(*args, **kwargs)
+            except (OperationalError, InterfaceError, OSError):
+                if self.bind is self.router.primary:
+                    raise
+                self.router.mark_failed(self.bind)
+                self._failed.append(self.bind)
+                await self.rollback()
+                self.bind = self.router.pick(exclude=self._failed)
+                self.sync_session.bind = self.bind.sync_engine
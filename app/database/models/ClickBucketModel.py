@@ -0,0 +1,22 @@
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime
+from app.database.BaseModel import Base
+
+class ClickBucketColumns:
+    """
+    Общие колонки агрегатов кликов: ссылка, начало интервала и измерения.
+    Пустая строка в измерении означает "неизвестно".
+    """
+    link_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    referrer = Column(String, primary_key=True, default="")
+    ua_class = Column(String, primary_key=True, default="")
+    country = Column(String(2), primary_key=True, default="")
+    clicks = Column(BigInteger, nullable=False, default=0)
+
+
+class HourlyClickBucket(ClickBucketColumns, Base):
+    __tablename__ = "click_buckets_hourly"
+
+
+class DailyClickBucket(ClickBucketColumns, Base):
+    __tablename__ = "click_buckets_daily"
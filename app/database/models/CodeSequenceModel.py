@@ -0,0 +1,9 @@
+from sqlalchemy import Column, Integer, BigInteger
+from app.database.BaseModel import Base
+
+class CodeSequence(Base):
+    __tablename__ = "code_sequence"
+
+    # Единственная строка-счётчик, из которой воркеры арендуют блоки идентификаторов
+    id = Column(Integer, primary_key=True)
+    next_value = Column(BigInteger, nullable=False, default=0)
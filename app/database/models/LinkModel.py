@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.BaseModel import Base
@@ -13,9 +13,24 @@ class Link(Base):
     short_code = Column(String, unique=True, index=True, nullable=False)
     custom_alias = Column(String, unique=True, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
     visit_count = Column(Integer, default=0)
-    last_visited = Column(DateTime, nullable=True)
+    last_visited = Column(DateTime, nullable=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    # SHA-256 нормализованного original_url — для дедупликации
+    url_digest = Column(String(64), nullable=True)
+    # Хост original_url — для фильтра по домену
+    domain = Column(String, nullable=True)
 
-    user = relationship("User", back_populates="links")
\ No newline at end of file
+    user = relationship("User", back_populates="links")
+
+    __table_args__ = (
+        Index("ix_links_url_digest", "url_digest", postgresql_using="hash"),
+        Index("ix_links_user_id_id", "user_id", "id"),
+        Index("ix_links_user_id_domain", "user_id", "domain"),
+        # Триграммный GIN-индекс для поиска подстроки в URL (нужны pg_trgm и btree_gin)
+        Index(
+            "ix_links_user_id_url_trgm", "user_id", "original_url",
+            postgresql_using="gin", postgresql_ops={"original_url": "gin_trgm_ops"},
+        ),
+    )
\ No newline at end of file
@@ -1,13 +1,17 @@
 from fastapi import FastAPI
-from app.api.routes import RouteAuth, RouteLinks, RouteRedirect
+from app.api.routes import RouteAuth, RouteLinks, RouteMetrics, RouteRedirect
+from app.api.FastRedirect import FastRedirectMiddleware, REDIRECT_FAST_PATH
+from app.api.LoadShedding import LoadSheddingMiddleware, LOAD_SHED_ENABLED
 from app.database.DatabaseInitializer import init_db
 from dotenv import load_dotenv
+import asyncio
 import os
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from datetime import datetime, timedelta
-from app.database.DatabaseConnection import SessionLocal
-from app.database.models.LinkModel import Link
+from app.database.DatabaseConnection import async_engine
+from app.database.DatabasePool import TimedQueuePool
+from app.metrics.RequestTiming import ServerTimingMiddleware, TimedJSONResponse
+from app.redis.RedisConnection import AsyncLinkCacheClient, AsyncRedisClient, start_invalidation_listener
+from app.services.visit_counter import VISIT_BUFFER, flush_memory_visits_periodically, flush_visits
 
 # Загружаем переменные окружения из .env
 load_dotenv()
@@ -22,39 +26,52 @@ REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = os.getenv("REDIS_PORT")
 BASE_URL = os.getenv("BASE_URL")
 
-app = FastAPI(title="URL Shortener Service")
+app = FastAPI(title="URL Shortener Service", default_response_class=TimedJSONResponse)
 
 app.include_router(RouteAuth.router, prefix="/auth")
 app.include_router(RouteLinks.router, prefix="/links")
+app.include_router(RouteMetrics.router, prefix="/metrics")
 app.include_router(RouteRedirect.router)
 
+# Последний добавленный middleware — внешний: Server-Timing учитывает и быстрый путь редиректа,
+# а сброс нагрузки стоит за ним и не затрагивает редиректы из кэша
+if LOAD_SHED_ENABLED and isinstance(async_engine.pool, TimedQueuePool):
+    app.add_middleware(LoadSheddingMiddleware, engine=async_engine)
+if REDIRECT_FAST_PATH:
+    app.add_middleware(
+        FastRedirectMiddleware,
+        # Не у всех элементов app.routes есть path (например, у подключённых роутеров)
+        reserved_paths=[
+            path for path in (getattr(route, "path", "") for route in app.routes)
+            if path.count("/") == 1 and "{" not in path
+        ],
+    )
+app.add_middleware(ServerTimingMiddleware)
 
-def delete_old_links():
-    """
-    Удаляет ссылки, которые не использовались более 14 дней.
-    """
-    db = SessionLocal()
-    try:
-        threshold_date = datetime.utcnow() - timedelta(days=14)
-        old_links = db.query(Link).filter(Link.last_visited < threshold_date).all()
-
-        for link in old_links:
-            print(f"Удаление ссылки: {link.short_code} -> {link.original_url}")
-            db.delete(link)
-
-        db.commit()
-    except Exception as e:
-        print(f"Ошибка при удалении старых ссылок: {e}")
-    finally:
-        db.close()
-
-scheduler = BackgroundScheduler()
-scheduler.add_job(delete_old_links, "interval", minutes=60)
-scheduler.start()
 
+# Периодические задачи (очистка, сброс посещений, агрегация кликов, прогрев кэша)
+# выполняет отдельный процесс: python -m app.worker
+_visit_flusher = None
 
 
 @app.on_event("startup")
-def startup():
+async def startup():
     init_db()
+    start_invalidation_listener()
+    if VISIT_BUFFER == "memory":
+        # Буфер в памяти процесса не виден воркеру — сбрасываем его сами
+        global _visit_flusher
+        _visit_flusher = asyncio.create_task(flush_memory_visits_periodically())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Сбрасываем накопленные в памяти посещения перед остановкой процесса
+    if _visit_flusher is not None:
+        _visit_flusher.cancel()
+        flush_visits()
+    await AsyncRedisClient.aclose()
+    if AsyncLinkCacheClient is not AsyncRedisClient:
+        await AsyncLinkCacheClient.aclose()
+    await async_engine.dispose()
 
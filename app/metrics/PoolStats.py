@@ -0,0 +1,70 @@
+import threading
+import time
+
+# Недавнее ожидание соединения затухает вдвое за это время, если выдач нет
+RECENT_WAIT_HALF_LIFE_SECONDS = 1.0
+# Вес нового замера в скользящем среднем недавнего ожидания
+RECENT_WAIT_WEIGHT = 0.2
+
+
+class PoolStats:
+    """
+    Счётчики пула соединений: выдачи, время ожидания свободного соединения,
+    таймауты и число соединений, занятых в данный момент.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.in_use = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._recent_wait = 0.0
+        self._recent_at = time.monotonic()
+
+    def _decayed_wait(self, now: float) -> float:
+        return self._recent_wait * 0.5 ** ((now - self._recent_at) / RECENT_WAIT_HALF_LIFE_SECONDS)
+
+    def _observe_wait(self, wait_seconds: float) -> None:
+        now = time.monotonic()
+        self._recent_wait = self._decayed_wait(now) * (1 - RECENT_WAIT_WEIGHT) + wait_seconds * RECENT_WAIT_WEIGHT
+        self._recent_at = now
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def recent_wait_seconds(self) -> float:
+        """
+        Скользящее среднее ожидания за последние выдачи; затухает, пока выдач нет.
+        """
+        with self._lock:
+            return self._decayed_wait(time.monotonic())
+
+    def record_checkout(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self._observe_wait(wait_seconds)
+
+    def record_timeout(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.timeouts += 1
+            self._observe_wait(wait_seconds)
+
+    def record_release(self) -> None:
+        with self._lock:
+            self.in_use = max(0, self.in_use - 1)
+
+    def snapshot(self, capacity=None) -> dict:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "in_use": self.in_use,
+                "capacity": capacity,
+                "saturation": round(self.in_use / capacity, 3) if capacity else None,
+                "timeouts": self.timeouts,
+                "wait_seconds_avg": round(self.wait_seconds_total / attempts, 6) if attempts else 0.0,
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "wait_seconds_recent": round(self._decayed_wait(time.monotonic()), 6),
+            }
@@ -0,0 +1,124 @@
+import asyncio
+import functools
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Границы корзин в секундах: от долей миллисекунды (кэш) до секунд (тяжёлые выборки)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Длительность обработки HTTP-запроса",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+REDIRECTS = Counter(
+    "redirects_total",
+    "Результаты редиректов: cache_hit, cache_negative, db_hit, not_found, expired",
+    ["result"],
+)
+
+CACHE_LOOKUPS = Counter(
+    "link_cache_lookups_total",
+    "Обращения к кэшу ссылок по уровням (local, redis) и результату (hit, miss, negative, error)",
+    ["tier", "result"],
+)
+
+CODE_FILTER_CHECKS = Counter(
+    "code_filter_checks_total",
+    "Проверки фильтра кодов при промахе кэша: absent, maybe, false_positive, not_built, error",
+    ["result"],
+)
+
+SINGLE_FLIGHT_CALLS = Counter(
+    "single_flight_calls_total",
+    "Загрузки при промахе кэша: leader — выполнил запрос, shared — дождался чужого результата",
+    ["name", "role"],
+)
+
+RATE_LIMITED = Counter(
+    "rate_limited_total",
+    "Запросы, отклонённые ограничителем частоты (429), по правилу",
+    ["rule"],
+)
+
+LOAD_SHED = Counter(
+    "load_shed_total",
+    "Запросы, отклонённые из-за перегрузки пула БД (503)",
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "Длительность SQL-запросов по движку (sync, async) и типу выражения",
+    ["engine", "statement"],
+    buckets=LATENCY_BUCKETS,
+)
+
+REDIS_COMMAND_DURATION = Histogram(
+    "redis_command_duration_seconds",
+    "Длительность команд Redis (конвейер учитывается как одна команда pipeline)",
+    ["client", "command"],
+    buckets=LATENCY_BUCKETS,
+)
+
+JOB_DURATION = Histogram(
+    "scheduler_job_duration_seconds",
+    "Длительность фоновых задач воркера",
+    ["job"],
+    buckets=JOB_BUCKETS,
+)
+
+JOB_FAILURES = Counter(
+    "scheduler_job_failures_total",
+    "Число завершившихся ошибкой запусков фоновых задач",
+    ["job"],
+)
+
+
+def timed_job(func):
+    """
+    Оборачивает фоновую задачу (обычную или async): пишет длительность и число ошибок.
+    """
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                JOB_FAILURES.labels(func.__name__).inc()
+                raise
+            finally:
+                JOB_DURATION.labels(func.__name__).observe(time.perf_counter() - started)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            JOB_FAILURES.labels(func.__name__).inc()
+            raise
+        finally:
+            JOB_DURATION.labels(func.__name__).observe(time.perf_counter() - started)
+
+    return wrapper
+
+
+def render_metrics():
+    """
+    Возвращает (тело, content-type) в текстовом формате Prometheus.
+    При PROMETHEUS_MULTIPROC_DIR метрики собираются со всех процессов uvicorn/gunicorn.
+    """
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,84 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+
+from app.metrics.Prometheus import HTTP_REQUEST_DURATION
+
+# Накопленное время по фазам текущего запроса (cache, db, redis, serialize)
+_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+
+
+def add_timing(phase: str, seconds: float) -> None:
+    """
+    Добавляет время к фазе текущего запроса. Вне запроса (фоновые задачи) ничего не делает.
+    """
+    timings = _timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(phase, time.perf_counter() - started)
+
+
+def format_server_timing(timings: dict, total: float) -> str:
+    entries = [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class TimedJSONResponse(JSONResponse):
+    """
+    JSONResponse, который учитывает сериализацию тела в фазе serialize.
+    """
+
+    def render(self, content) -> bytes:
+        with timed("serialize"):
+            return super().render(content)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI-middleware: добавляет заголовок Server-Timing с разбивкой по фазам
+    и пишет длительность запроса в гистограмму по шаблону маршрута.
+    Фазы могут пересекаться (cache включает обращения к Redis).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        timings = {}
+        token = _timings.set(timings)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = format_server_timing(timings, time.perf_counter() - started)
+                message["headers"] = [*message.get("headers", []), (b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
+            # Шаблон маршрута (/{short_code}), а не сам путь — чтобы не раздувать число серий
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
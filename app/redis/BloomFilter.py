@@ -0,0 +1,183 @@
+import hashlib
+import math
+import time
+from typing import Iterable, Optional, Tuple
+
+# Позиции битов вычисляются двойным хешированием: (h1 + i * h2) mod bits, i = 0..hashes-1.
+# h1 и h2 считает клиент (SHA-1 кода), а размеры фильтра скрипт берёт из метаданных,
+# поэтому проверка и добавление не зависят от того, какой размер видит воркер.
+CHECK_SCRIPT = """
+local meta = redis.call('HMGET', KEYS[2], 'bits', 'hashes')
+if not meta[1] then
+    return -1
+end
+local bits = tonumber(meta[1])
+local h1 = tonumber(ARGV[1])
+local h2 = tonumber(ARGV[2])
+for i = 0, tonumber(meta[2]) - 1 do
+    if redis.call('GETBIT', KEYS[1], (h1 + i * h2) % bits) == 0 then
+        return 0
+    end
+end
+return 1
+"""
+
+# Добавляет коды в действующий фильтр и, если идёт перестройка, в строящийся
+ADD_SCRIPT = """
+for f = 1, #KEYS, 2 do
+    local meta = redis.call('HMGET', KEYS[f + 1], 'bits', 'hashes')
+    if meta[1] then
+        local bits = tonumber(meta[1])
+        local hashes = tonumber(meta[2])
+        for a = 1, #ARGV, 2 do
+            local h1 = tonumber(ARGV[a])
+            local h2 = tonumber(ARGV[a + 1])
+            for i = 0, hashes - 1 do
+                redis.call('SETBIT', KEYS[f], (h1 + i * h2) % bits, 1)
+            end
+        end
+        redis.call('HINCRBY', KEYS[f + 1], 'added', #ARGV / 2)
+    end
+end
+return 1
+"""
+
+# Максимальный размер строки Redis — 2^32 бит
+MAX_BITS = 2 ** 32 - 1
+
+
+def code_hashes(code: str) -> Tuple[int, int]:
+    digest = hashlib.sha1(code.encode()).digest()
+    return int.from_bytes(digest[:4], "big"), int.from_bytes(digest[4:8], "big") | 1
+
+
+def optimal_size(items: int, false_positive_rate: float) -> Tuple[int, int]:
+    """
+    Число бит и хеш-функций для заданного числа элементов и доли ложных срабатываний.
+    """
+    items = max(items, 1)
+    bits = min(MAX_BITS, math.ceil(-items * math.log(false_positive_rate) / math.log(2) ** 2))
+    hashes = max(1, round(bits / items * math.log(2)))
+    return bits, hashes
+
+
+def estimated_false_positive_rate(bits: int, hashes: int, items: int) -> float:
+    return (1 - math.exp(-hashes * items / bits)) ** hashes if bits else 1.0
+
+
+class RedisBloomFilter:
+    """
+    Фильтр Блума на битовой строке Redis, общий для всех воркеров.
+    Метаданные (размер, число хешей, счётчики) лежат в отдельном хеше; пока его нет,
+    фильтр считается непостроенным и проверка возвращает None.
+    """
+
+    def __init__(self, key: str, client, async_client):
+        self.key = key
+        self.meta_key = f"{key}:meta"
+        self.next_key = f"{key}:next"
+        self.next_meta_key = f"{key}:next:meta"
+        self.client = client
+        self._check = async_client.register_script(CHECK_SCRIPT)
+        self._add = async_client.register_script(ADD_SCRIPT)
+        self._add_sync = client.register_script(ADD_SCRIPT)
+
+    async def might_contain(self, code: str) -> Optional[bool]:
+        """
+        False — кода точно нет; True — возможно есть; None — фильтр не построен.
+        """
+        result = await self._check(keys=[self.key, self.meta_key], args=list(code_hashes(code)))
+        return None if result == -1 else bool(result)
+
+    def _add_args(self, codes: Iterable[str]) -> list:
+        args = []
+        for code in codes:
+            args.extend(code_hashes(code))
+        return args
+
+    async def add(self, codes: Iterable[str]) -> None:
+        args = self._add_args(codes)
+        if args:
+            await self._add(keys=[self.key, self.meta_key, self.next_key, self.next_meta_key], args=args)
+
+    def add_sync(self, codes: Iterable[str]) -> None:
+        """
+        Синхронный вариант add() — для CLI и фоновых задач.
+        """
+        args = self._add_args(codes)
+        if args:
+            self._add_sync(keys=[self.key, self.meta_key, self.next_key, self.next_meta_key], args=args)
+
+    def record_removed(self, count: int) -> None:
+        """
+        Удалённые коды остаются в фильтре до перестройки — учитываем их для оценки.
+        """
+        if count and self.client.exists(self.meta_key):
+            self.client.hincrby(self.meta_key, "removed", count)
+
+    def begin_rebuild(self, expected_items: int, false_positive_rate: float) -> Tuple[int, int]:
+        """
+        Создаёт пустой строящийся фильтр. С этого момента add() пишет коды и в него,
+        поэтому выборку кодов для fill_rebuild() нужно начинать после этого вызова —
+        иначе коды, созданные между началом выборки и созданием фильтра, потеряются.
+        """
+        bits, hashes = optimal_size(expected_items, false_positive_rate)
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self.next_key, self.next_meta_key)
+        pipe.hset(self.next_meta_key, mapping={"bits": bits, "hashes": hashes, "added": 0, "removed": 0})
+        pipe.execute()
+        # Выделяем строку целиком сразу (INCRBY 0 не меняет бит), чтобы не перераспределять её по мере роста
+        self.client.bitfield(self.next_key).incrby("u1", bits - 1, 0).execute()
+        return bits, hashes
+
+    def fill_rebuild(self, codes: Iterable[str], bits: int, hashes: int, chunk_size: int = 2000) -> int:
+        """
+        Записывает коды в строящийся фильтр. Возвращает их число.
+        """
+        items = 0
+        batch = []
+        for code in codes:
+            batch.append(code)
+            if len(batch) >= chunk_size:
+                self._set_bits(batch, bits, hashes)
+                items += len(batch)
+                batch = []
+        if batch:
+            self._set_bits(batch, bits, hashes)
+            items += len(batch)
+        return items
+
+    def swap_rebuild(self, items: int) -> None:
+        """
+        Атомарно подменяет действующий фильтр построенным.
+        """
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self.next_meta_key, mapping={"items": items, "built_at": int(time.time())})
+        pipe.rename(self.next_key, self.key)
+        pipe.rename(self.next_meta_key, self.meta_key)
+        pipe.execute()
+
+    def _set_bits(self, codes: list, bits: int, hashes: int) -> None:
+        bitfield = self.client.bitfield(self.next_key)
+        for code in codes:
+            h1, h2 = code_hashes(code)
+            for i in range(hashes):
+                bitfield.set("u1", (h1 + i * h2) % bits, 1)
+        bitfield.execute()
+
+    def stats(self) -> dict:
+        meta = self.client.hgetall(self.meta_key)
+        if not meta:
+            return {"built": False}
+        bits, hashes = int(meta["bits"]), int(meta["hashes"])
+        items = int(meta.get("items", 0)) + int(meta.get("added", 0))
+        return {
+            "built": True,
+            "built_at": int(meta.get("built_at", 0)),
+            "bits": bits,
+            "hashes": hashes,
+            "memory_bytes": bits // 8,
+            "items": items,
+            "removed_since_build": int(meta.get("removed", 0)),
+            "estimated_false_positive_rate": round(estimated_false_positive_rate(bits, hashes, items), 6),
+        }
@@ -0,0 +1,159 @@
+import json
+import time
+import uuid
+from typing import Optional
+
+# Продлевает или снимает лидерство, только если ключ всё ещё принадлежит этому воркеру
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaderElection:
+    """
+    Лидерство среди воркеров через ключ с TTL. Лидер продлевает ключ чаще, чем он истекает;
+    если лидер завис или упал, ключ истекает и лидером становится другой воркер.
+    """
+
+    def __init__(self, client, key: str, identity: str, ttl_seconds: float):
+        self.client = client
+        self.key = key
+        self.identity = identity
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.is_leader = False
+        self._renew = client.register_script(RENEW_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    async def acquire_or_renew(self) -> bool:
+        if self.is_leader and await self._renew(keys=[self.key], args=[self.identity, self.ttl_ms]):
+            return True
+        self.is_leader = bool(await self.client.set(self.key, self.identity, nx=True, px=self.ttl_ms))
+        return self.is_leader
+
+    async def release(self) -> None:
+        if self.is_leader:
+            await self._release(keys=[self.key], args=[self.identity])
+            self.is_leader = False
+
+    async def leader(self) -> Optional[str]:
+        return await self.client.get(self.key)
+
+
+DEFAULT_QUEUE = "default"
+
+
+class RedisJobQueue:
+    """
+    Надёжная очередь задач на списках Redis. Взятая задача атомарно (BLMOVE) переносится
+    в список обрабатываемых задачами воркера и удаляется оттуда после выполнения;
+    задачи воркера, переставшего присылать heartbeat, возвращаются в очередь.
+
+    Очередей может быть несколько (у каждой свои списки), чтобы короткие задачи
+    не ждали за длинными; статистика, расписание и heartbeat общие.
+    """
+
+    def __init__(self, client, prefix: str = "jobs", queues: tuple = (DEFAULT_QUEUE,)):
+        self.client = client
+        self.prefix = prefix
+        self.queues = queues
+        self.stats_key = f"{prefix}:stats"
+        self.schedule_key = f"{prefix}:schedule"
+
+    def _queue_prefix(self, queue: str) -> str:
+        # Ключи очереди по умолчанию остались прежними (jobs:queue, jobs:processing:*)
+        return self.prefix if queue == DEFAULT_QUEUE else f"{self.prefix}:{queue}"
+
+    def queue_key(self, queue: str = DEFAULT_QUEUE) -> str:
+        return f"{self._queue_prefix(queue)}:queue"
+
+    def processing_key(self, worker_id: str, queue: str = DEFAULT_QUEUE) -> str:
+        return f"{self._queue_prefix(queue)}:processing:{worker_id}"
+
+    def heartbeat_key(self, worker_id: str) -> str:
+        return f"{self.prefix}:worker:{worker_id}"
+
+    def pending_key(self, name: str) -> str:
+        return f"{self.prefix}:pending:{name}"
+
+    async def enqueue(self, name: str, args: Optional[dict] = None, unique_for: Optional[int] = None,
+                      queue: str = DEFAULT_QUEUE) -> bool:
+        """
+        Ставит задачу в очередь. С unique_for задача не ставится повторно, пока
+        предыдущая такая же не выполнена (но не дольше unique_for секунд).
+        """
+        job_id = uuid.uuid4().hex
+        if unique_for and not await self.client.set(self.pending_key(name), job_id, nx=True, ex=unique_for):
+            return False
+        payload = json.dumps({"id": job_id, "name": name, "args": args or {}, "enqueued_at": time.time(), "queue": queue})
+        await self.client.lpush(self.queue_key(queue), payload)
+        return True
+
+    async def take(self, worker_id: str, timeout: float, queue: str = DEFAULT_QUEUE) -> Optional[tuple]:
+        """
+        Ждёт задачу из очереди queue до timeout секунд. Возвращает (задача, исходная строка) или None.
+        """
+        raw = await self.client.blmove(
+            self.queue_key(queue), self.processing_key(worker_id, queue), timeout, "RIGHT", "LEFT"
+        )
+        if raw is None:
+            return None
+        return json.loads(raw), raw
+
+    async def complete(self, worker_id: str, job: dict, raw: str, seconds: float, error: Optional[str]) -> None:
+        name = job["name"]
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.lrem(self.processing_key(worker_id, job.get("queue", DEFAULT_QUEUE)), 1, raw)
+            pipe.delete(self.pending_key(name))
+            pipe.hset(self.stats_key, mapping={
+                f"{name}:finished_at": int(time.time()),
+                f"{name}:seconds": round(seconds, 3),
+                f"{name}:wait_seconds": round(time.time() - seconds - job["enqueued_at"], 3),
+                f"{name}:error": error or "",
+            })
+            pipe.hincrby(self.stats_key, f"{name}:{'failures' if error else 'runs'}", 1)
+            await pipe.execute()
+
+    async def heartbeat(self, worker_id: str, ttl_seconds: float) -> None:
+        await self.client.set(self.heartbeat_key(worker_id), int(time.time()), px=int(ttl_seconds * 1000))
+
+    async def unregister(self, worker_id: str) -> None:
+        await self.client.delete(self.heartbeat_key(worker_id))
+
+    async def requeue_orphaned(self) -> int:
+        """
+        Возвращает в очередь задачи воркеров без heartbeat (упали во время выполнения).
+        """
+        requeued = 0
+        for queue in self.queues:
+            prefix = self.processing_key("", queue)
+            async for key in self.client.scan_iter(match=f"{prefix}*"):
+                worker_id = key[len(prefix):]
+                if await self.client.exists(self.heartbeat_key(worker_id)):
+                    continue
+                while await self.client.lmove(key, self.queue_key(queue), "RIGHT", "LEFT"):
+                    requeued += 1
+        return requeued
+
+    async def status(self) -> dict:
+        stats = await self.client.hgetall(self.stats_key)
+        jobs = {}
+        for field, value in stats.items():
+            name, _, metric = field.rpartition(":")
+            jobs.setdefault(name, {})[metric] = value
+        workers = [key[len(self.heartbeat_key("")):] async for key in self.client.scan_iter(match=self.heartbeat_key("*"))]
+        return {
+            "queued": {queue: await self.client.llen(self.queue_key(queue)) for queue in self.queues},
+            "workers": sorted(workers),
+            "next_runs": {name: float(at) for name, at in (await self.client.hgetall(self.schedule_key)).items()},
+            "jobs": jobs,
+        }
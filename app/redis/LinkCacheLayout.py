@@ -0,0 +1,174 @@
+import calendar
+import json
+import os
+import random
+import zlib
+from datetime import datetime
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Раскладка записей ссылок в Redis:
+#   hash   — коды сгруппированы в хеши-корзины short_url:b:{n}, которые Redis хранит
+#            компактной кодировкой listpack (пока в корзине не больше
+#            hash-max-listpack-entries полей и значения не длиннее hash-max-listpack-value);
+#   string — отдельный строковый ключ short_url:{code} на каждую ссылку (прежняя схема).
+LINK_CACHE_LAYOUT = os.getenv("LINK_CACHE_LAYOUT", "hash").lower()
+# Число корзин: держите ожидаемое число ссылок в кэше / корзины ≤ hash-max-listpack-entries (128)
+LINK_CACHE_BUCKETS = int(os.getenv("LINK_CACHE_BUCKETS", 65536))
+# TTL отдельных полей хеша (HEXPIRE, Redis 7.4+). Если выключено, TTL ставится на корзину целиком
+# и только продлевается — поля живут до истечения всей корзины
+LINK_CACHE_FIELD_TTL = os.getenv("LINK_CACHE_FIELD_TTL", "true").lower() == "true"
+
+# Время жизни записей ссылок в Redis (0 — без ограничения) и разброс, чтобы
+# записи, загруженные одновременно (например, прогревом), не истекали разом
+LINK_CACHE_TTL_SECONDS = int(os.getenv("LINK_CACHE_TTL_SECONDS", 86400))
+LINK_CACHE_TTL_JITTER = float(os.getenv("LINK_CACHE_TTL_JITTER", 0.1))
+# TTL для ссылок без переходов за последние LINK_CACHE_TTL_SECONDS (при прогреве)
+LINK_CACHE_COLD_TTL_SECONDS = int(os.getenv("LINK_CACHE_COLD_TTL_SECONDS", 3600))
+# Сколько держать запись истёкшей ссылки, чтобы отвечать 410 без запроса к БД
+LINK_CACHE_EXPIRED_TTL_SECONDS = int(os.getenv("LINK_CACHE_EXPIRED_TTL_SECONDS", 3600))
+
+# Общий префикс ключей записей ссылок в обеих раскладках
+LINK_CACHE_KEY_PREFIX = "short_url:"
+
+
+def _jittered(seconds: int) -> int:
+    return max(1, int(seconds * (1 + random.uniform(-LINK_CACHE_TTL_JITTER, LINK_CACHE_TTL_JITTER))))
+
+
+def link_cache_ttl(
+    expires_at: Optional[datetime] = None,
+    last_visited: Optional[datetime] = None,
+    now: Optional[datetime] = None,
+) -> Optional[int]:
+    """
+    TTL записи ссылки в Redis, None — без ограничения.
+    Запись не живёт дольше самой ссылки; давно не посещавшиеся ссылки хранятся меньше.
+    """
+    now = now or datetime.utcnow()
+    if expires_at is not None:
+        remaining = int((expires_at - now).total_seconds())
+        if remaining <= 0:
+            return LINK_CACHE_EXPIRED_TTL_SECONDS or None
+    else:
+        remaining = None
+
+    ttl = _jittered(LINK_CACHE_TTL_SECONDS) if LINK_CACHE_TTL_SECONDS > 0 else None
+    # last_visited передаёт прогрев; при промахе кэша ссылку посещают прямо сейчас
+    if (
+        ttl is not None
+        and last_visited is not None
+        and LINK_CACHE_COLD_TTL_SECONDS > 0
+        and (now - last_visited).total_seconds() > LINK_CACHE_TTL_SECONDS
+    ):
+        ttl = min(ttl, _jittered(LINK_CACHE_COLD_TTL_SECONDS))
+    if remaining is not None:
+        # +1: к моменту истечения записи ссылка уже точно истекла
+        ttl = remaining + 1 if ttl is None else min(ttl, remaining + 1)
+    return ttl
+
+
+def encode_link_record(original_url: str, expires_at: Optional[datetime] = None, link_id: Optional[int] = None) -> str:
+    """
+    Кодирует запись ссылки для кэша: "id|срок действия (unix, UTC)|URL".
+    URL идёт последним, поэтому разделитель в нём не экранируется.
+    """
+    expires = calendar.timegm(expires_at.utctimetuple()) if expires_at else ""
+    return f"{link_id if link_id is not None else ''}|{expires}|{original_url}"
+
+
+def decode_link_record(raw: Optional[str]) -> Optional[dict]:
+    """
+    Декодирует запись ссылки из кэша (в том числе прежний JSON-формат).
+    Возвращает None для пустых и нераспознанных значений.
+    """
+    if not raw:
+        return None
+    if raw.startswith("{"):
+        record = json.loads(raw)
+        return {
+            "original_url": record["u"],
+            "expires_at": datetime.fromisoformat(record["e"]) if record.get("e") else None,
+            "id": record.get("i"),
+        }
+    parts = raw.split("|", 2)
+    if len(parts) != 3:
+        return None
+    link_id, expires, original_url = parts
+    return {
+        "original_url": original_url,
+        "expires_at": datetime.utcfromtimestamp(int(expires)) if expires else None,
+        "id": int(link_id) if link_id else None,
+    }
+
+
+class StringLinkLayout:
+    """
+    Строковый ключ на каждую ссылку.
+    Методы только формируют команды, поэтому работают с любым клиентом или конвейером
+    (синхронным и асинхронным): для асинхронного клиента результат нужно await-ить.
+    """
+
+    name = "string"
+
+    def key(self, short_code: str) -> str:
+        return f"{LINK_CACHE_KEY_PREFIX}{short_code}"
+
+    def get(self, client, short_code: str):
+        return client.get(self.key(short_code))
+
+    def set(self, pipe, short_code: str, value: str, ttl: Optional[int]) -> None:
+        pipe.set(self.key(short_code), value, ex=ttl)
+
+    def delete(self, client, short_code: str):
+        return client.delete(self.key(short_code))
+
+
+class BucketedLinkLayout:
+    """
+    Ссылки в хешах-корзинах: поле — короткий код, значение — запись.
+    На корзину приходится один ключ верхнего уровня вместо сотни, а кодировка listpack
+    хранит поля подряд без отдельных объектов и указателей на каждое значение.
+    """
+
+    name = "hash"
+
+    def __init__(self, buckets: int = LINK_CACHE_BUCKETS, field_ttl: bool = LINK_CACHE_FIELD_TTL):
+        self.buckets = buckets
+        self.field_ttl = field_ttl
+
+    def key(self, short_code: str) -> str:
+        return f"{LINK_CACHE_KEY_PREFIX}b:{zlib.crc32(short_code.encode()) % self.buckets}"
+
+    def get(self, client, short_code: str):
+        return client.hget(self.key(short_code), short_code)
+
+    def set(self, pipe, short_code: str, value: str, ttl: Optional[int]) -> None:
+        """
+        Требует конвейера: запись и TTL — отдельные команды.
+        """
+        key = self.key(short_code)
+        # HSET сбрасывает TTL перезаписанного поля
+        pipe.hset(key, short_code, value)
+        if ttl is None:
+            return
+        if self.field_ttl:
+            pipe.hexpire(key, ttl, short_code)
+        else:
+            # Ставим TTL корзине без TTL и только продлеваем существующий
+            pipe.expire(key, ttl, nx=True)
+            pipe.expire(key, ttl, gt=True)
+
+    def delete(self, client, short_code: str):
+        return client.hdel(self.key(short_code), short_code)
+
+
+LAYOUTS = {"hash": BucketedLinkLayout, "string": StringLinkLayout}
+
+if LINK_CACHE_LAYOUT not in LAYOUTS:
+    raise ValueError(f"LINK_CACHE_LAYOUT должен быть одним из {', '.join(LAYOUTS)}")
+
+LinkLayout = LAYOUTS[LINK_CACHE_LAYOUT]()
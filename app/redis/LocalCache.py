@@ -0,0 +1,79 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+# Маркер отрицательной записи: код точно не существует в БД
+NOT_FOUND = object()
+
+
+class LocalCache:
+    """
+    Ограниченный по размеру LRU-кэш в памяти процесса с TTL записей
+    и поддержкой отрицательного кэширования.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, negative_ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Возвращает значение, NOT_FOUND для отрицательной записи или None при промахе.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            value, deadline = item
+            if deadline < time.monotonic():
+                del self._data[key]
+                self.stats["expirations"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            if value is NOT_FOUND:
+                self.stats["negative_hits"] += 1
+            else:
+                self.stats["hits"] += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        ttl = self.negative_ttl if value is NOT_FOUND else self.ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def set_missing(self, key: str) -> None:
+        self.set(key, NOT_FOUND)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.stats["invalidations"] += len(self._data)
+            self._data.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._data), "maxsize": self.maxsize}
@@ -0,0 +1,55 @@
+import math
+from typing import Tuple
+
+# Маркерная корзина в хеше Redis: t — остаток маркеров, ts — время последнего пополнения (мс).
+# Время берётся у самого Redis (TIME), поэтому часы воркеров не должны совпадать.
+# Возвращает {разрешено (0/1), остаток маркеров, через сколько мс появится нужное число маркеров}.
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if not tokens then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = math.ceil((cost - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', now)
+-- Полная корзина не отличается от отсутствующей: ключ живёт, пока она не наполнится
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1000)
+return {allowed, math.floor(tokens), retry}
+"""
+
+
+class TokenBucketLimiter:
+    """
+    Ограничитель частоты на маркерных корзинах в Redis, общих для всех воркеров.
+    Проверка и списание выполняются одним атомарным скриптом.
+    """
+
+    def __init__(self, async_client, prefix: str = "ratelimit"):
+        self.prefix = prefix
+        self._acquire = async_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def acquire(self, key: str, limit: int, period_seconds: float, cost: int = 1) -> Tuple[bool, int, int]:
+        """
+        Списывает cost маркеров из корзины ёмкостью limit, пополняемой на limit за period_seconds.
+        Возвращает (разрешено, остаток маркеров, секунд до повтора).
+        """
+        rate = limit / (period_seconds * 1000)
+        allowed, remaining, retry_ms = await self._acquire(
+            keys=[f"{self.prefix}:{key}"], args=[limit, repr(rate), cost]
+        )
+        return bool(allowed), int(remaining), math.ceil(int(retry_ms) / 1000)
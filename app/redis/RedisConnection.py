@@ -1,34 +1,334 @@
 import os
+import threading
+import time
 import redis
-from typing import Optional 
+import redis.asyncio
+from datetime import datetime
+from typing import Iterable, Optional
 from dotenv import load_dotenv
 
+from app.redis.LocalCache import LocalCache, NOT_FOUND
+from app.redis.LinkCacheLayout import LINK_CACHE_KEY_PREFIX, LinkLayout, decode_link_record, encode_link_record, link_cache_ttl
+from app.metrics.Prometheus import CACHE_LOOKUPS
+from app.redis.RedisPool import TimedAsyncBlockingConnectionPool, TimedBlockingConnectionPool
+from app.redis.ShardedRedis import ShardedAsyncRedis, ShardedRedis, parse_nodes
+from app.redis.TimedRedis import TimedAsyncRedis, TimedRedis
+
 # Загружаем переменные из .env
 load_dotenv()
 
-# Настройка подключения к Redis
-RedisClient = redis.Redis(
+# Настройки пула соединений Redis
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 5))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 5))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL", 30))
+
+_redis_options = dict(
     host=os.getenv("REDIS_HOST", "localhost"),
     port=int(os.getenv("REDIS_PORT", 6379)),
     db=0,
-    decode_responses=True
+    decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+    health_check_interval=REDIS_HEALTH_CHECK_INTERVAL,
 )
 
-def update_cache(short_code: str, original_url: Optional[str] = None):
+# Настройка подключения к Redis
+# Синхронный клиент — для фоновых задач, CLI и подписки на инвалидацию
+RedisPool = TimedBlockingConnectionPool(**_redis_options)
+RedisClient = TimedRedis(connection_pool=RedisPool)
+
+# Асинхронный клиент — для обработчиков HTTP-запросов
+AsyncRedisPool = TimedAsyncBlockingConnectionPool(**_redis_options)
+AsyncRedisClient = TimedAsyncRedis(connection_pool=AsyncRedisPool)
+
+# Узлы Redis для записей ссылок (остальные данные — pub/sub, фильтр кодов, квоты — в основном Redis):
+#   single  — основной Redis;
+#   sharded — независимые узлы LINK_CACHE_REDIS_NODES, ключ выбирает узел по консистентному хешу;
+#   cluster — Redis Cluster, LINK_CACHE_REDIS_NODES — начальные узлы.
+LINK_CACHE_REDIS_MODE = os.getenv("LINK_CACHE_REDIS_MODE", "single").lower()
+LINK_CACHE_REDIS_NODES = parse_nodes(os.getenv("LINK_CACHE_REDIS_NODES", ""))
+# Сколько секунд не обращаться к узлу после ошибки соединения (его записи становятся промахами)
+LINK_CACHE_SHARD_COOLDOWN_SECONDS = float(os.getenv("LINK_CACHE_SHARD_COOLDOWN_SECONDS", 5))
+
+
+def _shard_client(host: str, port: int):
+    return TimedRedis(connection_pool=TimedBlockingConnectionPool(**{**_redis_options, "host": host, "port": port}))
+
+
+def _async_shard_client(host: str, port: int):
+    return TimedAsyncRedis(
+        connection_pool=TimedAsyncBlockingConnectionPool(**{**_redis_options, "host": host, "port": port})
+    )
+
+
+def _cluster_clients():
+    import redis.asyncio.cluster
+    import redis.cluster
+
+    options = dict(
+        decode_responses=True,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        socket_timeout=REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+    )
+    sync_client = redis.cluster.RedisCluster(
+        startup_nodes=[redis.cluster.ClusterNode(host, port) for host, port in LINK_CACHE_REDIS_NODES], **options
+    )
+    async_client = redis.asyncio.cluster.RedisCluster(
+        startup_nodes=[redis.asyncio.cluster.ClusterNode(host, port) for host, port in LINK_CACHE_REDIS_NODES], **options
+    )
+    return sync_client, async_client
+
+
+if LINK_CACHE_REDIS_MODE == "single":
+    LinkCacheClient, AsyncLinkCacheClient = RedisClient, AsyncRedisClient
+elif not LINK_CACHE_REDIS_NODES:
+    raise ValueError(f"LINK_CACHE_REDIS_MODE={LINK_CACHE_REDIS_MODE} требует LINK_CACHE_REDIS_NODES")
+elif LINK_CACHE_REDIS_MODE == "sharded":
+    # После восстановления узла с него удаляются только записи ссылок
+    LinkCacheClient = ShardedRedis(
+        LINK_CACHE_REDIS_NODES, _shard_client, LINK_CACHE_SHARD_COOLDOWN_SECONDS, f"{LINK_CACHE_KEY_PREFIX}*"
+    )
+    AsyncLinkCacheClient = ShardedAsyncRedis(
+        LINK_CACHE_REDIS_NODES, _async_shard_client, LINK_CACHE_SHARD_COOLDOWN_SECONDS, f"{LINK_CACHE_KEY_PREFIX}*"
+    )
+elif LINK_CACHE_REDIS_MODE == "cluster":
+    LinkCacheClient, AsyncLinkCacheClient = _cluster_clients()
+else:
+    raise ValueError("LINK_CACHE_REDIS_MODE должен быть single, sharded или cluster")
+
+# Локальный (в памяти воркера) уровень кэша перед Redis
+LOCAL_CACHE_SIZE = int(os.getenv("LOCAL_CACHE_SIZE", 10000))
+LOCAL_CACHE_TTL_SECONDS = float(os.getenv("LOCAL_CACHE_TTL_SECONDS", 30))
+LOCAL_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("LOCAL_CACHE_NEGATIVE_TTL_SECONDS", 5))
+
+# Время жизни записей дедупликации "URL -> короткий код"
+DEDUP_CACHE_TTL_SECONDS = int(os.getenv("DEDUP_CACHE_TTL_SECONDS", 86400))
+
+# Канал pub/sub для инвалидации локальных кэшей во всех воркерах и репликах
+INVALIDATION_CHANNEL = "short_url:invalidate"
+
+LocalLinkCache = LocalCache(LOCAL_CACHE_SIZE, LOCAL_CACHE_TTL_SECONDS, LOCAL_CACHE_NEGATIVE_TTL_SECONDS)
+
+RedisCacheStats = {"hits": 0, "misses": 0, "errors": 0}
+
+
+async def get_cached_link(short_code: str):
+    """
+    Ищет запись ссылки сначала в локальном кэше, затем в Redis.
+    Возвращает запись, NOT_FOUND для заведомо несуществующего кода или None при промахе.
+    """
+    record = LocalLinkCache.get(short_code)
+    if record is not None:
+        CACHE_LOOKUPS.labels("local", "negative" if record is NOT_FOUND else "hit").inc()
+        return record
+    CACHE_LOOKUPS.labels("local", "miss").inc()
+
+    try:
+        record = decode_link_record(await LinkLayout.get(AsyncLinkCacheClient, short_code))
+    except Exception as e:
+        RedisCacheStats["errors"] += 1
+        CACHE_LOOKUPS.labels("redis", "error").inc()
+        print(f"Ошибка при работе с Redis: {e}")
+        return None
+
+    if record is None:
+        RedisCacheStats["misses"] += 1
+        CACHE_LOOKUPS.labels("redis", "miss").inc()
+        return None
+    RedisCacheStats["hits"] += 1
+    CACHE_LOOKUPS.labels("redis", "hit").inc()
+    LocalLinkCache.set(short_code, record)
+    return record
+
+
+async def cache_link(
+    short_code: str,
+    original_url: str,
+    expires_at: Optional[datetime] = None,
+    link_id: Optional[int] = None,
+):
+    """
+    Заполняет оба уровня кэша после промаха, не рассылая инвалидацию.
+    """
+    LocalLinkCache.set(short_code, {"original_url": original_url, "expires_at": expires_at, "id": link_id})
+    try:
+        async with AsyncLinkCacheClient.pipeline(transaction=False) as pipe:
+            LinkLayout.set(pipe, short_code, encode_link_record(original_url, expires_at, link_id), link_cache_ttl(expires_at))
+            await pipe.execute()
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+
+
+async def warm_cache(records: list, invalidate: Optional[list] = None):
+    """
+    Загружает пачку записей в Redis одним конвейером.
+
+    :param records: Кортежи (short_code, original_url, expires_at, link_id[, last_visited]);
+        last_visited (если есть) сокращает TTL давно не посещавшихся ссылок.
+    :param invalidate: Коды, для которых нужно разослать инвалидацию локальных кэшей.
+    """
+    try:
+        async with AsyncLinkCacheClient.pipeline(transaction=False) as pipe:
+            for short_code, original_url, expires_at, link_id, *rest in records:
+                LinkLayout.set(
+                    pipe,
+                    short_code,
+                    encode_link_record(original_url, expires_at, link_id),
+                    link_cache_ttl(expires_at, rest[0] if rest else None),
+                )
+            await pipe.execute()
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+    if not invalidate:
+        return
+    try:
+        async with AsyncRedisClient.pipeline(transaction=False) as pipe:
+            for short_code in invalidate:
+                LocalLinkCache.delete(short_code)
+                pipe.publish(INVALIDATION_CHANNEL, short_code)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+
+
+async def get_dedup_code(scope: str, digest: str) -> Optional[str]:
+    """
+    Возвращает короткий код, ранее выданный для URL с указанным дайджестом.
+    """
+    try:
+        return await AsyncRedisClient.get(f"dedup:{scope}:{digest}")
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+        return None
+
+
+async def set_dedup_code(scope: str, digest: str, short_code: str):
+    try:
+        await AsyncRedisClient.set(f"dedup:{scope}:{digest}", short_code, ex=DEDUP_CACHE_TTL_SECONDS)
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+
+
+async def delete_dedup_code(scope: str, digest: Optional[str]):
+    if not digest:
+        return
+    try:
+        await AsyncRedisClient.delete(f"dedup:{scope}:{digest}")
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+
+
+def evict_links(pipe, short_codes: Iterable[str]):
+    """
+    Удаляет записи ссылок из Redis (одним конвейером на узел кэша) и добавляет
+    в синхронный конвейер pipe основного Redis рассылку инвалидации локальных кэшей.
+    """
+    short_codes = list(short_codes)
+    cache_pipe = LinkCacheClient.pipeline(transaction=False)
+    for short_code in short_codes:
+        LinkLayout.delete(cache_pipe, short_code)
+    try:
+        cache_pipe.execute()
+    except Exception as e:
+        # Недоступный узел очищается при восстановлении, остальные записи уже удалены
+        print(f"Ошибка при работе с Redis: {e}")
+    for short_code in short_codes:
+        pipe.publish(INVALIDATION_CHANNEL, short_code)
+
+
+def cache_missing(short_code: str):
+    """
+    Запоминает в локальном кэше, что короткого кода нет в БД.
+    """
+    LocalLinkCache.set_missing(short_code)
+
+
+async def invalidate_link(short_code: str):
+    """
+    Сбрасывает локальные кэши для кода во всех воркерах через pub/sub.
+    """
+    LocalLinkCache.delete(short_code)
+    try:
+        await AsyncRedisClient.publish(INVALIDATION_CHANNEL, short_code)
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+
+
+# Локальные кэши, которые инвалидируются сообщениями из соответствующих каналов
+_invalidation_targets = {INVALIDATION_CHANNEL: LocalLinkCache}
+
+
+def register_invalidation_channel(channel: str, cache: LocalCache):
+    """
+    Подключает локальный кэш к фоновому слушателю инвалидаций.
+    Вызывать до start_invalidation_listener.
+    """
+    _invalidation_targets[channel] = cache
+
+
+def _listen_invalidations():
+    while True:
+        pubsub = RedisClient.pubsub(ignore_subscribe_messages=True)
+        try:
+            pubsub.subscribe(*_invalidation_targets)
+            # Пока подписки не было, сообщения могли быть пропущены
+            for cache in _invalidation_targets.values():
+                cache.clear()
+            for message in pubsub.listen():
+                if message["type"] == "message":
+                    _invalidation_targets[message["channel"]].delete(message["data"])
+        except Exception as e:
+            print(f"Ошибка подписки на инвалидацию кэша: {e}")
+            time.sleep(1)
+        finally:
+            pubsub.close()
+
+
+_listener_thread: Optional[threading.Thread] = None
+
+
+def start_invalidation_listener():
+    """
+    Запускает фоновый поток, применяющий инвалидации из Redis к локальному кэшу.
+    """
+    global _listener_thread
+    if _listener_thread is None:
+        _listener_thread = threading.Thread(target=_listen_invalidations, name="cache-invalidation", daemon=True)
+        _listener_thread.start()
+
+
+def get_cache_stats() -> dict:
+    return {"local": LocalLinkCache.snapshot(), "redis": dict(RedisCacheStats)}
+
+
+async def update_cache(
+    short_code: str,
+    original_url: Optional[str] = None,
+    expires_at: Optional[datetime] = None,
+    link_id: Optional[int] = None,
+):
     """
     Обновляет или удаляет кэш для указанного короткого кода.
     
     :param short_code: Короткий код ссылки.
     :param original_url: Новый оригинальный URL. Если None, ключ будет удалён.
+    :param expires_at: Срок действия ссылки.
+    :param link_id: Идентификатор ссылки в БД.
     """
-    redis_key = f"short_url:{short_code}"
     try:
         if original_url:
             # Обновляем кэш
-            RedisClient.set(redis_key, original_url)
+            async with AsyncLinkCacheClient.pipeline(transaction=False) as pipe:
+                LinkLayout.set(pipe, short_code, encode_link_record(original_url, expires_at, link_id), link_cache_ttl(expires_at))
+                await pipe.execute()
         else:
             # Удаляем кэш
-            RedisClient.delete(redis_key)
+            await LinkLayout.delete(AsyncLinkCacheClient, short_code)
     except Exception as e:
         # Логируем ошибку, но не прерываем выполнение
-        print(f"Ошибка при работе с Redis: {e}")
\ No newline at end of file
+        print(f"Ошибка при работе с Redis: {e}")
+    await invalidate_link(short_code)
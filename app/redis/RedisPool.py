@@ -0,0 +1,58 @@
+import time
+
+import redis
+import redis.asyncio
+
+from app.metrics.PoolStats import PoolStats
+
+
+class TimedBlockingConnectionPool(redis.BlockingConnectionPool):
+    """
+    Блокирующий пул redis-py, который измеряет ожидание свободного соединения.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.stats.record_timeout(time.perf_counter() - started)
+            raise
+        self.stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def release(self, connection):
+        self.stats.record_release()
+        super().release(connection)
+
+
+class TimedAsyncBlockingConnectionPool(redis.asyncio.BlockingConnectionPool):
+    """
+    Асинхронный вариант TimedBlockingConnectionPool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    async def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except redis.ConnectionError:
+            self.stats.record_timeout(time.perf_counter() - started)
+            raise
+        self.stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+    async def release(self, connection):
+        self.stats.record_release()
+        await super().release(connection)
+
+
+def redis_pool_metrics(pool) -> dict:
+    return {"pool": type(pool).__name__, **pool.stats.snapshot(pool.max_connections)}
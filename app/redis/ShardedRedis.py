@@ -0,0 +1,306 @@
+import asyncio
+import bisect
+import hashlib
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import redis
+
+# Ошибки узла: команда завершается ошибкой, остальные узлы продолжают работать.
+# Недоступным на LINK_CACHE_SHARD_COOLDOWN_SECONDS узел считается только после ошибки
+# соединения — таймаут отдельной (медленной) команды узел не отключает
+SHARD_ERRORS = (redis.ConnectionError, redis.TimeoutError, OSError)
+TIMEOUT_ERRORS = (redis.TimeoutError, TimeoutError)
+
+# Ключей за одну команду UNLINK при очистке узла
+CLEAR_BATCH_SIZE = 1000
+
+
+class ShardUnavailable(redis.ConnectionError):
+    """
+    Узел недавно не отвечал; команда не отправляется, чтобы не ждать таймаута соединения.
+    """
+
+
+def _ring_hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Консистентное хеширование: каждый узел занимает vnodes точек на кольце,
+    ключ принадлежит первой точке по часовой стрелке. Добавление или удаление узла
+    переносит только ~1/N ключей.
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int = 160):
+        if not nodes:
+            raise ValueError("Для кольца нужен хотя бы один узел")
+        points = sorted((_ring_hash(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        index = bisect.bisect(self._hashes, _ring_hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+
+class Shard:
+    """
+    Клиент одного узла и его доступность. После восстановления с узла удаляются записи
+    кэша (ключи clear_match): пока он был недоступен, удаления и обновления ссылок до него
+    не доходили. Остальные ключи узла не затрагиваются.
+    """
+
+    def __init__(self, name: str, client, cooldown: float, clear_match: str):
+        self.name = name
+        self.client = client
+        self.cooldown = cooldown
+        self.clear_match = clear_match
+        self.down_until = 0.0
+        self.needs_clear = False
+        self.clearing = None
+        self.failures = 0
+
+    def check(self) -> None:
+        if time.monotonic() < self.down_until:
+            raise ShardUnavailable(f"Узел кэша {self.name} недоступен")
+
+    def mark_down(self, error: Exception) -> None:
+        if not isinstance(error, (ShardUnavailable, *TIMEOUT_ERRORS)):
+            self.failures += 1
+            self.down_until = time.monotonic() + self.cooldown
+            self.needs_clear = True
+
+    def clear(self) -> None:
+        """
+        Удаляет записи кэша с узла (SCAN по clear_match и UNLINK пачками).
+        """
+        batch = []
+        for key in self.client.scan_iter(match=self.clear_match, count=CLEAR_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= CLEAR_BATCH_SIZE:
+                self.client.unlink(*batch)
+                batch = []
+        if batch:
+            self.client.unlink(*batch)
+        self.needs_clear = False
+
+    async def aclear(self) -> None:
+        try:
+            batch = []
+            async for key in self.client.scan_iter(match=self.clear_match, count=CLEAR_BATCH_SIZE):
+                batch.append(key)
+                if len(batch) >= CLEAR_BATCH_SIZE:
+                    await self.client.unlink(*batch)
+                    batch = []
+            if batch:
+                await self.client.unlink(*batch)
+            self.needs_clear = False
+        except SHARD_ERRORS as e:
+            # Очистка повторится после паузы
+            self.mark_down(e)
+            print(f"Ошибка очистки узла кэша {self.name}: {e}")
+
+    def check_cleared(self) -> None:
+        """
+        Асинхронный клиент очищает узел в фоне, чтобы не задерживать запрос на время SCAN;
+        до окончания очистки узел считается недоступным (его записи — промахи).
+        """
+        if self.needs_clear:
+            if self.clearing is None or self.clearing.done():
+                self.clearing = asyncio.ensure_future(self.aclear())
+            raise ShardUnavailable(f"Узел кэша {self.name} очищается после восстановления")
+
+    def snapshot(self) -> dict:
+        return {
+            "node": self.name,
+            "up": time.monotonic() >= self.down_until,
+            "clearing": self.needs_clear,
+            "failures": self.failures,
+            **({"pool": self.client.connection_pool.stats.snapshot(self.client.connection_pool.max_connections)}
+               if hasattr(self.client.connection_pool, "stats") else {}),
+        }
+
+
+def parse_nodes(value: str) -> List[Tuple[str, int]]:
+    """
+    Разбирает список узлов вида "host:port,host:port".
+    """
+    nodes = []
+    for item in value.split(","):
+        item = item.strip()
+        if item:
+            host, _, port = item.rpartition(":")
+            nodes.append((host or "localhost", int(port)))
+    return nodes
+
+
+class _ShardedBase:
+    def __init__(self, nodes: List[Tuple[str, int]], client_factory: Callable, cooldown: float, clear_match: str):
+        self.shards: Dict[str, Shard] = {}
+        for host, port in nodes:
+            name = f"{host}:{port}"
+            self.shards[name] = Shard(name, client_factory(host, port), cooldown, clear_match)
+        self.ring = HashRing(list(self.shards))
+
+    def shard_for(self, key: str) -> Shard:
+        return self.shards[self.ring.node_for(key)]
+
+    def snapshot(self) -> list:
+        return [shard.snapshot() for shard in self.shards.values()]
+
+
+class ShardedRedis(_ShardedBase):
+    """
+    Синхронный клиент поверх нескольких независимых узлов Redis: однокомандные вызовы
+    с ключом первым аргументом уходят на узел ключа, конвейер разбивается по узлам.
+    """
+
+    def _call(self, shard: Shard, name: str, *args, **kwargs):
+        shard.check()
+        try:
+            if shard.needs_clear:
+                shard.clear()
+            return getattr(shard.client, name)(*args, **kwargs)
+        except SHARD_ERRORS as e:
+            shard.mark_down(e)
+            raise
+
+    def __getattr__(self, name: str):
+        def command(key, *args, **kwargs):
+            return self._call(self.shard_for(key), name, key, *args, **kwargs)
+
+        return command
+
+    def pipeline(self, transaction: bool = False):
+        return ShardedPipeline(self)
+
+    def close(self) -> None:
+        for shard in self.shards.values():
+            shard.client.close()
+
+
+class ShardedAsyncRedis(_ShardedBase):
+    """
+    Асинхронный вариант ShardedRedis; конвейеры разных узлов выполняются параллельно.
+    """
+
+    async def _call(self, shard: Shard, name: str, *args, **kwargs):
+        shard.check()
+        shard.check_cleared()
+        try:
+            return await getattr(shard.client, name)(*args, **kwargs)
+        except SHARD_ERRORS as e:
+            shard.mark_down(e)
+            raise
+
+    def __getattr__(self, name: str):
+        async def command(key, *args, **kwargs):
+            return await self._call(self.shard_for(key), name, key, *args, **kwargs)
+
+        return command
+
+    def pipeline(self, transaction: bool = False):
+        return ShardedAsyncPipeline(self)
+
+    async def aclose(self) -> None:
+        for shard in self.shards.values():
+            await shard.client.aclose()
+
+
+class _PipelineBase:
+    """
+    Накопитель команд: каждая команда относится к узлу своего ключа (первого аргумента).
+    execute() возвращает результаты в порядке добавления команд, как обычный конвейер.
+    Команды недоступного узла не выполняются, остальные узлы обрабатываются полностью,
+    после чего поднимается первая ошибка.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._commands: List[Tuple[str, str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        def command(key, *args, **kwargs):
+            self._commands.append((self.client.ring.node_for(key), name, (key, *args), kwargs))
+            return self
+
+        return command
+
+    def _grouped(self) -> Dict[str, List[int]]:
+        groups: Dict[str, List[int]] = {}
+        for index, (node, *_) in enumerate(self._commands):
+            groups.setdefault(node, []).append(index)
+        return groups
+
+    def _replay(self, pipe, indexes: List[int]):
+        for index in indexes:
+            _, name, args, kwargs = self._commands[index]
+            getattr(pipe, name)(*args, **kwargs)
+
+    def _merge(self, groups: Dict[str, List[int]], outcomes: List) -> list:
+        results: List[Optional[object]] = [None] * len(self._commands)
+        error = None
+        for indexes, outcome in zip(groups.values(), outcomes):
+            if isinstance(outcome, BaseException):
+                error = error or outcome
+                continue
+            for index, value in zip(indexes, outcome):
+                results[index] = value
+        self._commands = []
+        if error:
+            raise error
+        return results
+
+
+class ShardedPipeline(_PipelineBase):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._commands = []
+
+    def _execute_shard(self, shard: Shard, indexes: List[int]):
+        try:
+            shard.check()
+            if shard.needs_clear:
+                shard.clear()
+            pipe = shard.client.pipeline(transaction=False)
+            self._replay(pipe, indexes)
+            return pipe.execute()
+        except SHARD_ERRORS as e:
+            shard.mark_down(e)
+            return e
+
+    def execute(self) -> list:
+        groups = self._grouped()
+        outcomes = [self._execute_shard(self.client.shards[node], indexes) for node, indexes in groups.items()]
+        return self._merge(groups, outcomes)
+
+
+class ShardedAsyncPipeline(_PipelineBase):
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._commands = []
+
+    async def _execute_shard(self, shard: Shard, indexes: List[int]):
+        try:
+            shard.check()
+            shard.check_cleared()
+            async with shard.client.pipeline(transaction=False) as pipe:
+                self._replay(pipe, indexes)
+                return await pipe.execute()
+        except SHARD_ERRORS as e:
+            shard.mark_down(e)
+            raise
+
+    async def execute(self) -> list:
+        groups = self._grouped()
+        outcomes = await asyncio.gather(
+            *(self._execute_shard(self.client.shards[node], indexes) for node, indexes in groups.items()),
+            return_exceptions=True,
+        )
+        return self._merge(groups, outcomes)
@@ -0,0 +1,64 @@
+import time
+
+import redis
+import redis.asyncio
+import redis.asyncio.client
+import redis.client
+
+from app.metrics.Prometheus import REDIS_COMMAND_DURATION
+from app.metrics.RequestTiming import add_timing
+
+
+def _observe(client: str, command, elapsed: float) -> None:
+    REDIS_COMMAND_DURATION.labels(client, str(command).lower()).observe(elapsed)
+    add_timing("redis", elapsed)
+
+
+class TimedPipeline(redis.client.Pipeline):
+    def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute(*args, **kwargs)
+        finally:
+            _observe("sync", "pipeline", time.perf_counter() - started)
+
+
+class TimedRedis(redis.Redis):
+    """
+    Синхронный клиент, который пишет длительность каждой команды в гистограмму.
+    """
+
+    def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return super().execute_command(*args, **options)
+        finally:
+            _observe("sync", args[0], time.perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class TimedAsyncPipeline(redis.asyncio.client.Pipeline):
+    async def execute(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(*args, **kwargs)
+        finally:
+            _observe("async", "pipeline", time.perf_counter() - started)
+
+
+class TimedAsyncRedis(redis.asyncio.Redis):
+    """
+    Асинхронный вариант TimedRedis; время команд также попадает в Server-Timing.
+    """
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _observe("async", args[0], time.perf_counter() - started)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TimedAsyncPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
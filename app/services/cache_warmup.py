@@ -0,0 +1,72 @@
+"""
+Прогрев кэша ссылок: загружает самые посещаемые ссылки из БД в Redis.
+
+Запускается фоновым воркером при старте (CACHE_WARMUP_ON_STARTUP, см. app.worker) или вручную:
+    python -m app.services.cache_warmup --limit 100000
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+from sqlalchemy import or_, select
+
+from app.database.DatabaseConnection import AsyncSessionLocal, async_engine
+from app.database.models.LinkModel import Link
+from app.redis.RedisConnection import AsyncLinkCacheClient, AsyncRedisClient, warm_cache
+
+load_dotenv()
+
+CACHE_WARMUP_ON_STARTUP = os.getenv("CACHE_WARMUP_ON_STARTUP", "true").lower() == "true"
+# Сколько самых посещаемых ссылок загружать
+CACHE_WARMUP_LIMIT = int(os.getenv("CACHE_WARMUP_LIMIT", 100000))
+# Размер пачки: строк за одну выборку из курсора и команд в одном конвейере Redis
+CACHE_WARMUP_CHUNK_SIZE = int(os.getenv("CACHE_WARMUP_CHUNK_SIZE", 1000))
+
+
+async def warm_hot_links(limit: int = CACHE_WARMUP_LIMIT, chunk_size: int = CACHE_WARMUP_CHUNK_SIZE) -> int:
+    """
+    Потоково читает top-N действующих ссылок по visit_count и last_visited
+    и загружает их в Redis одним конвейером на пачку; TTL учитывает срок
+    действия и давность последнего перехода. Возвращает число загруженных записей.
+    """
+    query = (
+        select(Link.short_code, Link.original_url, Link.expires_at, Link.id, Link.last_visited)
+        .where(or_(Link.expires_at.is_(None), Link.expires_at > datetime.utcnow()))
+        .order_by(Link.visit_count.desc(), Link.last_visited.desc().nulls_last())
+        .limit(limit)
+        .execution_options(yield_per=chunk_size)
+    )
+    loaded = 0
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query)
+        async for rows in result.partitions(chunk_size):
+            await warm_cache([tuple(row) for row in rows])
+            loaded += len(rows)
+    return loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загружает самые посещаемые ссылки в Redis")
+    parser.add_argument("--limit", type=int, default=CACHE_WARMUP_LIMIT, help="сколько ссылок загрузить")
+    parser.add_argument("--chunk-size", type=int, default=CACHE_WARMUP_CHUNK_SIZE, help="размер пачки")
+    args = parser.parse_args()
+
+    async def run():
+        started = time.perf_counter()
+        try:
+            loaded = await warm_hot_links(args.limit, args.chunk_size)
+            print(f"Загружено {loaded} ссылок за {time.perf_counter() - started:.1f} с")
+        finally:
+            await AsyncRedisClient.aclose()
+            if AsyncLinkCacheClient is not AsyncRedisClient:
+                await AsyncLinkCacheClient.aclose()
+            await async_engine.dispose()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+import os
+import socket
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.DatabaseConnection import SessionLocal
+from app.database.models.ClickBucketModel import DailyClickBucket, HourlyClickBucket
+from app.redis.RedisConnection import AsyncRedisClient, RedisClient
+
+# Сбор событий кликов в Redis Stream и их агрегация в почасовые/посуточные таблицы
+CLICK_ANALYTICS = os.getenv("CLICK_ANALYTICS", "true").lower() == "true"
+# Приблизительный предел длины потока: защищает Redis, если агрегатор отстал
+CLICK_STREAM_MAXLEN = int(os.getenv("CLICK_STREAM_MAXLEN", 1000000))
+CLICK_AGGREGATE_INTERVAL_SECONDS = int(os.getenv("CLICK_AGGREGATE_INTERVAL_SECONDS", 30))
+CLICK_AGGREGATE_BATCH_SIZE = int(os.getenv("CLICK_AGGREGATE_BATCH_SIZE", 5000))
+# Заголовок, в котором прокси/CDN передаёт код страны клиента
+CLICK_COUNTRY_HEADER = os.getenv("CLICK_COUNTRY_HEADER", "CF-IPCountry")
+# Сколько дней хранятся почасовые и посуточные агрегаты (0 — бессрочно)
+CLICK_HOURLY_RETENTION_DAYS = int(os.getenv("CLICK_HOURLY_RETENTION_DAYS", 30))
+CLICK_DAILY_RETENTION_DAYS = int(os.getenv("CLICK_DAILY_RETENTION_DAYS", 400))
+CLICK_RETENTION_INTERVAL_HOURS = int(os.getenv("CLICK_RETENTION_INTERVAL_HOURS", 24))
+
+CLICK_STREAM_KEY = "clicks"
+CLICK_CONSUMER_GROUP = "click-aggregator"
+CLICK_CONSUMER_NAME = f"{socket.gethostname()}-{os.getpid()}"
+
+BUCKET_TABLES = {"hour": HourlyClickBucket, "day": DailyClickBucket}
+BUCKET_RETENTION_DAYS = {"hour": CLICK_HOURLY_RETENTION_DAYS, "day": CLICK_DAILY_RETENTION_DAYS}
+
+
+def link_bucket_deletes(link_ids) -> list:
+    """
+    Запросы удаления агрегатов кликов для удаляемых ссылок. Внешнего ключа на links
+    у агрегатов нет, поэтому их удаляют в той же транзакции, что и сами ссылки.
+    """
+    link_ids = list(link_ids)
+    return [delete(table).where(table.link_id.in_(link_ids)) for table in BUCKET_TABLES.values()]
+
+
+def purge_click_buckets(now: Optional[datetime] = None) -> int:
+    """
+    Удаляет агрегаты старше CLICK_HOURLY_RETENTION_DAYS / CLICK_DAILY_RETENTION_DAYS.
+    Возвращает количество удалённых строк.
+    """
+    now = now or datetime.utcnow()
+    purged = 0
+    db = SessionLocal()
+    try:
+        for granularity, table in BUCKET_TABLES.items():
+            days = BUCKET_RETENTION_DAYS[granularity]
+            if days <= 0:
+                continue
+            result = db.execute(
+                delete(table)
+                .where(table.bucket_start < now - timedelta(days=days))
+                .execution_options(synchronize_session=False)
+            )
+            purged += result.rowcount or 0
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при удалении старых агрегатов кликов: {e}")
+    finally:
+        db.close()
+    return purged
+
+
+def classify_user_agent(user_agent: Optional[str]) -> str:
+    if not user_agent:
+        return ""
+    ua = user_agent.lower()
+    if any(marker in ua for marker in ("bot", "crawl", "spider", "curl", "wget", "python")):
+        return "bot"
+    if any(marker in ua for marker in ("mobile", "android", "iphone", "ipad")):
+        return "mobile"
+    if "mozilla" in ua:
+        return "desktop"
+    return "other"
+
+
+def referrer_host(referrer: Optional[str]) -> str:
+    if not referrer:
+        return ""
+    return (urlsplit(referrer).hostname or "").lower()
+
+
+async def emit_click(link_id: Optional[int], headers) -> None:
+    """
+    Добавляет событие клика в поток Redis. Не обращается к базе данных.
+    """
+    if not CLICK_ANALYTICS or link_id is None:
+        return
+    country = (headers.get(CLICK_COUNTRY_HEADER) or "")[:2].upper()
+    try:
+        await AsyncRedisClient.xadd(
+            CLICK_STREAM_KEY,
+            {
+                "l": link_id,
+                "t": int(time.time()),
+                "r": referrer_host(headers.get("referer")),
+                "u": classify_user_agent(headers.get("user-agent")),
+                "c": country if country.isalpha() else "",
+            },
+            maxlen=CLICK_STREAM_MAXLEN,
+            approximate=True,
+        )
+    except Exception as e:
+        print(f"Ошибка при записи клика в Redis: {e}")
+
+
+def _ensure_group() -> None:
+    try:
+        RedisClient.xgroup_create(CLICK_STREAM_KEY, CLICK_CONSUMER_GROUP, id="0", mkstream=True)
+    except Exception as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _upsert_buckets(db, table, counts: Counter) -> None:
+    if not counts:
+        return
+    rows = [
+        {"link_id": link_id, "bucket_start": bucket, "referrer": ref, "ua_class": ua, "country": country, "clicks": clicks}
+        for (link_id, bucket, ref, ua, country), clicks in counts.items()
+    ]
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(table).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["link_id", "bucket_start", "referrer", "ua_class", "country"],
+        set_={"clicks": table.clicks + stmt.excluded.clicks},
+    )
+    db.execute(stmt)
+
+
+def _aggregate_entries(db, entries) -> None:
+    hourly, daily = Counter(), Counter()
+    for _, fields in entries:
+        if not fields:
+            continue
+        ts = datetime.utcfromtimestamp(int(fields["t"]))
+        dims = (fields.get("r", ""), fields.get("u", ""), fields.get("c", ""))
+        link_id = int(fields["l"])
+        hourly[(link_id, ts.replace(minute=0, second=0, microsecond=0), *dims)] += 1
+        daily[(link_id, ts.replace(hour=0, minute=0, second=0, microsecond=0), *dims)] += 1
+
+    _upsert_buckets(db, HourlyClickBucket, hourly)
+    _upsert_buckets(db, DailyClickBucket, daily)
+    db.commit()
+
+    ids = [entry_id for entry_id, _ in entries]
+    pipe = RedisClient.pipeline(transaction=False)
+    pipe.xack(CLICK_STREAM_KEY, CLICK_CONSUMER_GROUP, *ids)
+    pipe.xdel(CLICK_STREAM_KEY, *ids)
+    pipe.execute()
+
+
+def aggregate_clicks() -> int:
+    """
+    Читает события кликов из потока (группа потребителей — по одному на воркер)
+    и добавляет их в почасовые и посуточные агрегаты. События подтверждаются
+    только после commit, поэтому доставка — at-least-once.
+    Возвращает количество обработанных событий.
+    """
+    if not CLICK_ANALYTICS:
+        return 0
+
+    processed = 0
+    db = SessionLocal()
+    try:
+        _ensure_group()
+        # Сначала забираем события, зависшие у упавших потребителей
+        _, claimed, *_ = RedisClient.xautoclaim(
+            CLICK_STREAM_KEY, CLICK_CONSUMER_GROUP, CLICK_CONSUMER_NAME,
+            min_idle_time=CLICK_AGGREGATE_INTERVAL_SECONDS * 10 * 1000, count=CLICK_AGGREGATE_BATCH_SIZE,
+        )
+        if claimed:
+            _aggregate_entries(db, claimed)
+            processed += len(claimed)
+
+        while True:
+            response = RedisClient.xreadgroup(
+                CLICK_CONSUMER_GROUP, CLICK_CONSUMER_NAME, {CLICK_STREAM_KEY: ">"}, count=CLICK_AGGREGATE_BATCH_SIZE
+            )
+            entries = response[0][1] if response else []
+            if not entries:
+                break
+            _aggregate_entries(db, entries)
+            processed += len(entries)
+            if len(entries) < CLICK_AGGREGATE_BATCH_SIZE:
+                break
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при агрегации кликов: {e}")
+    finally:
+        db.close()
+    return processed
+
+
+async def get_click_stats(
+    db: AsyncSession, link_id: int, granularity: str, date_from: datetime, date_to: datetime
+) -> dict:
+    """
+    Возвращает ряд кликов по интервалам и разбивку по измерениям за период
+    из предварительно агрегированных таблиц.
+    """
+    table = BUCKET_TABLES[granularity]
+    in_range = (
+        table.link_id == link_id,
+        table.bucket_start >= date_from,
+        table.bucket_start <= date_to,
+    )
+
+    series = await db.execute(
+        select(table.bucket_start, func.sum(table.clicks))
+        .where(*in_range)
+        .group_by(table.bucket_start)
+        .order_by(table.bucket_start)
+    )
+
+    async def breakdown(column) -> dict:
+        result = await db.execute(select(column, func.sum(table.clicks)).where(*in_range).group_by(column))
+        return {(key or "unknown"): int(clicks) for key, clicks in result.all()}
+
+    return {
+        "granularity": granularity,
+        "from": date_from,
+        "to": date_to,
+        "series": [{"bucket": bucket, "clicks": int(clicks)} for bucket, clicks in series.all()],
+        "referrers": await breakdown(table.referrer),
+        "user_agents": await breakdown(table.ua_class),
+        "countries": await breakdown(table.country),
+    }
+
+
+def align_range(granularity: str, date_from: Optional[datetime], date_to: Optional[datetime]):
+    """
+    Значения периода по умолчанию (последние 7 дней) с выравниванием начала по интервалу.
+    """
+    date_to = date_to or datetime.utcnow()
+    date_from = date_from or date_to - timedelta(days=7)
+    if granularity == "day":
+        date_from = date_from.replace(hour=0, minute=0, second=0, microsecond=0)
+    else:
+        date_from = date_from.replace(minute=0, second=0, microsecond=0)
+    return date_from, date_to
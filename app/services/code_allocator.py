@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import os
+import random
+import string
+from typing import List
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app.database.DatabaseConnection import async_engine
+from app.database.models.CodeSequenceModel import CodeSequence
+
+ALPHABET = string.ascii_letters + string.digits
+BASE = len(ALPHABET)
+
+# Стратегия выдачи коротких кодов: sequence (по умолчанию) или random
+SHORT_CODE_ALLOCATOR = os.getenv("SHORT_CODE_ALLOCATOR", "sequence")
+# Минимальная длина кода; при исчерпании пространства длина растёт автоматически
+SHORT_CODE_MIN_LENGTH = int(os.getenv("SHORT_CODE_MIN_LENGTH", 6))
+# Сколько идентификаторов воркер арендует за одно обращение к БД
+SHORT_CODE_BLOCK_SIZE = int(os.getenv("SHORT_CODE_BLOCK_SIZE", 1000))
+# Перемешивать ли идентификаторы, чтобы коды не шли подряд
+SHORT_CODE_SCRAMBLE = os.getenv("SHORT_CODE_SCRAMBLE", "true").lower() == "true"
+SECRET_KEY = os.getenv("SECRET_KEY", "your_secret_key")
+
+# Раундов сети Фейстеля при перемешивании (чётное число)
+FEISTEL_ROUNDS = 8
+# Пачки кодов больше этого кодируются в отдельном потоке
+ENCODE_INLINE_LIMIT = 1000
+
+
+def encode_base62(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        value, remainder = divmod(value, BASE)
+        chars.append(ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+class RandomCodeAllocator:
+    """
+    Случайные коды без предварительной проверки в БД.
+    Коллизию ловит уникальный индекс при INSERT.
+    """
+
+    def __init__(self, length: int = SHORT_CODE_MIN_LENGTH):
+        self.length = length
+
+    async def allocate(self) -> str:
+        return "".join(random.choices(ALPHABET, k=self.length))
+
+    async def allocate_many(self, count: int) -> List[str]:
+        return ["".join(random.choices(ALPHABET, k=self.length)) for _ in range(count)]
+
+
+class SequenceCodeAllocator:
+    """
+    Коды из монотонного счётчика: воркер арендует блок идентификаторов одним
+    UPDATE ... RETURNING и выдаёт их из памяти.
+
+    Идентификатор кодируется в base62. Коды длины L занимают свой диапазон
+    идентификаторов, поэтому при его исчерпании длина растёт на единицу.
+    Внутри диапазона идентификатор перемешивается секретной перестановкой 62^L:
+    сеть Фейстеля с ключами раундов из SECRET_KEY на ближайшей сверху степени двойки
+    и cycle-walking (результат вне диапазона перемешивается повторно). Перестановка
+    сохраняет уникальность, а по выданным кодам нельзя восстановить соседние.
+    """
+
+    def __init__(self, min_length: int = SHORT_CODE_MIN_LENGTH, block_size: int = SHORT_CODE_BLOCK_SIZE,
+                 scramble: bool = SHORT_CODE_SCRAMBLE, secret: str = SECRET_KEY):
+        self.min_length = min_length
+        self.block_size = block_size
+        self.scramble = scramble
+        # Функция раунда — SHA-256(ключ раунда || вход фиксированной длины); состояние
+        # после ключа считается один раз и копируется при каждом вызове
+        self._round_hashes = [
+            hashlib.sha256(hashlib.sha256(f"{secret}:feistel:{i}".encode()).digest()) for i in range(FEISTEL_ROUNDS)
+        ]
+        self._next = 0
+        self._end = 0
+        self._lock = asyncio.Lock()
+
+    async def _lease_block(self) -> None:
+        stmt = (
+            update(CodeSequence)
+            .where(CodeSequence.id == 1)
+            .values(next_value=CodeSequence.next_value + self.block_size)
+            .returning(CodeSequence.next_value)
+        )
+        async with async_engine.begin() as conn:
+            end = (await conn.execute(stmt)).scalar()
+            if end is None:
+                try:
+                    async with conn.begin_nested():
+                        await conn.execute(insert(CodeSequence).values(id=1, next_value=self.block_size))
+                    end = self.block_size
+                except IntegrityError:
+                    # Строку-счётчик параллельно создал другой воркер
+                    end = (await conn.execute(stmt)).scalar()
+        self._next, self._end = end - self.block_size, end
+
+    def encode(self, value: int) -> str:
+        length = self.min_length
+        space = BASE ** length
+        while value >= space:
+            value -= space
+            length += 1
+            space = BASE ** length
+
+        if self.scramble:
+            bits = (space - 1).bit_length()
+            # Перестановка 2^bits, ограниченная на [0, space): цикл, начатый в диапазоне, в него возвращается
+            value = self._feistel(value, bits)
+            while value >= space:
+                value = self._feistel(value, bits)
+        return encode_base62(value, length)
+
+    def _round(self, index: int, half: int, bits: int, out_bits: int) -> int:
+        # Ширина домена входит в хеш: у каждой длины кода своя перестановка
+        round_hash = self._round_hashes[index].copy()
+        round_hash.update(bits.to_bytes(2, "big") + half.to_bytes(16, "big"))
+        return int.from_bytes(round_hash.digest(), "big") & ((1 << out_bits) - 1)
+
+    def _feistel(self, value: int, bits: int) -> int:
+        """
+        Перестановка bits-битных чисел. Половины могут быть разной ширины: раунд
+        (L, R) -> (R, L ^ F(R)) меняет их местами, при чётном числе раундов ширины возвращаются.
+        """
+        left_bits = bits // 2
+        right_bits = bits - left_bits
+        left, right = value >> right_bits, value & ((1 << right_bits) - 1)
+        for index in range(FEISTEL_ROUNDS):
+            left, right = right, left ^ self._round(index, right, bits, left_bits)
+            left_bits, right_bits = right_bits, left_bits
+        return (left << right_bits) | right
+
+    async def allocate(self) -> str:
+        async with self._lock:
+            if self._next >= self._end:
+                await self._lease_block()
+            value = self._next
+            self._next += 1
+        return self.encode(value)
+
+    async def allocate_many(self, count: int) -> List[str]:
+        values = []
+        async with self._lock:
+            while len(values) < count:
+                if self._next >= self._end:
+                    await self._lease_block()
+                take = min(count - len(values), self._end - self._next)
+                values.extend(range(self._next, self._next + take))
+                self._next += take
+        if len(values) > ENCODE_INLINE_LIMIT:
+            # Перемешивание большой пачки занимает заметное время — не держим цикл событий
+            return await asyncio.to_thread(lambda: [self.encode(value) for value in values])
+        return [self.encode(value) for value in values]
+
+
+_allocator = None
+
+
+def get_allocator():
+    """
+    Возвращает общий для воркера аллокатор кодов согласно SHORT_CODE_ALLOCATOR.
+    """
+    global _allocator
+    if _allocator is None:
+        _allocator = RandomCodeAllocator() if SHORT_CODE_ALLOCATOR == "random" else SequenceCodeAllocator()
+    return _allocator
@@ -0,0 +1,150 @@
+import os
+import time
+from typing import Iterable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import func, select
+
+from app.database.DatabaseConnection import SessionLocal
+from app.database.models.LinkModel import Link
+from app.metrics.Prometheus import CODE_FILTER_CHECKS
+from app.redis.BloomFilter import RedisBloomFilter
+from app.redis.RedisConnection import AsyncRedisClient, RedisClient
+
+load_dotenv()
+
+# Фильтр Блума по всем коротким кодам: отсекает заведомо несуществующие коды без запроса к БД
+CODE_FILTER_ENABLED = os.getenv("CODE_FILTER_ENABLED", "true").lower() == "true"
+# Минимальная ёмкость фильтра; при перестройке берётся не меньше удвоенного числа ссылок
+CODE_FILTER_CAPACITY = int(os.getenv("CODE_FILTER_CAPACITY", 10_000_000))
+CODE_FILTER_FALSE_POSITIVE_RATE = float(os.getenv("CODE_FILTER_FALSE_POSITIVE_RATE", 0.001))
+CODE_FILTER_REBUILD_HOURS = int(os.getenv("CODE_FILTER_REBUILD_HOURS", 24))
+CODE_FILTER_LOCK_TIMEOUT_SECONDS = int(os.getenv("CODE_FILTER_LOCK_TIMEOUT_SECONDS", 3600))
+
+CODE_FILTER_LOCK_KEY = "lock:code_filter"
+
+CodeFilter = RedisBloomFilter("bloom:short_codes", RedisClient, AsyncRedisClient)
+
+# Результаты проверок в этом воркере (то же, что в /metrics, но в виде для /metrics/code-filter)
+CodeFilterStats = {"absent": 0, "maybe": 0, "false_positive": 0, "not_built": 0, "error": 0}
+
+
+def _count(result: str) -> None:
+    CodeFilterStats[result] += 1
+    CODE_FILTER_CHECKS.labels(result).inc()
+
+
+async def might_exist(short_code: str) -> Optional[bool]:
+    """
+    False — кода точно нет в БД, True — возможно есть,
+    None — фильтр выключен, не построен или Redis недоступен (нужно идти в БД).
+    """
+    if not CODE_FILTER_ENABLED:
+        return None
+    try:
+        present = await CodeFilter.might_contain(short_code)
+    except Exception as e:
+        print(f"Ошибка при работе с Redis: {e}")
+        _count("error")
+        return None
+    if present is None:
+        _count("not_built")
+        return None
+    _count("maybe" if present else "absent")
+    return present
+
+
+def record_false_positive() -> None:
+    """
+    Фильтр ответил «возможно есть», а ссылки в БД не оказалось.
+    """
+    _count("false_positive")
+
+
+async def register_codes(codes: Iterable[str]) -> None:
+    """
+    Добавляет коды новых ссылок в фильтр (в том числе в строящийся при перестройке).
+    """
+    if not CODE_FILTER_ENABLED:
+        return
+    try:
+        await CodeFilter.add(codes)
+    except Exception as e:
+        # Без добавления новая ссылка получила бы 404 — сбрасываем фильтр до перестройки
+        print(f"Ошибка добавления в фильтр кодов, фильтр отключён до перестройки: {e}")
+        try:
+            await AsyncRedisClient.delete(CodeFilter.meta_key)
+        except Exception:
+            pass
+
+
+def register_codes_sync(codes: Iterable[str]) -> bool:
+    """
+    Синхронный вариант register_codes — для CLI импорта ссылок.
+    Возвращает False, если коды добавить не удалось (фильтр нужно перестроить).
+    """
+    if not CODE_FILTER_ENABLED:
+        return True
+    try:
+        CodeFilter.add_sync(codes)
+        return True
+    except Exception as e:
+        print(f"Ошибка добавления в фильтр кодов, фильтр отключён до перестройки: {e}")
+        try:
+            RedisClient.delete(CodeFilter.meta_key)
+        except Exception:
+            pass
+        return False
+
+
+def record_removed_codes(count: int) -> None:
+    if CODE_FILTER_ENABLED:
+        CodeFilter.record_removed(count)
+
+
+def rebuild_code_filter() -> Optional[dict]:
+    """
+    Задача фонового воркера: перестраивает фильтр по таблице links (потоково, пачками).
+    Перестройка нужна, чтобы убрать удалённые коды и подстроить размер под число ссылок.
+    """
+    if not CODE_FILTER_ENABLED:
+        return None
+    lock = RedisClient.lock(CODE_FILTER_LOCK_KEY, timeout=CODE_FILTER_LOCK_TIMEOUT_SECONDS, blocking=False)
+    if not lock.acquire():
+        return None
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        total = db.execute(select(func.count()).select_from(Link)).scalar()
+        bits, hashes = CodeFilter.begin_rebuild(max(CODE_FILTER_CAPACITY, total * 2), CODE_FILTER_FALSE_POSITIVE_RATE)
+        # Выборка кодов начинается после создания строящегося фильтра: коды, закоммиченные
+        # позже её снимка, register_codes уже добавляет в оба фильтра
+        codes = db.execute(
+            select(Link.short_code).execution_options(yield_per=10000)
+        ).scalars()
+        items = CodeFilter.fill_rebuild(codes, bits, hashes)
+        CodeFilter.swap_rebuild(items)
+        result = {"items": items, "bits": bits, "hashes": hashes, "seconds": round(time.perf_counter() - started, 3)}
+        print(f"Фильтр кодов перестроен: {result}")
+        return result
+    except Exception as e:
+        print(f"Ошибка перестройки фильтра кодов: {e}")
+        return None
+    finally:
+        db.close()
+        try:
+            lock.release()
+        except Exception:
+            pass
+
+
+def get_code_filter_stats() -> dict:
+    checks = dict(CodeFilterStats)
+    observed = round(checks["false_positive"] / checks["maybe"], 6) if checks["maybe"] else None
+    return {
+        "enabled": CODE_FILTER_ENABLED,
+        **(CodeFilter.stats() if CODE_FILTER_ENABLED else {}),
+        "worker_checks": checks,
+        "observed_false_positive_rate": observed,
+    }
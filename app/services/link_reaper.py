@@ -0,0 +1,130 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from app.database.DatabaseConnection import SessionLocal
+from app.database.models.LinkModel import Link
+from app.redis.RedisConnection import RedisClient, evict_links
+from app.services.click_analytics import link_bucket_deletes
+from app.services.code_filter import record_removed_codes
+from app.services.url_digest import dedup_scope
+
+# Через сколько дней без посещений ссылка удаляется
+LINK_INACTIVITY_DAYS = int(os.getenv("LINK_INACTIVITY_DAYS", 14))
+# Сколько строк удаляется одной транзакцией
+REAPER_BATCH_SIZE = int(os.getenv("REAPER_BATCH_SIZE", 1000))
+# Период запуска очистки
+REAPER_INTERVAL_MINUTES = int(os.getenv("REAPER_INTERVAL_MINUTES", 60))
+# Время жизни распределённой блокировки; продлевается после каждой пачки
+REAPER_LOCK_TIMEOUT_SECONDS = int(os.getenv("REAPER_LOCK_TIMEOUT_SECONDS", 300))
+
+REAPER_LOCK_KEY = "lock:link_reaper"
+REAPER_METRICS_KEY = "metrics:link_reaper"
+
+
+def _delete_batch(db: Session, condition) -> List[tuple]:
+    """
+    Удаляет до REAPER_BATCH_SIZE ссылок, подходящих под условие, одним DELETE ... RETURNING,
+    и их агрегаты кликов в той же транзакции.
+    """
+    batch = select(Link.id).where(condition).limit(REAPER_BATCH_SIZE)
+    if db.bind.dialect.name == "postgresql":
+        # Не ждём строки, заблокированные параллельными транзакциями
+        batch = batch.with_for_update(skip_locked=True)
+    stmt = (
+        delete(Link)
+        .where(Link.id.in_(batch.scalar_subquery()))
+        .returning(Link.id, Link.short_code, Link.user_id, Link.url_digest)
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.execute(stmt).all()
+    if rows:
+        for bucket_delete in link_bucket_deletes(link_id for link_id, _, _, _ in rows):
+            db.execute(bucket_delete)
+    db.commit()
+    return [(short_code, user_id, digest) for _, short_code, user_id, digest in rows]
+
+
+def _evict_cache(rows: List[tuple]) -> None:
+    """
+    Удаляет записи кэша и дедупликации для удалённых ссылок одним конвейером
+    и рассылает инвалидацию локальных кэшей.
+    """
+    pipe = RedisClient.pipeline(transaction=False)
+    evict_links(pipe, [short_code for short_code, _, _ in rows])
+    for short_code, user_id, digest in rows:
+        if digest:
+            pipe.delete(f"dedup:{dedup_scope(user_id)}:{digest}")
+    pipe.execute()
+
+
+def _oldest_lag_seconds(db: Session, now: datetime, inactive_before: datetime) -> float:
+    """
+    Отставание очистки: насколько давно истекла самая старая ещё не удалённая ссылка.
+    """
+    oldest_expired = db.execute(select(func.min(Link.expires_at)).where(Link.expires_at < now)).scalar()
+    oldest_inactive = db.execute(
+        select(func.min(Link.last_visited)).where(Link.last_visited < inactive_before)
+    ).scalar()
+    lags = []
+    if oldest_expired:
+        lags.append((now - oldest_expired).total_seconds())
+    if oldest_inactive:
+        lags.append((inactive_before - oldest_inactive).total_seconds())
+    return max(lags) if lags else 0.0
+
+
+def reap_links() -> int:
+    """
+    Удаляет истёкшие ссылки и ссылки без посещений дольше LINK_INACTIVITY_DAYS
+    пачками по REAPER_BATCH_SIZE и вычищает их из Redis.
+    Запускается только в одном воркере благодаря блокировке в Redis.
+    Возвращает количество удалённых ссылок.
+    """
+    lock = RedisClient.lock(REAPER_LOCK_KEY, timeout=REAPER_LOCK_TIMEOUT_SECONDS, blocking=False)
+    if not lock.acquire():
+        return 0
+
+    started = time.perf_counter()
+    deleted = 0
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
+        inactive_before = now - timedelta(days=LINK_INACTIVITY_DAYS)
+        conditions = [Link.expires_at < now, Link.last_visited < inactive_before]
+        for condition in conditions:
+            while True:
+                rows = _delete_batch(db, condition)
+                if rows:
+                    _evict_cache(rows)
+                    deleted += len(rows)
+                    lock.reacquire()
+                if len(rows) < REAPER_BATCH_SIZE:
+                    break
+
+        elapsed = time.perf_counter() - started
+        RedisClient.hset(REAPER_METRICS_KEY, mapping={
+            "last_run_at": now.isoformat(),
+            "deleted": deleted,
+            "duration_seconds": round(elapsed, 3),
+            "rows_per_second": round(deleted / elapsed, 1) if elapsed else 0,
+            "lag_seconds": round(_oldest_lag_seconds(db, now, inactive_before), 1),
+        })
+        RedisClient.hincrby(REAPER_METRICS_KEY, "deleted_total", deleted)
+        # Из фильтра Блума коды не удаляются — учитываем их до следующей перестройки
+        record_removed_codes(deleted)
+    except Exception as e:
+        db.rollback()
+        print(f"Ошибка при удалении старых ссылок: {e}")
+    finally:
+        db.close()
+        try:
+            lock.release()
+        except Exception:
+            # Блокировка уже истекла — следующий запуск возьмёт её заново
+            pass
+    return deleted
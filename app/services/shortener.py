@@ -1,24 +1,129 @@
-import random
-import string
-from typing import Optional
-from sqlalchemy.orm import Session
+from typing import List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.schemas.LinkSchema import LinkCreate
 from app.crud import crud_link
+from app.database.models.LinkModel import Link
+from app.services.code_allocator import get_allocator
+from app.services.code_filter import register_codes
+from app.services.url_digest import dedup_scope, normalize_url, url_digest, url_domain
+from app.redis.RedisConnection import get_cached_link, get_dedup_code, set_dedup_code
+
+# Сколько раз пробуем другой код, если сгенерированный уже занят (например, алиасом)
+MAX_ALLOCATION_ATTEMPTS = 5
 
 
 class URLShortener:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, allocator=None):
         self.db = db
+        self.allocator = allocator or get_allocator()
+
+    async def generate_short_code(self) -> str:
+        return await self.allocator.allocate()
+
+    async def find_existing(self, link_in: LinkCreate, user_id: Optional[int] = None) -> Optional[str]:
+        """
+        Ищет уже созданную короткую ссылку на тот же URL (без алиаса и срока действия)
+        в пределах пользователя или анонимных ссылок. Сначала проверяет Redis, затем индекс в БД.
+        """
+        if link_in.custom_alias or link_in.expires_at:
+            return None
 
-    def generate_short_code(self, length: int = 6) -> str:
-        chars = string.ascii_letters + string.digits
-        while True:
-            code = ''.join(random.choices(chars, k=length))
-            if not crud_link.get_link_by_short_code(self.db, code):
-                return code
+        original_url = str(link_in.original_url)
+        digest = url_digest(original_url)
+        scope = dedup_scope(user_id)
 
-    def create_short_code_or_custom(self, custom_alias: Optional[str]) -> str:
-        if custom_alias:
-            if crud_link.get_link_by_custom_alias(self.db, custom_alias):
+        short_code = await get_dedup_code(scope, digest)
+        if short_code:
+            # Убеждаемся по кэшу ссылок, что код всё ещё ведёт на тот же URL
+            cached = await get_cached_link(short_code)
+            if isinstance(cached, dict) and normalize_url(cached["original_url"]) == normalize_url(original_url):
+                return short_code
+
+        link = await crud_link.get_link_by_url_digest(self.db, digest, user_id)
+        if not link:
+            return None
+        await set_dedup_code(scope, digest, link.short_code)
+        return link.short_code
+
+    async def create_link(self, link_in: LinkCreate, user_id: Optional[int] = None) -> Link:
+        """
+        Создаёт ссылку одним INSERT без предварительной проверки кода и добавляет код в фильтр кодов.
+        Уникальность гарантирует индекс; для занятого алиаса бросает ValueError.
+        """
+        if link_in.custom_alias:
+            try:
+                link = await crud_link.create_link(self.db, link_in.custom_alias, link_in, user_id)
+            except IntegrityError:
+                await self.db.rollback()
                 raise ValueError("Alias already in use")
-            return custom_alias
-        return self.generate_short_code()
+            await register_codes([link.short_code])
+            return link
+
+        for _ in range(MAX_ALLOCATION_ATTEMPTS):
+            short_code = await self.generate_short_code()
+            try:
+                link = await crud_link.create_link(self.db, short_code, link_in, user_id)
+            except IntegrityError:
+                await self.db.rollback()
+                continue
+            # Код становится известен клиенту только из ответа, т.е. уже после добавления в фильтр
+            await register_codes([link.short_code])
+            return link
+        raise RuntimeError("Could not allocate a unique short code")
+
+    async def create_links_batch(
+        self, items: List[Tuple[int, LinkCreate]], user_id: Optional[int] = None
+    ) -> Tuple[List[dict], List[dict]]:
+        """
+        Создаёт пачку ссылок одним многострочным INSERT в одной транзакции.
+        Ошибки отдельных элементов (занятый алиас) не прерывают пачку.
+        Возвращает (созданные, ошибки); созданные содержат index, short_code, id и данные ссылки.
+        """
+        created, errors = [], []
+        pending = []
+        seen_aliases = set()
+        for index, link_in in items:
+            if link_in.custom_alias:
+                if link_in.custom_alias in seen_aliases:
+                    errors.append({"index": index, "error": "Custom alias already in use"})
+                    continue
+                seen_aliases.add(link_in.custom_alias)
+            pending.append((index, link_in))
+
+        for _ in range(MAX_ALLOCATION_ATTEMPTS):
+            if not pending:
+                break
+            generated = iter(await self.allocator.allocate_many(
+                sum(1 for _, link_in in pending if not link_in.custom_alias)
+            ))
+            rows = []
+            for index, link_in in pending:
+                rows.append({
+                    "original_url": str(link_in.original_url),
+                    "short_code": link_in.custom_alias or next(generated),
+                    "custom_alias": link_in.custom_alias,
+                    "expires_at": link_in.expires_at,
+                    "user_id": user_id,
+                    "url_digest": url_digest(str(link_in.original_url)),
+                    "domain": url_domain(str(link_in.original_url)),
+                })
+
+            inserted = await crud_link.create_links_bulk(self.db, rows)
+            await self.db.commit()
+            await register_codes(inserted)
+
+            retry = []
+            for (index, link_in), row in zip(pending, rows):
+                if row["short_code"] in inserted:
+                    created.append({"index": index, "id": inserted[row["short_code"]], **row})
+                elif link_in.custom_alias:
+                    errors.append({"index": index, "error": "Custom alias already in use"})
+                else:
+                    # Сгенерированный код совпал с существующим — выдаём новый
+                    retry.append((index, link_in))
+            pending = retry
+
+        for index, _ in pending:
+            errors.append({"index": index, "error": "Could not allocate a unique short code"})
+        return created, errors
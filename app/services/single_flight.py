@@ -0,0 +1,32 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+
+from app.metrics.Prometheus import SINGLE_FLIGHT_CALLS
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одним ключом: загрузка выполняется один раз,
+    остальные вызывающие ждут её результат (или исключение).
+    Действует в пределах процесса воркера.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, load: Callable[[], Awaitable]):
+        task = self._calls.get(key)
+        if task is None:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "leader").inc()
+            task = asyncio.ensure_future(load())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            SINGLE_FLIGHT_CALLS.labels(self.name, "shared").inc()
+        # shield: отмена одного ожидающего запроса не прерывает загрузку для остальных
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
@@ -0,0 +1,42 @@
+import hashlib
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    """
+    Приводит URL к каноническому виду для дедупликации: схема и хост в нижнем
+    регистре, без порта по умолчанию, без фрагмента, пустой путь — "/".
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+        host = f"{userinfo}@{host}"
+    return urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+def url_digest(url: str) -> str:
+    """
+    SHA-256 от нормализованного URL (hex).
+    """
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def url_domain(url: str) -> Optional[str]:
+    """
+    Хост URL в нижнем регистре без "www." — для фильтра по домену.
+    """
+    host = (urlsplit(url.strip()).hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    return host or None
+
+
+def dedup_scope(user_id: Optional[int]) -> str:
+    return str(user_id) if user_id is not None else "anon"
@@ -0,0 +1,208 @@
+import asyncio
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import String, Integer, DateTime, bindparam, case, column, update, values
+from sqlalchemy.orm import Session
+
+from app.database.DatabaseConnection import SessionLocal
+from app.database.models.LinkModel import Link
+from app.redis.RedisConnection import RedisClient, AsyncRedisClient
+
+# Режим буфера посещений:
+#   redis  — счётчики копятся в Redis (HINCRBY), переживают рестарт приложения,
+#            сброс в БД выполняется по принципу at-least-once;
+#   memory — счётчики копятся в памяти процесса, при падении воркера
+#            несброшенные посещения теряются.
+VISIT_BUFFER = os.getenv("VISIT_BUFFER", "redis")
+# Как часто (в секундах) накопленные посещения сбрасываются в таблицу links
+VISIT_FLUSH_INTERVAL_SECONDS = int(os.getenv("VISIT_FLUSH_INTERVAL_SECONDS", 10))
+
+PENDING_COUNTS_KEY = "visits:pending"
+PENDING_LAST_KEY = "visits:pending:last"
+FLUSHING_COUNTS_KEY = "visits:flushing"
+FLUSHING_LAST_KEY = "visits:flushing:last"
+
+# Атомарно переносит накопленные счётчики в "flushing"-ключи.
+# Если flushing-ключи остались от прерванного сброса, новые данные не трогаем —
+# сначала будет досброшен старый пакет.
+_claim_script = RedisClient.register_script("""
+if redis.call('EXISTS', KEYS[3]) == 0 and redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[3])
+    if redis.call('EXISTS', KEYS[2]) == 1 then
+        redis.call('RENAME', KEYS[2], KEYS[4])
+    end
+end
+return redis.call('EXISTS', KEYS[3])
+""")
+
+_memory_lock = threading.Lock()
+_memory_counts: Dict[str, int] = {}
+_memory_last: Dict[str, datetime] = {}
+
+
+async def record_visit(short_code: str) -> None:
+    """
+    Учитывает посещение ссылки в буфере, не обращаясь к базе данных.
+    """
+    now = datetime.utcnow()
+    if VISIT_BUFFER == "memory":
+        with _memory_lock:
+            _memory_counts[short_code] = _memory_counts.get(short_code, 0) + 1
+            _memory_last[short_code] = now
+        return
+
+    try:
+        async with AsyncRedisClient.pipeline(transaction=False) as pipe:
+            pipe.hincrby(PENDING_COUNTS_KEY, short_code, 1)
+            pipe.hset(PENDING_LAST_KEY, short_code, now.isoformat())
+            await pipe.execute()
+    except Exception as e:
+        print(f"Ошибка при записи посещения в Redis: {e}")
+
+
+async def get_pending_visits(short_code: str) -> Tuple[int, Optional[datetime]]:
+    """
+    Возвращает количество ещё не сброшенных в БД посещений ссылки
+    и время последнего из них.
+    """
+    if VISIT_BUFFER == "memory":
+        with _memory_lock:
+            return _memory_counts.get(short_code, 0), _memory_last.get(short_code)
+
+    try:
+        async with AsyncRedisClient.pipeline(transaction=False) as pipe:
+            pipe.hget(PENDING_COUNTS_KEY, short_code)
+            pipe.hget(FLUSHING_COUNTS_KEY, short_code)
+            pipe.hget(PENDING_LAST_KEY, short_code)
+            pipe.hget(FLUSHING_LAST_KEY, short_code)
+            pending, flushing, pending_last, flushing_last = await pipe.execute()
+    except Exception as e:
+        print(f"Ошибка при чтении посещений из Redis: {e}")
+        return 0, None
+
+    count = int(pending or 0) + int(flushing or 0)
+    timestamps = [datetime.fromisoformat(ts) for ts in (pending_last, flushing_last) if ts]
+    return count, max(timestamps) if timestamps else None
+
+
+def apply_visit_deltas(db: Session, counts: Dict[str, int], last: Dict[str, datetime]) -> None:
+    """
+    Применяет накопленные приращения visit_count и last_visited одним UPDATE.
+    Не выполняет commit.
+    """
+    rows = [
+        {"code": code, "delta": delta, "last": last.get(code) or datetime.utcnow()}
+        for code, delta in counts.items()
+    ]
+
+    if db.bind.dialect.name == "postgresql":
+        # UPDATE ... FROM (VALUES ...) — один запрос на весь пакет
+        batch = values(
+            column("code", String),
+            column("delta", Integer),
+            column("last", DateTime),
+            name="batch",
+        ).data([(row["code"], row["delta"], row["last"]) for row in rows])
+        stmt = (
+            update(Link)
+            .where(Link.short_code == batch.c.code)
+            .values(
+                visit_count=Link.visit_count + batch.c.delta,
+                last_visited=case(
+                    (Link.last_visited == None, batch.c.last),  # noqa: E711
+                    (Link.last_visited < batch.c.last, batch.c.last),
+                    else_=Link.last_visited,
+                ),
+            )
+        )
+        db.connection().execute(stmt)
+        return
+
+    # Для остальных СУБД — executemany одного подготовленного запроса
+    stmt = (
+        update(Link)
+        .where(Link.short_code == bindparam("code"))
+        .values(
+            visit_count=Link.visit_count + bindparam("delta"),
+            last_visited=case(
+                (Link.last_visited == None, bindparam("last")),  # noqa: E711
+                (Link.last_visited < bindparam("last"), bindparam("last")),
+                else_=Link.last_visited,
+            ),
+        )
+    )
+    db.connection().execute(stmt, rows)
+
+
+def _flush_memory(db: Session) -> int:
+    global _memory_counts, _memory_last
+    with _memory_lock:
+        counts, last = _memory_counts, _memory_last
+        _memory_counts, _memory_last = {}, {}
+
+    if not counts:
+        return 0
+
+    try:
+        apply_visit_deltas(db, counts, last)
+        db.commit()
+    except Exception:
+        db.rollback()
+        # Возвращаем несброшенные посещения обратно в буфер
+        with _memory_lock:
+            for code, delta in counts.items():
+                _memory_counts[code] = _memory_counts.get(code, 0) + delta
+                if code not in _memory_last or _memory_last[code] < last[code]:
+                    _memory_last[code] = last[code]
+        raise
+    return len(counts)
+
+
+def _flush_redis(db: Session) -> int:
+    if not _claim_script(keys=[PENDING_COUNTS_KEY, PENDING_LAST_KEY, FLUSHING_COUNTS_KEY, FLUSHING_LAST_KEY]):
+        return 0
+
+    counts = {code: int(delta) for code, delta in RedisClient.hgetall(FLUSHING_COUNTS_KEY).items()}
+    last = {code: datetime.fromisoformat(ts) for code, ts in RedisClient.hgetall(FLUSHING_LAST_KEY).items()}
+
+    if counts:
+        try:
+            apply_visit_deltas(db, counts, last)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # flushing-ключи остаются в Redis и будут сброшены при следующем запуске
+            raise
+
+    RedisClient.delete(FLUSHING_COUNTS_KEY, FLUSHING_LAST_KEY)
+    return len(counts)
+
+
+def flush_visits() -> int:
+    """
+    Сбрасывает накопленные посещения в таблицу links.
+    Возвращает количество обновлённых ссылок.
+    """
+    db = SessionLocal()
+    try:
+        if VISIT_BUFFER == "memory":
+            return _flush_memory(db)
+        return _flush_redis(db)
+    except Exception as e:
+        print(f"Ошибка при сбросе посещений: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+async def flush_memory_visits_periodically() -> None:
+    """
+    Сбрасывает буфер VISIT_BUFFER=memory этого процесса: до него не дотянется
+    отдельный воркер, поэтому в этом режиме веб-процесс сбрасывает посещения сам.
+    """
+    while True:
+        await asyncio.sleep(VISIT_FLUSH_INTERVAL_SECONDS)
+        await asyncio.to_thread(flush_visits)
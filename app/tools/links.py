@@ -0,0 +1,354 @@
+"""
+Выгрузка и загрузка таблиц users и links через COPY (только Postgres).
+
+    python -m app.tools.links export --dir dump --format binary
+    python -m app.tools.links import --dir dump
+
+Выгрузка потоково пишет каждую таблицу в свой файл (COPY ... TO STDOUT) в одном снимке
+REPEATABLE READ, рядом кладётся manifest.json с форматом, колонками и числом строк.
+
+Загрузка копирует файлы во временные таблицы (COPY ... FROM STDIN), затем переносит строки
+в users и links через INSERT ... ON CONFLICT DO NOTHING: строки с занятым email/token,
+short_code или custom_alias пропускаются, а не ломают загрузку. Ссылки переносятся пачками
+по --batch-size строк, каждая пачка — отдельная транзакция; её коды добавляются в фильтр кодов
+до commit (при ошибке фильтр перестраивается в конце загрузки), а записи после commit
+попадают в кэш Redis конвейерами. Память процесса не зависит от
+размера выгрузки. Ссылки получают новые id, пользователи сопоставляются по email;
+--keep-ids сохраняет исходные id (для восстановления в пустую БД).
+
+Рассылка инвалидации для загруженных кодов не делается: отрицательные записи локальных
+кэшей веб-процессов истекают через LOCAL_CACHE_NEGATIVE_TTL_SECONDS.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+from app.database.DatabaseConnection import engine
+from app.database.LinkPartitioning import LINKS_PARTITIONING, ensure_range_partitions
+from app.redis.LinkCacheLayout import LinkLayout, encode_link_record, link_cache_ttl
+from app.redis.RedisConnection import LinkCacheClient
+from app.services.code_filter import (
+    CODE_FILTER_ENABLED, CODE_FILTER_FALSE_POSITIVE_RATE, CodeFilter, rebuild_code_filter, register_codes_sync,
+)
+
+load_dotenv()
+
+# Строк ссылок в одной транзакции загрузки (и в одной пачке записей в Redis)
+LINKS_IMPORT_BATCH_SIZE = int(os.getenv("LINKS_IMPORT_BATCH_SIZE", 100000))
+# Команд в одном конвейере Redis при заполнении кэша
+LINKS_IMPORT_CACHE_CHUNK_SIZE = int(os.getenv("LINKS_IMPORT_CACHE_CHUNK_SIZE", 5000))
+
+# Размер блока, которым psycopg2 читает и пишет данные COPY
+COPY_BUFFER_SIZE = 1 << 20
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+TABLES = {
+    "users": ["id", "email", "hashed_password", "token"],
+    "links": [
+        "id", "original_url", "short_code", "custom_alias", "created_at", "expires_at",
+        "visit_count", "last_visited", "user_id", "url_digest", "domain",
+    ],
+}
+EXTENSIONS = {"csv": "csv", "binary": "bin"}
+COPY_OPTIONS = {"csv": "(FORMAT csv, HEADER true)", "binary": "(FORMAT binary)"}
+
+
+class Progress:
+    """
+    Счётчик строк и байт с выводом скорости в stderr не чаще раза в секунду.
+    """
+
+    def __init__(self, label: str):
+        self.label = label
+        self.rows = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self._printed = self.started
+
+    def add(self, rows: int = 0, size: int = 0) -> None:
+        self.rows += rows
+        self.bytes += size
+        now = time.perf_counter()
+        if now - self._printed >= PROGRESS_INTERVAL_SECONDS:
+            self._printed = now
+            print(self.line(), file=sys.stderr)
+
+    def line(self) -> str:
+        seconds = max(time.perf_counter() - self.started, 1e-9)
+        parts = [f"{self.label}:"]
+        if self.rows:
+            parts.append(f"{self.rows} строк ({self.rows / seconds:,.0f} строк/с)")
+        if self.bytes:
+            parts.append(f"{self.bytes / 2 ** 20:.1f} МБ ({self.bytes / 2 ** 20 / seconds:.1f} МБ/с)")
+        parts.append(f"{seconds:.1f} с")
+        return " ".join(parts)
+
+    def seconds(self) -> float:
+        return round(time.perf_counter() - self.started, 3)
+
+
+class ProgressFile:
+    """
+    Обёртка файла для copy_expert: считает прочитанные и записанные байты.
+    """
+
+    def __init__(self, file, progress: Progress):
+        self.file = file
+        self.progress = progress
+
+    def read(self, size: int = -1):
+        data = self.file.read(size)
+        self.progress.add(size=len(data))
+        return data
+
+    def readline(self, size: int = -1):
+        data = self.file.readline(size)
+        self.progress.add(size=len(data))
+        return data
+
+    def write(self, data):
+        self.progress.add(size=len(data))
+        return self.file.write(data)
+
+
+def _raw_connection():
+    if engine.dialect.name != "postgresql":
+        sys.exit("Выгрузка и загрузка через COPY поддерживаются только для Postgres")
+    return engine.raw_connection()
+
+
+def export_links(directory: str, fmt: str) -> dict:
+    """
+    Выгружает users и links в directory. Возвращает содержимое manifest.json.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"format": fmt, "exported_at": datetime.utcnow().isoformat(), "tables": {}}
+    raw = _raw_connection()
+    try:
+        raw.rollback()
+        cursor = raw.cursor()
+        # Один снимок на обе таблицы: user_id ссылок ссылается на выгруженных пользователей
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        for table, columns in TABLES.items():
+            path = os.path.join(directory, f"{table}.{EXTENSIONS[fmt]}")
+            progress = Progress(f"Выгрузка {table}")
+            with open(path, "wb") as file:
+                cursor.copy_expert(
+                    f"COPY (SELECT {', '.join(columns)} FROM {table}) TO STDOUT WITH {COPY_OPTIONS[fmt]}",
+                    ProgressFile(file, progress),
+                    size=COPY_BUFFER_SIZE,
+                )
+            progress.rows = cursor.rowcount
+            print(progress.line(), file=sys.stderr)
+            manifest["tables"][table] = {"file": os.path.basename(path), "columns": columns, "rows": cursor.rowcount}
+        cursor.execute("SELECT next_value FROM code_sequence WHERE id = 1")
+        row = cursor.fetchone()
+        # Счётчик аллокатора кодов: после загрузки новые коды не должны совпасть с загруженными
+        manifest["code_sequence"] = row[0] if row else None
+        raw.rollback()
+    finally:
+        raw.close()
+
+    with open(os.path.join(directory, "manifest.json"), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def _copy_into_staging(cursor, directory: str, manifest: dict, table: str) -> None:
+    entry = manifest["tables"][table]
+    progress = Progress(f"Копирование {table}")
+    with open(os.path.join(directory, entry["file"]), "rb") as file:
+        cursor.copy_expert(
+            f"COPY {table}_import ({', '.join(entry['columns'])}) FROM STDIN WITH {COPY_OPTIONS[manifest['format']]}",
+            ProgressFile(file, progress),
+            size=COPY_BUFFER_SIZE,
+        )
+    progress.rows = cursor.rowcount
+    print(progress.line(), file=sys.stderr)
+
+
+def _cache_links(rows: list, now: datetime) -> int:
+    """
+    Записывает загруженные ссылки в кэш Redis конвейерами. Истёкшие ссылки пропускаются.
+    """
+    cached = 0
+    for start in range(0, len(rows), LINKS_IMPORT_CACHE_CHUNK_SIZE):
+        chunk = [row for row in rows[start:start + LINKS_IMPORT_CACHE_CHUNK_SIZE] if row[2] is None or row[2] > now]
+        try:
+            with LinkCacheClient.pipeline(transaction=False) as pipe:
+                for short_code, original_url, expires_at, link_id, last_visited in chunk:
+                    LinkLayout.set(
+                        pipe,
+                        short_code,
+                        encode_link_record(original_url, expires_at, link_id),
+                        link_cache_ttl(expires_at, last_visited),
+                    )
+                pipe.execute()
+            cached += len(chunk)
+        except Exception as e:
+            # Кэш заполнится при промахах — загрузку в БД не прерываем
+            print(f"Ошибка при работе с Redis: {e}")
+    return cached
+
+
+def import_links(directory: str, batch_size: int = LINKS_IMPORT_BATCH_SIZE,
+                 keep_ids: bool = False, fill_cache: bool = True) -> dict:
+    """
+    Загружает выгрузку export_links из directory. Возвращает сводку по таблицам.
+    """
+    with open(os.path.join(directory, "manifest.json")) as file:
+        manifest = json.load(file)
+    result = {}
+    raw = _raw_connection()
+    try:
+        raw.rollback()
+        cursor = raw.cursor()
+        # Временные таблицы не пишутся в WAL и живут до конца сессии (переживают commit пачек)
+        cursor.execute("CREATE TEMP TABLE users_import (LIKE users)")
+        cursor.execute("CREATE TEMP TABLE links_import (LIKE links)")
+        cursor.execute("ALTER TABLE links_import ADD COLUMN row_no BIGSERIAL")
+        _copy_into_staging(cursor, directory, manifest, "users")
+        _copy_into_staging(cursor, directory, manifest, "links")
+        cursor.execute("CREATE INDEX ON links_import (row_no)")
+        cursor.execute("ANALYZE users_import")
+        cursor.execute("ANALYZE links_import")
+        raw.commit()
+
+        started = time.perf_counter()
+        user_columns = ["email", "hashed_password", "token"] + (["id"] if keep_ids else [])
+        cursor.execute(f"""
+            INSERT INTO users ({', '.join(user_columns)})
+            SELECT {', '.join(user_columns)} FROM users_import
+            ON CONFLICT DO NOTHING
+        """)
+        inserted = cursor.rowcount
+        # Ссылки пропущенных пользователей с уже существующим email достаются этому пользователю,
+        # ссылки пользователей, пропущенных из-за занятого token, остаются без владельца
+        cursor.execute("""
+            CREATE TEMP TABLE user_id_map AS
+            SELECT s.id AS old_id, u.id AS new_id FROM users_import s JOIN users u ON u.email = s.email
+        """)
+        cursor.execute("CREATE UNIQUE INDEX ON user_id_map (old_id)")
+        cursor.execute("ANALYZE user_id_map")
+        cursor.execute("SELECT count(*) FROM users_import")
+        total = cursor.fetchone()[0]
+        raw.commit()
+        result["users"] = {"rows": total, "inserted": inserted, "skipped": total - inserted,
+                           "seconds": round(time.perf_counter() - started, 3)}
+        print(f"Пользователи: {result['users']}", file=sys.stderr)
+
+        cursor.execute("SELECT count(*), min(created_at), max(created_at), max(row_no) FROM links_import")
+        total, oldest, newest, last_row = cursor.fetchone()
+        raw.commit()
+        if LINKS_PARTITIONING == "range" and oldest:
+            try:
+                with engine.begin() as conn:
+                    ensure_range_partitions(conn, oldest, newest)
+            except Exception as e:
+                # Строки без своей секции попадут в links_default
+                print(f"Ошибка создания секций links: {e}")
+
+        link_columns = [column for column in TABLES["links"] if keep_ids or column != "id"]
+        selected = [
+            "m.new_id" if column == "user_id"
+            else "COALESCE(s.created_at, now() AT TIME ZONE 'utc')" if column == "created_at"
+            else f"s.{column}"
+            for column in link_columns
+        ]
+        insert_batch = f"""
+            INSERT INTO links ({', '.join(link_columns)})
+            SELECT {', '.join(selected)}
+            FROM links_import s LEFT JOIN user_id_map m ON m.old_id = s.user_id
+            WHERE s.row_no > %s AND s.row_no <= %s
+            ON CONFLICT DO NOTHING
+            RETURNING short_code, original_url, expires_at, id, last_visited
+        """
+        progress = Progress("Загрузка links")
+        inserted = cached = 0
+        filter_failed = False
+        for start in range(0, last_row or 0, batch_size):
+            # При RANGE-секционировании занятые коды отсекает триггер link_codes — просим его
+            # пропускать их, как ON CONFLICT DO NOTHING (при других схемах настройка не используется)
+            cursor.execute("SELECT set_config('links.on_code_conflict', 'skip', true)")
+            cursor.execute(insert_batch, (start, start + batch_size))
+            rows = cursor.fetchall()
+            # Коды добавляются в фильтр до commit: иначе сразу после него редирект ответил бы 404.
+            # Лишние коды (если commit не пройдёт) фильтру не вредят
+            if not register_codes_sync(row[0] for row in rows):
+                filter_failed = True
+            raw.commit()
+            if fill_cache:
+                cached += _cache_links(rows, datetime.utcnow())
+            inserted += len(rows)
+            progress.add(rows=len(rows))
+        print(progress.line(), file=sys.stderr)
+        result["links"] = {"rows": total, "inserted": inserted, "skipped": total - inserted,
+                           "cached": cached, "seconds": progress.seconds()}
+
+        if keep_ids:
+            for table in TABLES:
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE((SELECT max(id) FROM {table}), 0) + 1, false)"
+                )
+        if manifest.get("code_sequence"):
+            cursor.execute(
+                "INSERT INTO code_sequence (id, next_value) VALUES (1, %s) "
+                "ON CONFLICT (id) DO UPDATE SET next_value = GREATEST(code_sequence.next_value, EXCLUDED.next_value)",
+                (manifest["code_sequence"],),
+            )
+        raw.commit()
+        cursor.execute("ANALYZE users")
+        cursor.execute("ANALYZE links")
+        # Соединение возвращается в пул — временные таблицы ему больше не нужны
+        cursor.execute("DISCARD TEMP")
+        raw.commit()
+    finally:
+        raw.close()
+
+    # Фильтр перестраивается, если часть кодов в него не попала (их редиректы отвечали бы 404)
+    # или если он построен под прежнее число ссылок и после большой загрузки стал неточным
+    if CODE_FILTER_ENABLED and inserted:
+        rebuild = filter_failed
+        if not rebuild:
+            try:
+                stats = CodeFilter.stats()
+            except Exception as e:
+                print(f"Ошибка при работе с Redis: {e}")
+                stats = {"built": False}
+            rebuild = stats["built"] and stats["estimated_false_positive_rate"] > CODE_FILTER_FALSE_POSITIVE_RATE
+        if rebuild:
+            result["code_filter"] = rebuild_code_filter()
+            if filter_failed and not result["code_filter"]:
+                print("Фильтр кодов не перестроен — запустите python -m app.worker enqueue rebuild_code_filter", file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="выгрузить users и links в каталог")
+    export_parser.add_argument("--dir", required=True, help="каталог выгрузки")
+    export_parser.add_argument("--format", choices=sorted(COPY_OPTIONS), default="binary")
+    import_parser = commands.add_parser("import", help="загрузить выгрузку из каталога")
+    import_parser.add_argument("--dir", required=True, help="каталог выгрузки")
+    import_parser.add_argument("--batch-size", type=int, default=LINKS_IMPORT_BATCH_SIZE, help="строк ссылок в транзакции")
+    import_parser.add_argument("--keep-ids", action="store_true", help="сохранить исходные id (загрузка в пустую БД)")
+    import_parser.add_argument("--no-cache", action="store_true", help="не заполнять кэш Redis")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        manifest = export_links(args.dir, args.format)
+        print(json.dumps(manifest["tables"], indent=2))
+    else:
+        result = import_links(args.dir, args.batch_size, args.keep_ids, not args.no_cache)
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
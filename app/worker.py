@@ -0,0 +1,243 @@
+"""
+Фоновый воркер: выполняет периодические задачи и задачи из очереди в Redis.
+Веб-процессы фоновой работы не выполняют.
+
+    python -m app.worker                    # запустить воркер
+    python -m app.worker enqueue warm_cache # поставить задачу в очередь
+    python -m app.worker status             # очередь, воркеры, последние запуски
+
+Воркеров может быть несколько: периодические задачи ставит в очередь только лидер
+(ключ jobs:leader), выполняют их все воркеры. Расписание хранится в Redis, поэтому
+при смене лидера интервалы не сбиваются. Частые короткие задачи (сброс посещений,
+агрегация кликов) идут в отдельную очередь со своими слотами и не ждут за длинными.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+import uuid
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from app.database.DatabaseConnection import async_engine
+from app.database.LinkPartitioning import LINKS_PARTITION_MAINTENANCE_HOURS, maintain_partitions
+from app.metrics.Prometheus import timed_job
+from app.redis.JobQueue import DEFAULT_QUEUE, LeaderElection, RedisJobQueue
+from app.redis.RedisConnection import AsyncLinkCacheClient, AsyncRedisClient
+from app.services.cache_warmup import CACHE_WARMUP_ON_STARTUP, warm_hot_links
+from app.services.click_analytics import (
+    CLICK_AGGREGATE_INTERVAL_SECONDS,
+    CLICK_RETENTION_INTERVAL_HOURS,
+    aggregate_clicks,
+    purge_click_buckets,
+)
+from app.services.code_filter import CODE_FILTER_REBUILD_HOURS, rebuild_code_filter
+from app.services.link_reaper import REAPER_INTERVAL_MINUTES, reap_links
+from app.services.visit_counter import VISIT_FLUSH_INTERVAL_SECONDS, flush_visits
+
+load_dotenv()
+
+# Сколько задач воркер выполняет одновременно
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", 2))
+# Отдельные слоты для очереди коротких задач (FAST_JOBS) сверх WORKER_CONCURRENCY
+WORKER_FAST_CONCURRENCY = int(os.getenv("WORKER_FAST_CONCURRENCY", 1))
+# Лидер продлевает ключ каждую секунду; при его падении лидерство переходит через этот TTL
+WORKER_LEADER_TTL_SECONDS = float(os.getenv("WORKER_LEADER_TTL_SECONDS", 15))
+# Задачи воркера без heartbeat дольше этого времени возвращаются в очередь
+WORKER_HEARTBEAT_TTL_SECONDS = float(os.getenv("WORKER_HEARTBEAT_TTL_SECONDS", 30))
+# Периодическая задача не ставится повторно, пока не выполнена предыдущая (но не дольше этого времени)
+WORKER_JOB_TIMEOUT_SECONDS = int(os.getenv("WORKER_JOB_TIMEOUT_SECONDS", 3600))
+# Порт HTTP-сервера с метриками Prometheus воркера (0 — не запускать)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", 9100))
+
+TICK_SECONDS = 1.0
+
+
+async def warm_cache():
+    loaded = await warm_hot_links()
+    print(f"Прогрев кэша: загружено {loaded} ссылок")
+    return loaded
+
+
+# Синхронные задачи выполняются в потоках, async — в цикле событий воркера
+JOBS = {
+    job.__name__: timed_job(job)
+    for job in (
+        reap_links, flush_visits, aggregate_clicks, purge_click_buckets,
+        maintain_partitions, rebuild_code_filter, warm_cache,
+    )
+}
+
+# (задача, интервал в секундах, первый запуск сразу после старта)
+PERIODIC_JOBS = [
+    ("flush_visits", VISIT_FLUSH_INTERVAL_SECONDS, False),
+    ("aggregate_clicks", CLICK_AGGREGATE_INTERVAL_SECONDS, False),
+    ("reap_links", REAPER_INTERVAL_MINUTES * 60, False),
+    ("purge_click_buckets", CLICK_RETENTION_INTERVAL_HOURS * 3600, False),
+    ("maintain_partitions", LINKS_PARTITION_MAINTENANCE_HOURS * 3600, False),
+    ("rebuild_code_filter", CODE_FILTER_REBUILD_HOURS * 3600, True),
+]
+
+# Короткие частые задачи: если бы они стояли в общей очереди, перестройка фильтра
+# и прогрев кэша занимали бы все слоты, а буфер посещений и поток кликов росли
+FAST_QUEUE = "fast"
+FAST_JOBS = {"flush_visits", "aggregate_clicks"}
+
+Jobs = RedisJobQueue(AsyncRedisClient, queues=(DEFAULT_QUEUE, FAST_QUEUE))
+
+
+def queue_for(name: str) -> str:
+    return FAST_QUEUE if name in FAST_JOBS else DEFAULT_QUEUE
+
+
+async def enqueue_job(name: str, args: Optional[dict] = None, unique_for: Optional[int] = None) -> bool:
+    return await Jobs.enqueue(name, args, unique_for, queue=queue_for(name))
+
+
+class Worker:
+    def __init__(self, concurrency: int = WORKER_CONCURRENCY, fast_concurrency: int = WORKER_FAST_CONCURRENCY):
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self.fast_concurrency = fast_concurrency
+        self.election = LeaderElection(AsyncRedisClient, "jobs:leader", self.id, WORKER_LEADER_TTL_SECONDS)
+        self.stopping = asyncio.Event()
+        self._requeued_at = 0.0
+
+    async def run_job(self, job: dict, raw: str) -> None:
+        func = JOBS.get(job["name"])
+        started = time.perf_counter()
+        error = None
+        try:
+            if func is None:
+                raise LookupError(f"Неизвестная задача {job['name']}")
+            if asyncio.iscoroutinefunction(func):
+                await func(**job["args"])
+            else:
+                await asyncio.to_thread(func, **job["args"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            print(f"Ошибка задачи {job['name']}: {error}")
+        try:
+            await Jobs.complete(self.id, job, raw, time.perf_counter() - started, error)
+        except Exception as e:
+            # Задача останется в списке обрабатываемых и будет повторена после перезапуска воркера
+            print(f"Ошибка при работе с Redis: {e}")
+
+    async def consume(self, queue: str) -> None:
+        while not self.stopping.is_set():
+            try:
+                taken = await Jobs.take(self.id, timeout=TICK_SECONDS, queue=queue)
+            except Exception as e:
+                print(f"Ошибка при работе с Redis: {e}")
+                await asyncio.sleep(TICK_SECONDS)
+                continue
+            if taken:
+                await self.run_job(*taken)
+
+    async def schedule(self) -> None:
+        """
+        Лидер ставит в очередь периодические задачи, у которых подошло время.
+        """
+        now = time.time()
+        next_runs = await AsyncRedisClient.hgetall(Jobs.schedule_key)
+        for name, interval, immediately in PERIODIC_JOBS:
+            due = float(next_runs[name]) if name in next_runs else (now if immediately else now + interval)
+            if due <= now:
+                await enqueue_job(name, unique_for=WORKER_JOB_TIMEOUT_SECONDS)
+                due = now + interval
+            if next_runs.get(name) != str(due):
+                await AsyncRedisClient.hset(Jobs.schedule_key, name, due)
+
+    async def coordinate(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                await Jobs.heartbeat(self.id, WORKER_HEARTBEAT_TTL_SECONDS)
+                was_leader = self.election.is_leader
+                if await self.election.acquire_or_renew():
+                    if not was_leader:
+                        print(f"Воркер {self.id} стал лидером")
+                        if CACHE_WARMUP_ON_STARTUP:
+                            await enqueue_job("warm_cache", unique_for=WORKER_JOB_TIMEOUT_SECONDS)
+                    # Задачи упавших воркеров возвращаются в очередь после истечения их heartbeat
+                    if time.monotonic() - self._requeued_at >= WORKER_HEARTBEAT_TTL_SECONDS or not was_leader:
+                        requeued = await Jobs.requeue_orphaned()
+                        if requeued:
+                            print(f"Возвращено в очередь задач упавших воркеров: {requeued}")
+                        self._requeued_at = time.monotonic()
+                    await self.schedule()
+            except Exception as e:
+                print(f"Ошибка координации воркера: {e}")
+            try:
+                await asyncio.wait_for(self.stopping.wait(), TICK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self.stopping.set)
+        print(f"Воркер {self.id} запущен")
+        try:
+            # Текущие задачи дорабатывают до конца: новые не берутся после сигнала
+            await asyncio.gather(
+                self.coordinate(),
+                *(self.consume(DEFAULT_QUEUE) for _ in range(self.concurrency)),
+                *(self.consume(FAST_QUEUE) for _ in range(self.fast_concurrency)),
+            )
+        finally:
+            await self.election.release()
+            await Jobs.unregister(self.id)
+            await AsyncRedisClient.aclose()
+            if AsyncLinkCacheClient is not AsyncRedisClient:
+                await AsyncLinkCacheClient.aclose()
+            await async_engine.dispose()
+            print(f"Воркер {self.id} остановлен")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command")
+    run_parser = commands.add_parser("run", help="запустить воркер (по умолчанию)")
+    run_parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="задач одновременно")
+    run_parser.add_argument("--fast-concurrency", type=int, default=WORKER_FAST_CONCURRENCY,
+                            help="слотов для коротких частых задач")
+    enqueue_parser = commands.add_parser("enqueue", help="поставить задачу в очередь")
+    enqueue_parser.add_argument("job", choices=sorted(JOBS))
+    enqueue_parser.add_argument("--args", default="{}", help="аргументы задачи в JSON")
+    commands.add_parser("status", help="состояние очереди и воркеров")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        async def enqueue():
+            queued = await enqueue_job(args.job, json.loads(args.args))
+            print(f"Задача {args.job} поставлена в очередь" if queued else f"Задача {args.job} уже в очереди")
+            await AsyncRedisClient.aclose()
+
+        asyncio.run(enqueue())
+    elif args.command == "status":
+        async def status():
+            print(json.dumps(await worker_status(), indent=2, ensure_ascii=False))
+            await AsyncRedisClient.aclose()
+
+        asyncio.run(status())
+    else:
+        if WORKER_METRICS_PORT:
+            from prometheus_client import start_http_server
+
+            start_http_server(WORKER_METRICS_PORT)
+        asyncio.run(Worker(
+            getattr(args, "concurrency", WORKER_CONCURRENCY),
+            getattr(args, "fast_concurrency", WORKER_FAST_CONCURRENCY),
+        ).run())
+
+
+async def worker_status() -> dict:
+    return {"leader": await AsyncRedisClient.get("jobs:leader"), **await Jobs.status()}
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import tempfile
+
+
+def install_fakes():
+    """
+    Подменяет Postgres на файл SQLite, а Redis — на fakeredis, чтобы бенчмарки
+    работали офлайн. Вызывать до импорта модулей app.
+    """
+    import fakeredis
+    import fakeredis.aioredis
+
+    import app.redis.RedisPool as RedisPool
+
+    path = os.path.join(tempfile.mkdtemp(prefix="linkshortener-bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    os.environ.setdefault("VISIT_BUFFER", "memory")
+    # HEXPIRE есть не во всех версиях fakeredis
+    os.environ.setdefault("LINK_CACHE_FIELD_TTL", "false")
+
+    # Синхронный и асинхронный пулы работают с одним общим фейковым сервером
+    server = fakeredis.FakeServer()
+
+    class FakeBlockingConnectionPool(RedisPool.TimedBlockingConnectionPool):
+        def __init__(self, **kwargs):
+            super().__init__(connection_class=fakeredis.FakeConnection, server=server, **kwargs)
+
+    class FakeAsyncBlockingConnectionPool(RedisPool.TimedAsyncBlockingConnectionPool):
+        def __init__(self, **kwargs):
+            super().__init__(connection_class=fakeredis.aioredis.FakeConnection, server=server, **kwargs)
+
+    RedisPool.TimedBlockingConnectionPool = FakeBlockingConnectionPool
+    RedisPool.TimedAsyncBlockingConnectionPool = FakeAsyncBlockingConnectionPool
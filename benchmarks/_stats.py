@@ -0,0 +1,16 @@
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def latency_summary(latencies) -> dict:
+    """
+    p50/p95/p99 в миллисекундах.
+    """
+    if not latencies:
+        return {"p50": None, "p95": None, "p99": None}
+    return {
+        "p50": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99": round(percentile(latencies, 0.99) * 1000, 3),
+    }
@@ -0,0 +1,152 @@
+"""
+Отчёт о памяти Redis под кэш ссылок: байт на ссылку в раскладке string
+(ключ short_url:{code} на ссылку) и hash (корзины short_url:b:{n}).
+
+В отдельную базу Redis (--db, по умолчанию 15) поочерёдно загружается один и тот же
+набор записей в каждой раскладке, после чего снимаются прирост used_memory,
+сумма MEMORY USAGE по ключам и кодировки хешей-корзин (listpack / hashtable).
+
+Синтетический набор:
+    python -m benchmarks.cache_memory --links 200000 --url-length 80
+Самые посещаемые ссылки из БД (из .env или DATABASE_URL):
+    python -m benchmarks.cache_memory --links 200000 --from-db
+
+Нужен настоящий Redis: fakeredis не моделирует расход памяти.
+"""
+import argparse
+import json
+import math
+import random
+import string
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+CODE_ALPHABET = string.ascii_letters + string.digits
+
+
+def synthetic_records(count: int, url_length: int) -> list:
+    now = datetime.utcnow()
+    records = []
+    for i in range(count):
+        code = "".join(random.choices(CODE_ALPHABET, k=7))
+        host = f"https://site{random.randrange(1000)}.example.com/"
+        length = max(len(host) + 1, int(random.gauss(url_length, url_length / 4)))
+        url = host + "".join(random.choices(CODE_ALPHABET, k=length - len(host)))
+        expires_at = now + timedelta(days=random.randint(1, 30)) if i % 10 == 0 else None
+        records.append((code, url, expires_at, i + 1, now - timedelta(hours=random.randint(0, 72))))
+    return records
+
+
+def db_records(count: int) -> list:
+    from sqlalchemy import select
+
+    from app.database.DatabaseConnection import SessionLocal
+    from app.database.models.LinkModel import Link
+
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(Link.short_code, Link.original_url, Link.expires_at, Link.id, Link.last_visited)
+            .order_by(Link.visit_count.desc())
+            .limit(count)
+        ).all()
+    return [tuple(row) for row in rows]
+
+
+def measure(client, layout, records: list, batch_size: int) -> dict:
+    from app.redis.LinkCacheLayout import encode_link_record, link_cache_ttl
+
+    client.flushdb()
+    before = client.info("memory")["used_memory"]
+    started = time.perf_counter()
+    for start in range(0, len(records), batch_size):
+        pipe = client.pipeline(transaction=False)
+        for short_code, original_url, expires_at, link_id, last_visited in records[start:start + batch_size]:
+            layout.set(
+                pipe, short_code, encode_link_record(original_url, expires_at, link_id),
+                link_cache_ttl(expires_at, last_visited),
+            )
+        pipe.execute()
+    load_seconds = time.perf_counter() - started
+    used = client.info("memory")["used_memory"] - before
+
+    keys = 0
+    key_bytes = 0
+    encodings = Counter()
+    for key in client.scan_iter(count=1000):
+        keys += 1
+        key_bytes += client.memory_usage(key, samples=0) or 0
+        if layout.name == "hash":
+            encodings[client.object("encoding", key)] += 1
+
+    links = len(records)
+    result = {
+        "keys": keys,
+        "used_memory_bytes": used,
+        "used_memory_per_link": round(used / links, 1),
+        "memory_usage_per_link": round(key_bytes / links, 1),
+        "load_seconds": round(load_seconds, 3),
+    }
+    if layout.name == "hash":
+        result["buckets"] = layout.buckets
+        result["links_per_bucket"] = round(links / keys, 1) if keys else 0
+        result["bucket_encodings"] = dict(encodings)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--links", type=int, default=100000, help="количество ссылок в наборе")
+    parser.add_argument("--url-length", type=int, default=60, help="средняя длина синтетического URL")
+    parser.add_argument("--from-db", action="store_true", help="взять самые посещаемые ссылки из БД")
+    parser.add_argument("--buckets", type=int, help="число корзин (по умолчанию ~100 ссылок на корзину)")
+    parser.add_argument("--db", type=int, default=15, help="номер базы Redis для замеров (будет очищена)")
+    parser.add_argument("--flush", action="store_true", help="очистить базу --db, даже если она не пуста")
+    parser.add_argument("--batch-size", type=int, default=1000, help="команд в одном конвейере")
+    args = parser.parse_args()
+
+    import redis
+
+    from app.redis.LinkCacheLayout import (
+        LINK_CACHE_BUCKETS, LINK_CACHE_FIELD_TTL, BucketedLinkLayout, StringLinkLayout,
+    )
+    from app.redis.RedisConnection import _redis_options
+
+    client = redis.Redis(
+        host=_redis_options["host"], port=_redis_options["port"], db=args.db, decode_responses=True
+    )
+    if client.dbsize() and not args.flush:
+        sys.exit(f"База Redis {args.db} не пуста; укажите другую (--db) или --flush")
+
+    records = db_records(args.links) if args.from_db else synthetic_records(args.links, args.url_length)
+    if not records:
+        sys.exit("Нет ссылок для замера")
+    buckets = args.buckets or max(1, math.ceil(len(records) / 100))
+    config = client.config_get("hash-max-listpack-*")
+
+    results = {
+        "links": len(records),
+        "source": "db" if args.from_db else "synthetic",
+        "avg_url_length": round(sum(len(r[1]) for r in records) / len(records), 1),
+        "redis_version": client.info("server")["redis_version"],
+        "listpack_config": config,
+        "field_ttl": LINK_CACHE_FIELD_TTL,
+        "configured_buckets": LINK_CACHE_BUCKETS,
+        "layouts": {},
+    }
+    try:
+        for layout in (StringLinkLayout(), BucketedLinkLayout(buckets, LINK_CACHE_FIELD_TTL)):
+            results["layouts"][layout.name] = measure(client, layout, records, args.batch_size)
+    finally:
+        client.flushdb()
+
+    string_bytes = results["layouts"]["string"]["used_memory_per_link"]
+    hash_bytes = results["layouts"]["hash"]["used_memory_per_link"]
+    results["hash_to_string_ratio"] = round(hash_bytes / string_bytes, 3) if string_bytes else None
+    json.dump(results, sys.stdout, indent=2, default=str)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Проверка шардированного кэша ссылок (LINK_CACHE_REDIS_MODE=sharded) на нескольких
+локальных процессах redis-server.
+
+Запускает --shards процессов redis-server на портах начиная с --base-port,
+загружает --links записей через warm_cache и читает их через get_cached_link:
+  all_up     — все узлы работают, ожидается 100% попаданий;
+  one_down   — узел --kill остановлен: промахами должны стать только его записи;
+  recovered  — узел перезапущен пустым, записи загружены заново.
+Для каждой фазы — доля попаданий, ожидаемая доля и задержки чтения.
+
+    python -m benchmarks.cache_sharding --shards 3 --links 30000
+
+Нужен redis-server в PATH (или --nodes с уже запущенными узлами, тогда без фазы one_down).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import shutil
+import string
+import subprocess
+import sys
+import time
+from collections import Counter
+
+from benchmarks._stats import latency_summary
+
+CODE_ALPHABET = string.ascii_letters + string.digits
+
+
+def start_redis(port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    import redis
+
+    client = redis.Redis(port=port)
+    for _ in range(100):
+        try:
+            client.ping()
+            return process
+        except redis.ConnectionError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError(f"redis-server на порту {port} не запустился")
+
+
+async def read_all(codes: list) -> dict:
+    from app.redis.RedisConnection import LocalLinkCache, get_cached_link
+
+    LocalLinkCache.clear()
+    hits = 0
+    latencies = []
+    # Ошибки недоступного узла печатаются в stdout — уводим их, чтобы не портить JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        for code in codes:
+            started = time.perf_counter()
+            record = await get_cached_link(code)
+            latencies.append(time.perf_counter() - started)
+            hits += record is not None
+    LocalLinkCache.clear()
+    return {"hit_ratio": round(hits / len(codes), 4), "read_ms": latency_summary(latencies)}
+
+
+async def run(args, nodes: list, processes: dict) -> dict:
+    from app.redis.LinkCacheLayout import LinkLayout
+    from app.redis.RedisConnection import AsyncLinkCacheClient, warm_cache
+
+    codes = ["".join(random.choices(CODE_ALPHABET, k=7)) for _ in range(args.links)]
+    records = [(code, f"https://example.com/{code}", None, i + 1) for i, code in enumerate(codes)]
+
+    async def load():
+        with contextlib.redirect_stdout(sys.stderr):
+            for start in range(0, len(records), 1000):
+                await warm_cache(records[start:start + 1000])
+
+    owners = Counter(AsyncLinkCacheClient.ring.node_for(LinkLayout.key(code)) for code in codes)
+    results = {
+        "links": args.links,
+        "layout": LinkLayout.name,
+        "share_per_node": {node: round(owners[node] / args.links, 4) for node in nodes},
+        "phases": {},
+    }
+
+    await load()
+    results["phases"]["all_up"] = {"expected_hit_ratio": 1.0, **await read_all(codes)}
+
+    if processes:
+        victim = nodes[args.kill]
+        process = processes[victim]
+        process.terminate()
+        process.wait()
+        results["phases"]["one_down"] = {
+            "stopped": victim,
+            "expected_hit_ratio": round(1 - owners[victim] / args.links, 4),
+            **await read_all(codes),
+        }
+
+        processes[victim] = start_redis(int(victim.rpartition(":")[2]))
+        # Ждём окончания паузы после ошибки, чтобы узел снова принимал команды,
+        # и очищаем его сразу (иначе клиент очистит его в фоне при первом обращении)
+        await asyncio.sleep(float(os.environ["LINK_CACHE_SHARD_COOLDOWN_SECONDS"]))
+        for shard in AsyncLinkCacheClient.shards.values():
+            if shard.needs_clear:
+                await shard.aclear()
+        await load()
+        results["phases"]["recovered"] = {"expected_hit_ratio": 1.0, **await read_all(codes)}
+
+    await AsyncLinkCacheClient.aclose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shards", type=int, default=3, help="сколько процессов redis-server запустить")
+    parser.add_argument("--base-port", type=int, default=7001, help="порт первого узла")
+    parser.add_argument("--nodes", help="уже запущенные узлы host:port через запятую вместо запуска своих")
+    parser.add_argument("--links", type=int, default=20000, help="количество записей")
+    parser.add_argument("--kill", type=int, default=0, help="номер узла, который останавливается в фазе one_down")
+    args = parser.parse_args()
+
+    processes = {}
+    if args.nodes:
+        nodes = [node.strip() for node in args.nodes.split(",") if node.strip()]
+    else:
+        if not shutil.which("redis-server"):
+            sys.exit("redis-server не найден в PATH; укажите --nodes")
+        nodes = [f"localhost:{args.base_port + i}" for i in range(args.shards)]
+    if not 0 <= args.kill < len(nodes):
+        sys.exit("--kill должен быть номером одного из узлов")
+
+    os.environ["LINK_CACHE_REDIS_MODE"] = "sharded"
+    os.environ["LINK_CACHE_REDIS_NODES"] = ",".join(nodes)
+    os.environ.setdefault("LINK_CACHE_SHARD_COOLDOWN_SECONDS", "1")
+
+    try:
+        if not args.nodes:
+            for node in nodes:
+                processes[node] = start_redis(int(node.rpartition(":")[2]))
+        results = asyncio.run(run(args, nodes, processes))
+    finally:
+        for process in processes.values():
+            process.terminate()
+            process.wait()
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
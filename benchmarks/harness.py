@@ -0,0 +1,290 @@
+"""
+Нагрузочный стенд для основных путей: редирект, создание ссылки, /links/my, /links/search,
+статистика ссылки (/links/{code}/stats) с границами периода в UTC со смещением.
+
+Создаёт N пользователей и M ссылок через CRUD-слой, затем прогоняет сценарии
+с заданной конкурентностью и долей попаданий в кэш. Для каждого сценария
+сообщает p50/p95/p99, запросы в секунду и число SQL-запросов и обращений
+к Redis на один HTTP-запрос.
+
+Офлайн (SQLite + fakeredis):
+    python -m benchmarks.harness --fake --users 50 --links 20000 --output result.json
+
+Против Postgres/Redis из .env:
+    python -m benchmarks.harness --users 100 --links 100000 --concurrency 200
+
+Сравнение с сохранённым результатом (код выхода 1 при регрессии):
+    python -m benchmarks.harness --fake --compare baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+from benchmarks._stats import latency_summary
+
+SCENARIOS = ("redirect", "create", "my_links", "search", "stats")
+
+
+class CallCounter:
+    """
+    Считает SQL-запросы асинхронного движка и обращения асинхронного клиента Redis
+    (конвейер — одно обращение). Фоновые задачи используют синхронные клиенты
+    и в подсчёт не попадают.
+    """
+
+    def __init__(self):
+        self.db = 0
+        self.redis = 0
+
+    def install(self):
+        import redis.asyncio
+        import redis.asyncio.client
+        from sqlalchemy import event
+
+        from app.database.DatabaseConnection import async_engine
+
+        @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+        def _count_query(*_):
+            self.db += 1
+
+        counter = self
+        execute_command = redis.asyncio.Redis.execute_command
+        pipeline_execute = redis.asyncio.client.Pipeline.execute
+
+        async def counted_execute_command(self, *args, **kwargs):
+            counter.redis += 1
+            return await execute_command(self, *args, **kwargs)
+
+        async def counted_pipeline_execute(self, *args, **kwargs):
+            counter.redis += 1
+            return await pipeline_execute(self, *args, **kwargs)
+
+        redis.asyncio.Redis.execute_command = counted_execute_command
+        redis.asyncio.client.Pipeline.execute = counted_pipeline_execute
+
+    def snapshot(self):
+        return self.db, self.redis
+
+
+async def seed(users: int, links: int):
+    """
+    Создаёт пользователей и ссылки через CRUD-слой.
+    Возвращает токены, коды, run_id и пары (токен, код ссылки этого пользователя).
+    """
+    from app.api.schemas.UserSchema import UserCreate
+    from app.crud import crud_link, crud_user
+    from app.database.DatabaseConnection import AsyncSessionLocal
+    from app.services.code_allocator import get_allocator
+    from app.services.code_filter import register_codes
+    from app.services.url_digest import url_digest, url_domain
+
+    allocator = get_allocator()
+    run_id = uuid.uuid4().hex[:8]
+    accounts = []
+    codes = []
+    owned = []
+    async with AsyncSessionLocal() as db:
+        for i in range(users):
+            user = await crud_user.create_user(db, UserCreate(email=f"bench-{run_id}-{i}@example.com", password="bench"))
+            accounts.append((user.id, user.token))
+
+        per_user = max(1, links // max(1, users))
+        for user_id, token in accounts:
+            for start in range(0, per_user, 5000):
+                count = min(5000, per_user - start)
+                rows = []
+                for short_code in await allocator.allocate_many(count):
+                    url = f"https://site{random.randrange(100)}.example.com/{run_id}/{uuid.uuid4().hex}"
+                    rows.append({
+                        "original_url": url,
+                        "short_code": short_code,
+                        "user_id": user_id,
+                        "url_digest": url_digest(url),
+                        "domain": url_domain(url),
+                    })
+                inserted = await crud_link.create_links_bulk(db, rows)
+                await db.commit()
+                # Ссылки создаются в обход URLShortener, поэтому коды добавляем в фильтр сами
+                await register_codes(inserted)
+                codes.extend(inserted.keys())
+                owned.extend((token, short_code) for short_code in list(inserted)[:10])
+    return [token for _, token in accounts], codes, run_id, owned
+
+
+async def drop_cached(short_code: str):
+    """
+    Удаляет запись из обоих уровней кэша в обход счётчиков (синхронным клиентом).
+    """
+    from app.redis.LinkCacheLayout import LinkLayout
+    from app.redis.RedisConnection import LinkCacheClient, LocalLinkCache
+
+    LocalLinkCache.delete(short_code)
+    LinkLayout.delete(LinkCacheClient, short_code)
+
+
+async def run_scenario(name, client, counter, args, tokens, codes, run_id, owned):
+    hot = codes[: max(1, len(codes) // 10)]
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def request():
+        token = random.choice(tokens)
+        headers = {"Authorization": token}
+        if name == "redirect":
+            if random.random() < args.hit_ratio:
+                short_code = random.choice(hot)
+            else:
+                short_code = random.choice(codes)
+                await drop_cached(short_code)
+            return await client.get(f"/{short_code}", follow_redirects=False), (301, 302, 307)
+        if name == "create":
+            url = f"https://create.example.com/{uuid.uuid4().hex}"
+            return await client.post("/links/shorten", json={"original_url": url}, headers=headers), (200,)
+        if name == "my_links":
+            return await client.get("/links/my", params={"limit": 100}, headers=headers), (200,)
+        if name == "stats":
+            # Границы периода с суффиксом Z (время со смещением) должны приводиться к UTC, а не давать 500
+            token, short_code = random.choice(owned)
+            params = {"granularity": "hour", "from": "2026-01-01T00:00:00Z", "to": "2026-01-08T00:00:00+03:00"}
+            return await client.get(f"/links/{short_code}/stats", params=params, headers={"Authorization": token}), (200,)
+        return await client.get("/links/search", params={"original_url": run_id, "limit": 100}, headers=headers), (200, 404)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response, expected = await request()
+                if response.status_code not in expected:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    # Прогрев горячих кодов перед замером
+    if name == "redirect":
+        for short_code in hot[:1000]:
+            await client.get(f"/{short_code}", follow_redirects=False)
+
+    db_before, redis_before = counter.snapshot()
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    db_after, redis_after = counter.snapshot()
+
+    return {
+        "requests": args.requests,
+        "errors": errors,
+        "requests_per_second": round(args.requests / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+        "db_queries_per_request": round((db_after - db_before) / args.requests, 3),
+        "redis_calls_per_request": round((redis_after - redis_before) / args.requests, 3),
+    }
+
+
+async def run(args):
+    import httpx
+
+    from app.database.DatabaseConnection import async_engine
+    from app.database.DatabaseInitializer import init_db
+    from app.main import app
+    from app.redis.RedisConnection import AsyncLinkCacheClient, AsyncRedisClient
+
+    counter = CallCounter()
+    counter.install()
+    init_db()
+    try:
+        tokens, codes, run_id, owned = await seed(args.users, args.links)
+
+        results = {
+            "config": {
+                "users": args.users,
+                "links": len(codes),
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "hit_ratio": args.hit_ratio,
+                "fake": args.fake,
+            },
+            "scenarios": {},
+        }
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for name in args.scenarios:
+                results["scenarios"][name] = await run_scenario(name, client, counter, args, tokens, codes, run_id, owned)
+        return results
+    finally:
+        # Без закрытия пулов процесс не завершается и --compare не возвращает код выхода
+        await AsyncRedisClient.aclose()
+        if AsyncLinkCacheClient is not AsyncRedisClient:
+            await AsyncLinkCacheClient.aclose()
+        await async_engine.dispose()
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Возвращает список регрессий: падение rps или рост p95 больше, чем на tolerance.
+    """
+    regressions = []
+    for name, result in current["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        if result["requests_per_second"] < base["requests_per_second"] * (1 - tolerance):
+            regressions.append(f"{name}: rps {base['requests_per_second']} -> {result['requests_per_second']}")
+        if base["latency_ms"]["p95"] and result["latency_ms"]["p95"] > base["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['latency_ms']['p95']}ms -> {result['latency_ms']['p95']}ms")
+        for metric in ("db_queries_per_request", "redis_calls_per_request"):
+            if result[metric] > base[metric] * (1 + tolerance) + 0.01:
+                regressions.append(f"{name}: {metric} {base[metric]} -> {result[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fake", action="store_true", help="SQLite + fakeredis вместо Postgres/Redis")
+    parser.add_argument("--users", type=int, default=20, help="количество пользователей")
+    parser.add_argument("--links", type=int, default=10000, help="общее количество ссылок")
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на сценарий")
+    parser.add_argument("--concurrency", type=int, default=50, help="одновременных запросов")
+    parser.add_argument("--hit-ratio", type=float, default=0.9, help="доля редиректов, попадающих в кэш")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=42, help="seed генератора случайных чисел")
+    parser.add_argument("--output", help="файл для JSON-результата (по умолчанию stdout)")
+    parser.add_argument("--compare", help="JSON-результат предыдущего запуска для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение при сравнении")
+    args = parser.parse_args()
+
+    # Все запросы бенчмарка идут с одного адреса — квоты на клиента не применяем
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    random.seed(args.seed)
+    if args.fake:
+        from benchmarks._fake import install_fakes
+
+        install_fakes()
+
+    results = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Бенчмарк схем таблицы links: обычная, HASH (short_code) и RANGE (created_at).
+
+Для каждой схемы в отдельной схеме Postgres (bench_none, bench_hash, bench_range)
+создаётся таблица с теми же индексами, что и в приложении, загружается N ссылок
+с датами создания за последние --months месяцев, затем измеряются:
+скорость загрузки, поиск по short_code и по id, удаление самого старого месяца
+(DELETE против DROP секции), размер таблицы с индексами и время VACUUM.
+
+Только Postgres (из .env или DATABASE_URL):
+    python -m benchmarks.partition_layout --links 5000000 --months 12
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime
+
+from benchmarks._stats import latency_summary
+
+LAYOUTS = ("none", "hash", "range")
+
+
+def create_table(conn, layout: str, months: int):
+    from sqlalchemy.schema import CreateIndex, CreateTable
+
+    from app.database import LinkPartitioning
+    from app.database.models.LinkModel import Link
+
+    if layout == "none":
+        conn.execute(CreateTable(Link.__table__))
+        for index in Link.__table__.indexes:
+            conn.execute(CreateIndex(index))
+        return
+    LinkPartitioning.create_partitioned_links(conn, layout)
+    if layout == "range":
+        now = datetime.utcnow()
+        LinkPartitioning.ensure_range_partitions(conn, LinkPartitioning._month_start(now, -months), now)
+
+
+def run_layout(layout: str, args) -> dict:
+    from sqlalchemy import text
+
+    from app.database import LinkPartitioning
+    from app.database.DatabaseConnection import engine
+
+    schema = f"bench_{layout}"
+    result = {}
+    with engine.connect() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text(f"SET search_path TO {schema}, public"))
+        create_table(conn, layout, args.months)
+        conn.commit()
+
+        started = time.perf_counter()
+        for start in range(0, args.links, args.batch_size):
+            conn.execute(text("""
+                INSERT INTO links (original_url, short_code, created_at, expires_at, visit_count, url_digest, domain)
+                SELECT 'https://site' || (i % 100) || '.example.com/' || md5(i::text),
+                       substr(md5('code' || i::text), 1, 16),
+                       (now() AT TIME ZONE 'utc') - random() * make_interval(days => :days),
+                       CASE WHEN i % 10 = 0 THEN (now() AT TIME ZONE 'utc') - interval '1 day' END,
+                       0, md5(i::text), 'site' || (i % 100) || '.example.com'
+                FROM generate_series(:start, :stop) AS i
+            """), {"start": start, "stop": min(args.links, start + args.batch_size) - 1, "days": args.months * 30})
+            conn.commit()
+        elapsed = time.perf_counter() - started
+        result["load_rows_per_second"] = round(args.links / elapsed, 1)
+        conn.execute(text("ANALYZE links"))
+        conn.commit()
+
+        sample = random.sample(range(args.links), min(args.lookups, args.links))
+        latencies = []
+        for i in sample:
+            started = time.perf_counter()
+            conn.execute(text("SELECT * FROM links WHERE short_code = substr(md5('code' || :i), 1, 16)"), {"i": str(i)}).first()
+            latencies.append(time.perf_counter() - started)
+        result["lookup_by_short_code_ms"] = latency_summary(latencies)
+
+        latencies = []
+        for i in sample:
+            started = time.perf_counter()
+            conn.execute(text("SELECT * FROM links WHERE id = :id"), {"id": i + 1}).first()
+            latencies.append(time.perf_counter() - started)
+        result["lookup_by_id_ms"] = latency_summary(latencies)
+        conn.commit()
+
+        result["total_bytes_before_cleanup"] = conn.execute(text("""
+            SELECT COALESCE(sum(pg_total_relation_size(c.oid)), 0) FROM pg_class c
+            WHERE c.oid = to_regclass('links')
+               OR c.oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass('links'))
+               OR c.oid = to_regclass('link_codes')
+        """)).scalar()
+
+        # Удаление самого старого месяца: DELETE по строкам против DROP секции
+        oldest = LinkPartitioning._month_start(datetime.utcnow(), -args.months)
+        cutoff = LinkPartitioning._month_start(oldest, 1)
+        started = time.perf_counter()
+        if layout == "range":
+            name = LinkPartitioning._range_partition_name(oldest)
+            conn.execute(text(f"ALTER TABLE links DETACH PARTITION {name}"))
+            conn.execute(text("DELETE FROM link_codes WHERE created_at < :cutoff"), {"cutoff": cutoff})
+            conn.execute(text(f"DROP TABLE {name}"))
+        else:
+            conn.execute(text("DELETE FROM links WHERE created_at < :cutoff"), {"cutoff": cutoff})
+        conn.commit()
+        result["drop_oldest_month_seconds"] = round(time.perf_counter() - started, 3)
+
+        conn.execution_options(isolation_level="AUTOCOMMIT")
+        started = time.perf_counter()
+        conn.execute(text("VACUUM links"))
+        if layout == "range":
+            conn.execute(text("VACUUM link_codes"))
+        result["vacuum_seconds"] = round(time.perf_counter() - started, 3)
+
+        if not args.keep:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--links", type=int, default=1000000, help="количество ссылок")
+    parser.add_argument("--months", type=int, default=12, help="за сколько месяцев распределены даты создания")
+    parser.add_argument("--lookups", type=int, default=2000, help="количество точечных запросов")
+    parser.add_argument("--batch-size", type=int, default=100000, help="строк в одном INSERT при загрузке")
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=list(LAYOUTS))
+    parser.add_argument("--keep", action="store_true", help="не удалять схемы bench_* после замеров")
+    args = parser.parse_args()
+
+    from app.database.DatabaseConnection import engine
+    from app.database.DatabaseInitializer import init_db
+
+    if engine.dialect.name != "postgresql":
+        sys.exit("Секционирование поддерживается только в Postgres")
+    init_db()
+
+    results = {"links": args.links, "months": args.months, "layouts": {}}
+    for layout in args.layouts:
+        results["layouts"][layout] = run_layout(layout, args)
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
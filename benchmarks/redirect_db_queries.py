@@ -0,0 +1,86 @@
+"""
+Бенчмарк: количество SQL-запросов и выдач соединений из пула на один редирект.
+
+Запуск офлайн (SQLite + fakeredis):
+    python -m benchmarks.redirect_db_queries --fake
+
+Запуск против Postgres/Redis из .env:
+    python -m benchmarks.redirect_db_queries
+
+Чтобы получить значения "до", запустите скрипт на предыдущей ревизии.
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fake", action="store_true", help="SQLite + fakeredis вместо Postgres/Redis")
+    parser.add_argument("--requests", type=int, default=1000, help="количество редиректов на каждый сценарий")
+    args = parser.parse_args()
+
+    # Все запросы бенчмарка идут с одного адреса — квоты на клиента не применяем
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    if args.fake:
+        from benchmarks._fake import install_fakes
+
+        install_fakes()
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from app.main import app
+    from app.database.DatabaseConnection import async_engine
+    from app.redis.LinkCacheLayout import LinkLayout
+    from app.redis.RedisConnection import LinkCacheClient, LocalLinkCache
+
+    counters = {"queries": 0, "checkouts": 0}
+
+    engine = async_engine.sync_engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_query(*_):
+        counters["queries"] += 1
+
+    @event.listens_for(engine.pool, "checkout")
+    def _count_checkout(*_):
+        counters["checkouts"] += 1
+
+    results = {}
+    with TestClient(app) as client:
+        token = client.post("/auth/register", json={"email": "bench@example.com", "password": "bench"}).json()["token"]
+        short_code = client.post(
+            "/links/shorten",
+            json={"original_url": "https://example.com/benchmark"},
+            headers={"Authorization": token},
+        ).json()["short_code"]
+
+        def measure(name, before_each):
+            counters.update(queries=0, checkouts=0)
+            for _ in range(args.requests):
+                before_each()
+                response = client.get(f"/{short_code}", follow_redirects=False)
+                assert response.status_code in (301, 302, 307), response.text
+            results[name] = {
+                "db_queries_per_redirect": counters["queries"] / args.requests,
+                "pool_checkouts_per_redirect": counters["checkouts"] / args.requests,
+            }
+
+        def drop_cache():
+            LinkLayout.delete(LinkCacheClient, short_code)
+            LocalLinkCache.delete(short_code)
+
+        # Промах кэша: каждый раз удаляем запись из обоих уровней
+        measure("cache_miss", drop_cache)
+        # Попадание в кэш: ключ уже прогрет предыдущим запросом
+        client.get(f"/{short_code}", follow_redirects=False)
+        measure("cache_hit", lambda: None)
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
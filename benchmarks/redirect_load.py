@@ -0,0 +1,91 @@
+"""
+Нагрузочный бенчмарк редиректа: много одновременных запросов к GET /{short_code}.
+
+В процессе (SQLite + fakeredis):
+    python -m benchmarks.redirect_load --fake --concurrency 2000 --requests 20000
+
+Против запущенного сервера:
+    uvicorn app.main:app --workers 1 &
+    python -m benchmarks.redirect_load --url http://localhost:8000 --concurrency 2000
+
+Для сравнения с синхронным стеком запустите скрипт на предыдущей ревизии.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from benchmarks._stats import latency_summary
+
+
+async def run(args):
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=httpx.Limits(max_connections=args.concurrency))
+    else:
+        from app.main import app
+        from app.database.DatabaseInitializer import init_db
+
+        init_db()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+    async with client:
+        response = await client.post("/links/shorten", json={"original_url": "https://example.com/load"})
+        response.raise_for_status()
+        short_code = response.json()["short_code"]
+        # Прогреваем кэш
+        await client.get(f"/{short_code}")
+
+        latencies = []
+        errors = 0
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await client.get(f"/{short_code}")
+                    if response.status_code not in (301, 302, 307):
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(args.requests)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "errors": errors,
+        "requests_per_second": round(args.requests / elapsed, 1),
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fake", action="store_true", help="SQLite + fakeredis вместо Postgres/Redis")
+    parser.add_argument("--url", help="адрес запущенного сервера; по умолчанию приложение запускается в процессе")
+    parser.add_argument("--concurrency", type=int, default=1000, help="количество одновременных запросов")
+    parser.add_argument("--requests", type=int, default=10000, help="общее количество запросов")
+    args = parser.parse_args()
+
+    # Все запросы бенчмарка идут с одного адреса — квоты на клиента не применяем
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    if args.fake and not args.url:
+        from benchmarks._fake import install_fakes
+
+        install_fakes()
+
+    json.dump(asyncio.run(run(args)), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
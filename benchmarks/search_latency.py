@@ -0,0 +1,102 @@
+"""
+Бенчмарк поиска по URL: задержка /links/search в зависимости от числа ссылок пользователя.
+
+Для каждого размера создаётся отдельный пользователь с N ссылками, среди которых
+несколько содержат искомую подстроку. Задержка должна оставаться примерно постоянной.
+
+Против Postgres из .env (триграммный индекс):
+    python -m benchmarks.search_latency --sizes 1000 10000 100000
+
+Офлайн (SQLite, без триграммного индекса — для проверки работоспособности):
+    python -m benchmarks.search_latency --fake --sizes 1000 10000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+import uuid
+
+from benchmarks._stats import percentile
+
+
+async def run(args):
+    from sqlalchemy import text
+
+    from app.crud import crud_link, crud_user
+    from app.api.schemas.UserSchema import UserCreate
+    from app.database.DatabaseConnection import AsyncSessionLocal, engine
+    from app.database.DatabaseInitializer import init_db
+    from app.database.models.LinkModel import Link
+    from app.services.url_digest import url_digest, url_domain
+
+    init_db()
+    needle = f"needle-{uuid.uuid4().hex[:8]}"
+    results = {}
+
+    for size in args.sizes:
+        async with AsyncSessionLocal() as db:
+            user = await crud_user.create_user(
+                db, UserCreate(email=f"search-{size}-{uuid.uuid4().hex[:6]}@example.com", password="bench")
+            )
+            for start in range(0, size, 5000):
+                rows = []
+                for i in range(start, min(size, start + 5000)):
+                    # Каждая тысячная ссылка содержит искомую подстроку
+                    path = needle if i % 1000 == 0 else uuid.uuid4().hex
+                    url = f"https://site{i % 50}.example.com/{path}/{i}"
+                    rows.append({
+                        "original_url": url,
+                        "short_code": uuid.uuid4().hex[:12],
+                        "user_id": user.id,
+                        "url_digest": url_digest(url),
+                        "domain": url_domain(url),
+                    })
+                await crud_link.create_links_bulk(db, rows)
+                await db.commit()
+
+        if engine.dialect.name == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE links"))
+
+        timings = {}
+        for name, filters in {
+            "contains": {"url_contains": needle},
+            "prefix": {"url_contains": "https://site7.example.com/" + needle, "url_match": "prefix"},
+            "domain": {"domain": "site7.example.com"},
+        }.items():
+            latencies = []
+            async with AsyncSessionLocal() as db:
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    await crud_link.list_user_links(
+                        db, user.id, (Link.short_code, Link.expires_at), 100, **filters
+                    )
+                    latencies.append(time.perf_counter() - started)
+            timings[name] = {
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            }
+        results[str(size)] = timings
+
+    return {"dialect": engine.dialect.name, "repeat": args.repeat, "by_links_per_user": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fake", action="store_true", help="SQLite + fakeredis вместо Postgres/Redis")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="количество ссылок пользователя")
+    parser.add_argument("--repeat", type=int, default=50, help="повторов каждого запроса")
+    args = parser.parse_args()
+
+    if args.fake:
+        from benchmarks._fake import install_fakes
+
+        install_fakes()
+
+    json.dump(asyncio.run(run(args)), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()